@@ -1,20 +1,47 @@
 import streamlit as st
 import os
-import time
 import json
+import threading
 import importlib.util
-from moviepy.video.io.VideoFileClip import VideoFileClip
+
+# Streamlit re-executes this script on every interaction: anything expensive is cached or lives in session state
+MODEL_LIST_TTL = 600 # Seconds the model list is reused
+JOB_POLL_SECONDS = 1.0 # Refresh interval of the live view while a course is being generated
+# Uploads are ingested under ./static so Streamlit's static file server (server.enableStaticServing) can stream
+# the player from disk; the content-hash file names are not guessable
+UPLOAD_DIR = os.path.join("static", "uploads")
+# The static file server answers 404 for larger files (MAX_APP_STATIC_FILE_SIZE); those go through st.video
+STATIC_SERVING_MAX_BYTES = 200 * 1024 * 1024
+# Courses go under ./static as well, so module clips and HLS playlists (with their segments) are served from disk
+COURSE_OUTPUT_ROOT = os.path.join("static", "courses")
+# Browsers without native HLS (all but Safari) play it with hls.js, served from ./static like the course: a pinned
+# copy of https://cdn.jsdelivr.net/npm/hls.js@<HLS_JS_VERSION>/dist/hls.min.js saved as HLS_JS_PATH. Nothing is
+# loaded from a CDN at runtime
+HLS_JS_VERSION = "1.5.20"
+HLS_JS_PATH = os.path.join("static", "vendor", f"hls-{HLS_JS_VERSION}.min.js")
 
 # Import the CourseGenerator class from video-segmentor.py
 # We use importlib because the filename references a hyphen, which is not a valid identifier
 module_name = "video_segmentor"
 file_path = "video-segmentor.py"
 
-spec = importlib.util.spec_from_file_location(module_name, file_path)
-video_segmentor = importlib.util.module_from_spec(spec)
-spec.loader.exec_module(video_segmentor)
+@st.cache_resource(show_spinner=False)
+def load_video_segmentor():
+    """Executes video-segmentor.py once per server process instead of on every rerun."""
+    spec = importlib.util.spec_from_file_location(module_name, file_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+video_segmentor = load_video_segmentor()
 CourseGenerator = video_segmentor.CourseGenerator
 
+@st.cache_data(ttl=MODEL_LIST_TTL, show_spinner=False)
+def list_model_ids(backend, api_key, base_url=None):
+    """Model ids the server offers to the key (errors are not cached, so a bad key is retried on the next rerun)."""
+    # The same backend (connection pool, rate limits) that every session's course jobs use
+    return video_segmentor.shared_backend(backend, api_key, base_url).list_models()
+
 # Page Config
 st.set_page_config(
     page_title="Video Segmentor & Course Creator",
@@ -84,6 +111,329 @@ def render_cue_card(title, content, color_class):
         </div>
         """, unsafe_allow_html=True)
 
+def static_url(path):
+    """
+    URL of a local file on Streamlit's static file server, or None if it is disabled, the file is not under
+    ./static or it is too large to be served.
+    """
+    rel_path = os.path.relpath(path, "static")
+    if not st.get_option("server.enableStaticServing") or rel_path.startswith(".."):
+        return None
+    if os.path.getsize(path) > STATIC_SERVING_MAX_BYTES:
+        return None
+    return f"app/static/{rel_path.replace(os.sep, '/')}"
+
+def render_video(path):
+    """Plays a local video, streamed by the static file server when it can serve the file, else with st.video."""
+    url = static_url(path)
+    if url:
+        # st.video would load the whole file into Streamlit's in-memory media store
+        st.markdown(f'<video src="{url}" controls preload="metadata" style="width: 100%;"></video>', unsafe_allow_html=True)
+    else:
+        st.video(path)
+
+def render_hls(path, element_id, duration):
+    """
+    Plays an HLS module playlist from the static file server: natively in Safari, through the vendored hls.js
+    elsewhere. The playlist ends on a segment boundary, so the player pauses at the module's own end.
+    """
+    url = static_url(path)
+    if url is None:
+        st.caption("🎞️ HLS playlist ready. Playing it needs server.enableStaticServing and the course under ./static.")
+        return
+    hls_js_url = static_url(HLS_JS_PATH) if os.path.exists(HLS_JS_PATH) else None
+    if hls_js_url is None:
+        st.caption(f"🎞️ Outside Safari, HLS playback needs hls.js {HLS_JS_VERSION} at {HLS_JS_PATH}.")
+    start = video_segmentor.hls_start_offset(path)
+    st.html(f"""
+        <video id="{element_id}" controls preload="metadata" style="width: 100%;"></video>
+        <script>
+        (function () {{
+            const video = document.getElementById("{element_id}");
+            const start = {start:.3f}, end = {start + duration:.3f};
+            video.addEventListener("loadedmetadata", () => {{
+                if (video.currentTime < start) video.currentTime = start;
+            }});
+            video.addEventListener("timeupdate", () => {{
+                if (video.currentTime >= end && !video.paused) video.pause();
+            }});
+            if (video.canPlayType("application/vnd.apple.mpegurl")) {{
+                video.src = "{url}";
+                return;
+            }}
+            const hlsJs = {json.dumps(hls_js_url)};
+            if (!hlsJs) return;
+            // One copy of hls.js for all the players on the page
+            window.hlsReady = window.hlsReady || new Promise((resolve) => {{
+                const script = document.createElement("script");
+                script.src = hlsJs;
+                script.onload = resolve;
+                document.head.appendChild(script);
+            }});
+            window.hlsReady.then(() => {{
+                const hls = new Hls();
+                hls.loadSource("{url}");
+                hls.attachMedia(video);
+            }});
+        }})();
+        </script>
+    """, unsafe_allow_javascript=True)
+
+def render_module(idx, result, show_video=True):
+    """Renders one finished module: clip on the left, notes on the right."""
+    col1, col2 = st.columns([1, 1])
+
+    with col1:
+        st.subheader(f"Module {idx+1}: {result['topic_name']}")
+        st.caption(f"Time: {result['start_time']}s - {result['end_time']}s")
+        if result['video_path'] and os.path.exists(result['video_path']):
+            if show_video and result['video_path'].endswith(".m3u8"):
+                render_hls(result['video_path'], f"module-video-{idx}", result['end_time'] - result['start_time'])
+            elif show_video:
+                render_video(result['video_path'])
+            else:
+                # The live view refreshes every JOB_POLL_SECONDS; players appear once, when the course is complete
+                st.caption("🎞️ Clip ready.")
+
+    with col2:
+        course_content = result['content'] or ""
+        with st.expander("View Notes", expanded=True):
+            sections = parse_markdown_to_cards(course_content)
+            # Render ONLY Notes (Green)
+            render_cue_card("Notes", sections.get('notes', course_content), 'card-green')
+
+            st.download_button(
+                label="Download Notes",
+                data=course_content,
+                file_name=os.path.basename(result['md_path']),
+                mime="text/markdown",
+                key=f"dl_{idx}"
+            )
+
+def render_metrics(report, json_path, prom_path):
+    """Per-stage and per-module timing/token breakdown of the finished job."""
+    totals = report['totals']
+    with st.expander("⏱️ Performance breakdown", expanded=False):
+        col_a, col_b, col_c, col_d = st.columns(4)
+        col_a.metric("Total time", f"{report['wall_seconds']:.1f}s")
+        col_b.metric("Tokens (prompt / completion)", f"{totals.get('prompt_tokens', 0)} / {totals.get('completion_tokens', 0)}")
+        col_c.metric("Uploaded", f"{totals.get('upload_bytes', 0) / 1024 / 1024:.1f} MiB")
+        col_d.metric("API requests (retries)", f"{totals.get('requests', 0)} ({totals.get('retries', 0)})")
+
+        st.markdown("**Stages**")
+        st.dataframe([
+            {
+                "stage": stage, "calls": agg['calls'], "seconds": round(agg['seconds'], 2),
+                "max seconds": round(agg['max_seconds'], 2), "prompt tokens": agg.get('prompt_tokens', 0),
+                "completion tokens": agg.get('completion_tokens', 0),
+                "uploaded KiB": round(agg.get('upload_bytes', 0) / 1024, 1), "retries": agg.get('retries', 0),
+                "errors": agg['errors'],
+            }
+            for stage, agg in report['stages'].items()
+        ], width="stretch")
+
+        st.markdown("**Modules**")
+        st.dataframe([
+            {
+                "module": int(module),
+                **{f"{stage} s": round(agg['seconds'], 2) for stage, agg in stages.items()},
+                "tokens": stages.get('api.chat', {}).get('prompt_tokens', 0)
+                          + stages.get('api.chat', {}).get('completion_tokens', 0),
+            }
+            for module, stages in report['modules'].items()
+        ], width="stretch")
+
+        col_json, col_prom = st.columns(2)
+        with open(json_path, "rb") as f:
+            col_json.download_button("Download report (JSON)", f.read(), file_name=os.path.basename(json_path),
+                                     mime="application/json", key="dl_metrics_json")
+        with open(prom_path, "rb") as f:
+            col_prom.download_button("Download metrics (Prometheus)", f.read(), file_name=os.path.basename(prom_path),
+                                     mime="text/plain", key="dl_metrics_prom")
+
+class CourseJob:
+    """
+    Course generation running on a background thread. The thread only updates this object (never calls
+    Streamlit); each rerun renders whatever is finished, so widgets like the quiz never recompute anything.
+    """
+
+    def __init__(self, source_path, output_root, api_key, model_name, settings):
+        self.source_path = source_path
+        self.output_root = output_root
+        self.output_dir = None
+        self.api_key = api_key
+        self.model_name = model_name
+        self.settings = settings
+        self.phase = "⬆️ Preparing video..."
+        self.error = None
+        self.done = False
+        self.modules = []
+        self.results = {}
+        self.global_artifacts = {}
+        self.transcript_cache_stats = None
+        self.completion_cache_stats = None
+        self.digest_report = None
+        self.metrics_report = None
+        self.metrics_paths = None
+        self.api_client = None
+        self._thread = threading.Thread(target=self._run, name="course-job", daemon=True)
+
+    @property
+    def running(self):
+        return self._thread.is_alive()
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._generate()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+        finally:
+            self.done = True
+
+    def _generate(self):
+        # Output is keyed by the video's content hash (so re-runs resume) and never shared with a concurrent
+        # session; intermediate files live in a private temp dir that is removed afterwards
+        name = video_segmentor.cached_file_sha256(self.source_path)[:16]
+        with video_segmentor.JobWorkspace(self.output_root, name) as workspace:
+            self.output_dir = workspace.output_dir
+            backend = self.settings["backend"]
+            generator = CourseGenerator(
+                api_key=self.api_key, model_name=self.model_name, work_dir=workspace.temp_dir,
+                backend=backend["name"], base_url=backend["base_url"], text_model=backend["text_model"],
+                transcribe_model=backend["transcribe_model"]
+            )
+            self.api_client = generator.client
+            # One probe and one frame decoder for planning, frames and clips
+            with video_segmentor.MediaSession(self.source_path) as media:
+                self._generate_course(generator, media)
+
+    def _generate_course(self, generator, media):
+        settings = self.settings
+
+        self.phase = f"🎧 Extracting Audio & Transcribing ({generator.transcribe_model}), 🧠 Analyzing Topics ({generator.text_model})..."
+        # Re-running on the same video resumes from the checkpoint in the output folder
+        manifest = video_segmentor.JobManifest(self.output_dir)
+        modules, transcript = generator.load_plan(
+            media, manifest, use_cache=settings["use_cache"], export_mode=settings["export_mode"],
+            min_duration=settings["min_duration"]
+        )
+        self.transcript_cache_stats = generator.transcript_cache.stats()
+        if not modules:
+            self.error = "Could not analyze video structure. Check API Key or video content."
+            return
+        self.modules = modules
+
+        # Objectives, conclusions and quiz only need the transcript: start them now, render when ready
+        global_futures = generator.submit_global_artifacts(transcript, use_cache=settings["use_cache"])
+        for name, future in global_futures.items():
+            future.add_done_callback(lambda f, name=name: self._set_global_artifact(name, f.result()))
+
+        # Frames are sampled inside, only for modules whose notes are not checkpointed yet
+        self.phase = f"🎬 Cutting clips & writing notes for {len(modules)} modules..."
+        generator.process_modules(
+            media, modules, transcript, output_dir=self.output_dir,
+            encode_workers=settings["encode_workers"], llm_workers=settings["llm_workers"],
+            export_mode=settings["export_mode"], frame_strategy=settings["frame_strategy"], manifest=manifest,
+            use_cache=settings["use_cache"], progress_callback=self._set_module_result
+        )
+
+        self.phase = "🎓 Finishing Objectives, Conclusions & Quiz..."
+        for future in global_futures.values():
+            future.result()
+
+        self.digest_report = generator.digest_report
+        self.completion_cache_stats = generator.completion_cache.stats()
+        self.metrics_paths = generator.metrics.write(self.output_dir)
+        self.metrics_report = generator.metrics.report()
+
+    def _set_module_result(self, idx, result):
+        self.results[idx] = result
+
+    def _set_global_artifact(self, name, content):
+        self.global_artifacts[name] = content
+
+def render_job(job, live=False):
+    """Renders the current state of a CourseJob: intro, modules in course order, outro and (when done) stats."""
+    if job.transcript_cache_stats:
+        stats = job.transcript_cache_stats
+        st.caption(f"📦 Transcript cache: {stats['hits']} hits, {stats['misses']} misses. 📋 {len(job.modules)} topic-based modules.")
+    if job.error:
+        st.error(job.error)
+        return
+    if live:
+        st.progress(len(job.results) / max(len(job.modules), 1), text=job.phase)
+        if job.api_client is not None:
+            # Shared by all sessions: a long queue means the API quota, not this job, is the bottleneck
+            api = job.api_client.stats()
+            st.caption(
+                f"🚦 {job.api_client.name} API: {api['in_flight']} in flight, {api['queued']} waiting for the rate limit "
+                f"({api['wait_seconds']:.0f}s waited, {api['rate_limited']} rate-limited, {api['retries']} retries)"
+            )
+    if not job.modules:
+        return
+
+    # --- 1. GLOBAL OBJECTIVES ---
+    st.divider()
+    intro_content = job.global_artifacts.get("intro")
+    if intro_content is None:
+        st.info("⏳ Generating Course Objectives...")
+    else:
+        intro_sections = parse_markdown_to_cards(intro_content)
+        render_cue_card("Course Objectives", intro_sections.get('objectives', intro_content), 'card-red')
+
+    # --- 2. MODULES (NOTES ONLY) ---
+    # Results land in course order, whichever finishes first
+    st.divider()
+    for idx, module in enumerate(job.modules):
+        result = job.results.get(idx)
+        if result is None:
+            st.info(f"⏳ Module {idx+1}: {module['topic_name']} — clip & notes in progress...")
+        else:
+            render_module(idx, result, show_video=not live)
+
+    # --- 3. GLOBAL OUTRO ---
+    st.divider()
+    outro_content = job.global_artifacts.get("outro")
+    if outro_content is None:
+        st.info("⏳ Generating Conclusions...")
+    else:
+        outro_sections = parse_markdown_to_cards(outro_content)
+        col_a, col_b = st.columns(2)
+        with col_a:
+            render_cue_card("Definitions", outro_sections.get('definitions', ''), 'card-blue')
+        with col_b:
+            render_cue_card("Practical Application", outro_sections.get('practical application', ''), 'card-yellow')
+
+    if live or not job.metrics_report:
+        return
+
+    if job.digest_report:
+        report = job.digest_report
+        st.caption(
+            f"🧾 Transcript digest: {report['chunks']} chunks, "
+            f"~{report['est_input_tokens_full']} → ~{report['est_input_tokens_digest']} input tokens for objectives/outro/quiz."
+        )
+
+    cache_stats = job.completion_cache_stats
+    st.success(
+        f"🎉 Course Generation Complete! "
+        f"(AI response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses)"
+    )
+
+    # --- 5. PERFORMANCE BREAKDOWN ---
+    render_metrics(job.metrics_report, *job.metrics_paths)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_live_job(job):
+    """Re-renders only this fragment while the job runs; a full rerun shows the finished course."""
+    if job.done:
+        st.rerun()
+    render_job(job, live=True)
+
 # Title
 st.title("🎬 Video Segmentor & Course Creator")
 st.markdown("Upload a video tutorial to automatically segment it, generate learning modules, and create a comprehensive course.")
@@ -91,158 +441,113 @@ st.markdown("Upload a video tutorial to automatically segment it, generate learn
 # Sidebar for Configuration
 with st.sidebar:
     st.header("Configuration")
-    api_key = st.text_input("Groq API Key", type="password", help="Enter your Groq Cloud API Key")
-    
+    backend_name = st.selectbox(
+        "Inference backend", video_segmentor.BACKENDS,
+        index=video_segmentor.BACKENDS.index(video_segmentor.BACKEND_DEFAULT),
+        help="groq: Groq Cloud. openai: an OpenAI-compatible server on your own GPUs (Ollama, vLLM, llama.cpp)."
+    )
+    if backend_name == "groq":
+        api_key = st.text_input("Groq API Key", type="password", help="Enter your Groq Cloud API Key")
+        base_url = None
+    else:
+        base_url = st.text_input("Server URL", value=video_segmentor.LOCAL_BASE_URL_DEFAULT)
+        api_key = st.text_input("API Key (optional)", type="password") or None
+
+    backend = {"name": backend_name, "base_url": base_url, "text_model": None, "transcribe_model": None}
     selected_model = "llama-3.2-90b-vision-preview" # Default
-    if api_key:
+    if api_key or backend_name != "groq":
         try:
-            from groq import Groq
-            client = Groq(api_key=api_key)
-            models = client.models.list()
             # Filter for vision capable models if possible, or just list all
             # Ideally we'd filter, but for now we list them.
             # Prioritize Llama 4 Scout if available
-            model_options = [m.id for m in models.data]
+            model_options = list_model_ids(backend_name, api_key, base_url)
             
             # Simple heuristic to put desired models at top
             priority = ["llama-4-scout", "llama-3.2-90b-vision-preview", "llama-3.2-11b-vision-preview"]
             sorted_models = sorted(model_options, key=lambda x: (x not in priority, x))
             
-            selected_model = st.selectbox("Select Groq Model", sorted_models, index=0)
+            selected_model = st.selectbox("Select Vision Model", sorted_models, index=0)
+            if backend_name != "groq":
+                # A local server has its own model names for every step
+                backend["text_model"] = st.selectbox("Text model (structure, summaries, quiz)", sorted_models, index=0)
+                backend["transcribe_model"] = st.text_input(
+                    "Transcription model", value=video_segmentor.WHISPER_MODEL,
+                    help="Served at <Server URL>/audio/transcriptions (e.g. a faster-whisper server)."
+                )
         except Exception as e:
             st.error(f"Error fetching models: {e}")
             
+    st.subheader("Performance")
+    encode_workers = st.number_input("Clip encoding workers", min_value=1, max_value=16, value=video_segmentor.ENCODE_WORKERS)
+    llm_workers = st.number_input("Concurrent AI requests", min_value=1, max_value=16, value=video_segmentor.LLM_WORKERS)
+    export_mode = st.selectbox(
+        "Clip export mode", video_segmentor.EXPORT_MODES,
+        index=video_segmentor.EXPORT_MODES.index(video_segmentor.EXPORT_MODE_DEFAULT),
+        help="reencode: frame-accurate, slowest. copy: no re-encode, starts at the nearest keyframe. "
+             "hybrid: frame-accurate, re-encodes only the first GOP of each clip. "
+             "hls: encodes the video once into HLS segments; modules are playlists, so new boundaries cost nothing."
+    )
+
+    frame_strategy = st.selectbox(
+        "Frame selection", video_segmentor.FRAME_STRATEGIES,
+        index=video_segmentor.FRAME_STRATEGIES.index(video_segmentor.FRAME_STRATEGY_DEFAULT),
+        help="linspace: evenly spaced frames. scene: only the most distinct frames, near-duplicates dropped."
+    )
+    min_duration = st.number_input(
+        "Minimum module length (s)", min_value=0, max_value=1800, value=video_segmentor.MERGE_MIN_DURATION, step=10,
+        help="Shorter topics are merged into a neighbour. Changing it on a generated course only redoes the "
+             "modules whose boundaries change."
+    )
+    use_cache = st.checkbox(
+        "Reuse cached AI responses", value=True,
+        help="Identical requests (same model, prompt and frames) are answered from the local cache."
+    )
+
     # st.info("💡 **How it works:**\n\n1. Upload a video.\n2. App extracts frames.\n3. AI identifies topic segments.\n4. App cuts the video into clips.\n5. AI generates course content for each clip.")
 
 # Main Content
 uploaded_file = st.file_uploader("Choose a video file", type=['mp4', 'mov', 'avi', 'mkv'])
+job = st.session_state.get('course_job')
+job_running = job is not None and not job.done
 
-if uploaded_file and api_key:
-    # Save the uploaded file temporarily
-    temp_filename = "temp_upload.mp4"
-    with open(temp_filename, "wb") as f:
-        f.write(uploaded_file.getbuffer())
-    
-    st.video(uploaded_file)
-    
-    if st.button("🚀 Generate Course", type="primary"):
-        output_dir = "course_output"
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            
-        generator = CourseGenerator(api_key=api_key, model_name=selected_model)
-        
-        # 1. Processing
-        with st.status("Processing Video...", expanded=True) as status:
-            st.write("⬆️ Prepare video...")
-            gemini_file = temp_filename 
-            
-            # 2. Analyze Structure
-            st.write(f"🎧 Extracting Audio & Transcribing (Groq Whisper)...")
-            st.write(f"🧠 Analyzing Topics (Llama 3 70B)...")
-            
-            modules, transcript_text = generator.analyze_structure(gemini_file)
-            
-            if not modules:
-                status.update(label="Analysis Failed", state="error")
-                st.error("Could not analyze video structure. Check API Key or video content.")
-                st.stop()
-                
-            st.write(f"📋 Found {len(modules)} topic-based modules.")
-            status.update(label="Structure Analyzed", state="complete")
-        
-
-     
-            # --- 1. GLOBAL OBJECTIVES ---
-            st.divider()
-            with st.spinner("Generating Course Objectives..."):
-                intro_content = generator.generate_course_intro(transcript_text)
-                intro_sections = parse_markdown_to_cards(intro_content)
-                render_cue_card("Course Objectives", intro_sections.get('objectives', intro_content), 'card-red')
+if uploaded_file and (api_key or backend_name != "groq"):
+    # Ingest the upload once (not on every rerun)
+    upload = st.session_state.get('upload')
+    if upload is None or upload['file_id'] != uploaded_file.file_id or not os.path.exists(upload['path']):
+        # Streamed to disk in chunks under its content hash; a file ingested before is reused as is
+        suffix = os.path.splitext(uploaded_file.name)[1].lower() or ".mp4"
+        path, _, reused = video_segmentor.ingest_media(
+            uploaded_file, UPLOAD_DIR, suffix=suffix, keep=[job.source_path] if job_running else ()
+        )
+        upload = {'file_id': uploaded_file.file_id, 'path': path, 'reused': reused}
+        st.session_state['upload'] = upload
+    if upload['reused']:
+        st.caption("♻️ This video was uploaded before: reusing the stored copy.")
 
-            # --- 2. MODULES (NOTES ONLY) ---
-            st.divider()
-            results_container = st.container()
-            progress_bar = st.progress(0)
-            
-            with VideoFileClip(temp_filename) as video:
-                for idx, module in enumerate(modules):
-                    progress = (idx) / len(modules)
-                    progress_bar.progress(progress, text=f"Processing Module {idx+1}/{len(modules)}: {module['topic_name']}")
-                    
-                    topic_clean = module['topic_name'].replace(" ", "_").replace("/", "-")
-                    base_name = f"{idx+1}_{topic_clean}"
-                    
-                    col1, col2 = results_container.columns([1, 1])
-                    
-                    with col1:
-                        st.subheader(f"Module {idx+1}: {module['topic_name']}")
-                        st.caption(f"Time: {module['start_time']}s - {module['end_time']}s")
-                        
-                        # Cut Video
-                        start = float(module['start_time'])
-                        end = float(module['end_time'])
-                        if end > video.duration: end = video.duration
-                        
-                        video_filename = f"{base_name}.mp4"
-                        save_path_video = os.path.join(output_dir, video_filename)
-                        
-                        if start < end:
-                            if not os.path.exists(save_path_video): 
-                                new_clip = video.subclipped(start_time=start, end_time=end)
-                                new_clip.write_videofile(save_path_video, codec="libx264", audio_codec="aac", logger=None)
-                            st.video(save_path_video)
-                    
-                    with col2:
-                        st.write("✍️ Generating Notes...")
-                        # Generate Text (NOTES ONLY)
-                        course_content = generator.generate_module_content(gemini_file, module['topic_name'], start, end, transcript_text)
-                        
-                        md_filename = f"{base_name}.md"
-                        save_path_md = os.path.join(output_dir, md_filename)
-                        with open(save_path_md, "w", encoding="utf-8") as f:
-                            f.write(course_content)
-                        
-                        with st.expander("View Notes", expanded=True):
-                            sections = parse_markdown_to_cards(course_content)
-                            # Render ONLY Notes (Green)
-                            render_cue_card("Notes", sections.get('notes', course_content), 'card-green')
-                            
-                            st.download_button(
-                                label="Download Notes",
-                                data=course_content,
-                                file_name=md_filename,
-                                mime="text/markdown",
-                                key=f"dl_{idx}"
-                            )
-                    
-                    if idx < len(modules) - 1:
-                        time.sleep(2)
-
-            progress_bar.progress(1.0, text="Completed!")
-            
-            # --- 3. GLOBAL OUTRO ---
-            st.divider()
-            with st.spinner("Generating Conclusions..."):
-                outro_content = generator.generate_course_outro(transcript_text)
-                outro_sections = parse_markdown_to_cards(outro_content)
-                
-                col_a, col_b = st.columns(2)
-                with col_a:
-                    render_cue_card("Definitions", outro_sections.get('definitions', ''), 'card-blue')
-                with col_b:
-                    render_cue_card("Practical Application", outro_sections.get('practical application', ''), 'card-yellow')
+    render_video(upload['path'])
+    
+    if st.button("🚀 Generate Course", type="primary", disabled=job_running):
+        settings = {
+            "encode_workers": encode_workers, "llm_workers": llm_workers, "export_mode": export_mode,
+            "frame_strategy": frame_strategy, "use_cache": use_cache, "backend": backend,
+            "min_duration": min_duration,
+        }
+        job = CourseJob(upload['path'], COURSE_OUTPUT_ROOT, api_key, selected_model, settings).start()
+        st.session_state['course_job'] = job
+        st.session_state['quiz_started'] = False
 
-            st.success("🎉 Course Generation Complete!")
-            
-            # --- 4. FINAL ASSESSMENT ---
-            st.divider()
-            st.header("🎓 Final Assessment")
-            with st.spinner("Generating Final Quiz..."):
-                 # Use FULL TRANSCRIPT for Quiz
-                 quiz_data = generator.generate_quiz(transcript_text)
-                 st.session_state['quiz_data'] = quiz_data
-                 st.session_state['quiz_started'] = True
+if job is not None:
+    if not job.done:
+        render_live_job(job)
+    else:
+        render_job(job)
+        # --- 4. FINAL ASSESSMENT ---
+        st.divider()
+        st.header("🎓 Final Assessment")
+        quiz_data = job.global_artifacts.get("quiz")
+        if quiz_data and not st.session_state.get('quiz_started'):
+            st.session_state['quiz_data'] = quiz_data
+            st.session_state['quiz_started'] = True
 
 if st.session_state.get('quiz_started'):
     st.markdown("---")
@@ -0,0 +1,1159 @@
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+import threading
+import base64
+import re
+import json
+import resource
+import tracemalloc
+import functools
+from io import BytesIO
+import argparse
+import subprocess
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+import imageio_ffmpeg
+import numpy as np
+
+# Import the CourseGenerator class from video-segmentor.py
+module_name = "video_segmentor"
+file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "video-segmentor.py")
+
+spec = importlib.util.spec_from_file_location(module_name, file_path)
+video_segmentor = importlib.util.module_from_spec(spec)
+sys.modules[module_name] = video_segmentor
+spec.loader.exec_module(video_segmentor)
+CourseGenerator = video_segmentor.CourseGenerator
+
+from fake_groq_server import FakeGroqServer
+
+
+def make_synthetic_video(path, duration=120, size="1280x720", fps=25):
+    """Generates a test video (moving test pattern + sine tone) with ffmpeg."""
+    if os.path.exists(path):
+        return path
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc=size={size}:rate={fps}",
+        "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", str(duration),
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest",
+        path,
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def make_slides_video(path, duration=120, slide_seconds=20, size=(1280, 720), fps=10):
+    """
+    Generates a slide-deck style video: a static coloured slide with a title bar that changes every
+    `slide_seconds` (plus a sine tone), i.e. long stretches of near-identical frames.
+    """
+    if os.path.exists(path):
+        return path
+    from PIL import Image, ImageDraw
+
+    work_dir = f"{path}.slides"
+    os.makedirs(work_dir, exist_ok=True)
+    rng = random.Random(len(path))
+    slides = max(1, int(duration // slide_seconds))
+    with open(os.path.join(work_dir, "list.txt"), "w") as f:
+        for i in range(slides):
+            img = Image.new("RGB", size, tuple(rng.randint(0, 255) for _ in range(3)))
+            draw = ImageDraw.Draw(img)
+            # Title bar, text lines and a figure at slide-specific positions
+            draw.rectangle([0, 0, size[0], rng.randint(size[1] // 10, size[1] // 4)], fill=tuple(rng.randint(0, 255) for _ in range(3)))
+            for _ in range(rng.randint(3, 8)):
+                x, y = rng.randint(0, size[0] // 2), rng.randint(size[1] // 4, size[1] - 40)
+                draw.rectangle([x, y, x + rng.randint(100, size[0] // 2), y + rng.randint(15, 40)], fill=(255, 255, 255))
+            x, y = rng.randint(0, size[0] - 300), rng.randint(size[1] // 4, size[1] - 200)
+            draw.ellipse([x, y, x + rng.randint(80, 300), y + rng.randint(80, 200)], fill=(0, 0, 0))
+            slide_path = os.path.join(work_dir, f"slide_{i}.png")
+            img.save(slide_path)
+            f.write(f"file '{os.path.abspath(slide_path)}'\nduration {slide_seconds}\n")
+        f.write(f"file '{os.path.abspath(slide_path)}'\n")
+
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", "-y",
+        "-f", "concat", "-safe", "0", "-i", os.path.join(work_dir, "list.txt"),
+        "-f", "lavfi", "-i", "sine=frequency=440",
+        "-t", str(duration), "-r", str(fps), "-pix_fmt", "yuv420p",
+        "-c:v", "libx264", "-preset", "ultrafast", "-c:a", "aac", "-shortest",
+        path,
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def make_lecture_audio(path, duration=1800, seed=0, sample_rate=16000):
+    """
+    Generates lecture-like mono audio: "speech" (noise shaped into 3-6 syllables per second at about -20 dBFS,
+    sentences separated by short pauses) with long near-silent stretches (-65 dBFS noise) of 10-120s in between,
+    like setup, breaks or silent screen-sharing. Returns the [(start, end), ...] of the silent stretches.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration * sample_rate)
+    audio = rng.normal(0.0, 10 ** (-65 / 20), total).astype(np.float32)
+    gaps, position = [], 0.0
+    while position < duration:
+        talk_end = min(duration, position + rng.uniform(60, 300))
+        t = position
+        while t < talk_end:
+            sentence = min(talk_end, t + rng.uniform(2, 8))
+            lo, hi = int(t * sample_rate), int(sentence * sample_rate)
+            times = np.arange(hi - lo) / sample_rate
+            envelope = np.clip(np.sin(2 * np.pi * rng.uniform(1.5, 3) * times), 0, None) ** 0.5
+            audio[lo:hi] += rng.normal(0.0, 10 ** (-17 / 20), hi - lo).astype(np.float32) * envelope
+            t = sentence + rng.uniform(0.2, 0.8)
+        gap = rng.uniform(10, 120)
+        if talk_end < duration:
+            gaps.append((talk_end, min(duration, talk_end + gap)))
+        position = talk_end + gap
+    if not os.path.exists(path):
+        pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype(np.int16)
+        subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", "-y", "-f", "s16le", "-ar", str(sample_rate),
+             "-ac", "1", "-i", "pipe:0", "-c:a", "aac", "-b:a", "64k", path],
+            input=pcm.tobytes(), check=True
+        )
+    return gaps
+
+
+def derived_video_path(args, tag):
+    """Per-variant synthetic video path next to --video, keyed by length so stale files are never reused."""
+    return args.video.replace(".mp4", f"_{tag}_{args.duration}s.mp4")
+
+
+def even_modules(duration, count):
+    """Splits [0, duration] into `count` equal modules."""
+    step = duration / count
+    return [
+        {"topic_name": f"Module {i+1}", "start_time": i * step, "end_time": (i + 1) * step}
+        for i in range(count)
+    ]
+
+
+# The fake server has no quota: benchmarks that are not about rate limiting run without client-side limits
+NO_RATE_LIMITS = {"default": (None, None)}
+
+
+def offline_generator():
+    """A CourseGenerator that never talks to the network (benchmarks only touch local stages)."""
+    return CourseGenerator(api_key="offline-benchmark")
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def bench_frames(args):
+    """Per-module `extract_frames_base64` vs single-pass `sample_module_frames`."""
+    video = make_synthetic_video(args.video, duration=args.duration)
+    generator = offline_generator()
+    modules = even_modules(args.duration, args.modules)
+
+    def per_module():
+        return {
+            idx: generator.extract_frames_base64(video, m['start_time'], m['end_time'], max_frames=5)
+            for idx, m in enumerate(modules)
+        }
+
+    baseline, t_base = timed(per_module)
+    frame_map, t_pass = timed(generator.sample_module_frames, video, modules, strategy="linspace")
+
+    frames = sum(len(f) for f in frame_map.values())
+    print(f"\n📊 Frame sampling: {args.modules} modules, {args.duration}s video, {frames} frames")
+    print(f"   per-module extract : {t_base:8.2f}s")
+    print(f"   single-pass sample : {t_pass:8.2f}s  ({t_base / t_pass:.1f}x)")
+    assert [len(f) for f in baseline.values()] == [len(f) for f in frame_map.values()]
+
+
+def bench_pipeline(args):
+    """Sequential (1 encoder, 1 request) vs concurrent module pipeline, with simulated LLM latency."""
+    video = make_synthetic_video(args.video, duration=args.duration)
+    modules = even_modules(args.duration, args.modules)
+    output_dir = "bench_output"
+    os.makedirs(output_dir, exist_ok=True)
+
+    report = {}
+    with FakeGroqServer(latency=args.latency) as server:
+        generator = CourseGenerator(api_key="offline-benchmark", base_url=server.base_url, rate_limits=NO_RATE_LIMITS)
+        frame_map = generator.sample_module_frames(video, modules)
+        for label, encode_workers, llm_workers in [
+            ("sequential", 1, 1),
+            ("concurrent", video_segmentor.ENCODE_WORKERS, video_segmentor.LLM_WORKERS),
+        ]:
+            _, report[label] = timed(
+                generator.process_modules, video, modules, video_segmentor.Transcript(), output_dir=output_dir,
+                frame_map=frame_map, encode_workers=encode_workers, llm_workers=llm_workers, use_cache=False
+            )
+
+    print(f"\n📊 Module pipeline: {args.modules} modules, {args.latency}s simulated LLM latency")
+    for label, seconds in report.items():
+        print(f"   {label:<11}: {seconds:8.2f}s")
+
+
+def stream_formats(path):
+    """
+    The pixel formats the video of `path` decodes to and the (profile_idc, level_idc, chroma_format_idc) of
+    every H.264 sequence parameter set in it: a clip players handle has one of each.
+    """
+    ffmpeg = imageio_ffmpeg.get_ffmpeg_exe()
+    decoded = subprocess.run([ffmpeg, "-hide_banner", "-i", path, "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+                             capture_output=True, text=True, check=True).stderr
+    headers = subprocess.run([ffmpeg, "-hide_banner", "-i", path, "-map", "0:v:0", "-c", "copy",
+                              "-bsf:v", "trace_headers", "-f", "null", "-"], capture_output=True, text=True, check=True).stderr
+    sps = [tuple(int(v) for v in match) for match in re.findall(
+        r"\bprofile_idc\s+\S+ = (\d+).*?\blevel_idc\s+\S+ = (\d+).*?\bchroma_format_idc\s+\S+ = (\d+)", headers, re.S
+    )]
+    return set(re.findall(r" fmt:(\w+)", decoded)), set(sps)
+
+
+def bench_export(args):
+    """
+    Clip export time per mode (reencode / copy / hybrid) on the same module plan, then a check that every
+    clip decodes with one stream format (a hybrid clip's re-encoded head must match its copied tail).
+    One topic has an apostrophe, which module file names keep.
+    """
+    video = make_synthetic_video(args.video, duration=args.duration)
+    modules = even_modules(args.duration, args.modules)
+    modules[0]["topic_name"] = "Newton's Laws"
+    output_dir = "bench_output"
+    os.makedirs(output_dir, exist_ok=True)
+
+    keyframes, t_probe = timed(video_segmentor.probe_keyframes, video)
+    video_format = video_segmentor.probe_video_format(video)
+    report, clips = {}, {}
+    for mode in video_segmentor.CLIP_EXPORT_MODES:
+        clips[mode] = [
+            os.path.join(output_dir, f"export_{mode}_{video_segmentor.module_base_name(idx, m['topic_name'])}.mp4")
+            for idx, m in enumerate(modules)
+        ]
+
+        def cut_all():
+            for m, save_path in zip(modules, clips[mode]):
+                video_segmentor.cut_clip(video, m['start_time'], m['end_time'], save_path, mode, keyframes, video_format)
+        _, report[mode] = timed(cut_all)
+
+    print(f"\n📊 Clip export: {args.modules} modules, {args.duration}s video, {len(keyframes)} keyframes (probe {t_probe:.2f}s)")
+    for mode, seconds in report.items():
+        print(f"   {mode:<9}: {seconds:8.2f}s  ({report['reencode'] / seconds:.1f}x)")
+
+    failures = []
+    for mode, paths in clips.items():
+        for path in paths:
+            pix_fmts, sps = stream_formats(path)
+            if len(pix_fmts) != 1 or len(sps) != 1:
+                failures.append(f"{os.path.basename(path)}: decodes as {sorted(pix_fmts)}, parameter sets {sorted(sps)}")
+            elif mode != "reencode" and pix_fmts != {video_format["pix_fmt"]}:
+                failures.append(f"{os.path.basename(path)}: {pix_fmts.pop()} instead of the source's {video_format['pix_fmt']}")
+    if failures:
+        print("❌ Clips change stream format mid-stream:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print(f"✅ Every clip has one stream format (source: {video_format['codec']} {video_format['pix_fmt']}).")
+
+
+def bench_keyframes(args):
+    """Images sent to the vision model and sampling time: linspace vs scene-aware selection on a slide video."""
+    video = make_slides_video(derived_video_path(args, "slides"), duration=args.duration)
+    generator = offline_generator()
+    modules = even_modules(args.duration, args.modules)
+
+    print(f"\n📊 Frame selection: {args.modules} modules, {args.duration}s slide video")
+    for strategy in video_segmentor.FRAME_STRATEGIES:
+        frame_map, seconds = timed(generator.sample_module_frames, video, modules, strategy=strategy)
+        images = sum(len(f) for f in frame_map.values())
+        payload = sum(len(b64) for f in frame_map.values() for b64 in f)
+        print(f"   {strategy:<9}: {images:4d} images, {payload / 1024:8.0f} KiB base64, sampling {seconds:6.2f}s")
+
+
+def legacy_sample_frames(video_path, modules, max_frames=5):
+    """The pre-scaling path: full-resolution decode, then thumbnail + JPEG + Base64 serially per frame."""
+    from PIL import Image
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    frames = []
+    with VideoFileClip(video_path) as clip:
+        for m in modules:
+            for t in video_segmentor.np.linspace(m['start_time'], min(m['end_time'], clip.duration) - 0.1, num=max_frames):
+                img = Image.fromarray(clip.get_frame(t))
+                img.thumbnail((640, 640))
+                buffered = BytesIO()
+                img.save(buffered, format="JPEG")
+                frames.append(base64.b64encode(buffered.getvalue()).decode("utf-8"))
+    return frames
+
+
+def traced(fn, *args, **kwargs):
+    """Runs fn and returns (result, seconds, peak traced Python/NumPy memory in MiB)."""
+    tracemalloc.start()
+    result, seconds = timed(fn, *args, **kwargs)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / (1024 * 1024)
+
+
+def bench_encode(args):
+    """Frames/sec and peak memory of vision frame extraction on 1080p and 4K synthetic inputs."""
+    generator = offline_generator()
+    print(f"\n📊 Vision frame extraction: {args.modules} modules x 5 frames, {args.duration}s videos")
+    for label, size in [("1080p", "1920x1080"), ("4K", "3840x2160")]:
+        video = make_synthetic_video(derived_video_path(args, label), duration=args.duration, size=size, fps=5)
+        modules = even_modules(args.duration, args.modules)
+
+        legacy, t_legacy, mem_legacy = traced(legacy_sample_frames, video, modules)
+        frame_map, t_new, mem_new = traced(generator.sample_module_frames, video, modules, strategy="linspace")
+        frames = sum(len(f) for f in frame_map.values())
+        assert frames == len(legacy)
+
+        print(f"   {label:<5} full decode + serial encode : {frames / t_legacy:6.1f} frames/s, peak {mem_legacy:7.1f} MiB")
+        print(f"   {label:<5} scaled decode + pool encode : {frames / t_new:6.1f} frames/s, peak {mem_new:7.1f} MiB")
+
+
+def legacy_transcript_filter(transcript_text, start, end):
+    """The pre-Transcript per-module filter: re-split and re-parse the whole transcript string."""
+    relevant_lines = []
+    for line in transcript_text.split('\n'):
+        if "[" in line and "]" in line:
+            try:
+                time_part = line.split("]")[0].replace("[", "")
+                t_start, t_end = map(float, time_part.replace("s", "").split("-"))
+                if t_start >= start and t_start <= end:
+                    relevant_lines.append(line)
+            except ValueError:
+                continue
+    return "\n".join(relevant_lines)
+
+
+def bench_transcript(args):
+    """Per-module transcript slicing: legacy string parsing vs Transcript interval queries."""
+    count = args.segments
+    transcript = video_segmentor.Transcript(
+        [i * 3.0 for i in range(count)], [i * 3.0 + 2.5 for i in range(count)], [f"segment {i}" for i in range(count)]
+    )
+    transcript_text = transcript.render()
+    modules = even_modules(count * 3.0, args.modules)
+
+    legacy, t_legacy = timed(lambda: [legacy_transcript_filter(transcript_text, m['start_time'], m['end_time']) for m in modules])
+    indexed, t_indexed = timed(lambda: [transcript.render_range(m['start_time'], m['end_time']) for m in modules])
+    assert legacy == indexed
+
+    print(f"\n📊 Transcript slicing: {count} segments, {args.modules} modules")
+    print(f"   string re-parse : {t_legacy * 1000:8.1f}ms")
+    print(f"   interval query  : {t_indexed * 1000:8.1f}ms  ({t_legacy / t_indexed:.0f}x)")
+
+
+def legacy_smart_merge(modules, min_duration=60):
+    """The original O(n^2) smart_merge_modules loop (without logging), kept as the reference implementation."""
+    if not modules: return []
+    current_modules = modules.copy()
+    while True:
+        too_short_index = -1
+        shortest_duration = float('inf')
+        for i, mod in enumerate(current_modules):
+            dur = mod['end_time'] - mod['start_time']
+            if dur < min_duration and dur < shortest_duration:
+                shortest_duration = dur
+                too_short_index = i
+        if too_short_index == -1 or len(current_modules) <= 1:
+            break
+        target_idx = too_short_index
+        if target_idx > 0:
+            prev_mod = current_modules[target_idx - 1]
+            short_mod = current_modules[target_idx]
+            prev_dur = prev_mod['end_time'] - prev_mod['start_time']
+            short_dur = short_mod['end_time'] - short_mod['start_time']
+            new_name = prev_mod['topic_name'] if prev_dur >= short_dur else short_mod['topic_name']
+            merged_mod = {"topic_name": new_name, "start_time": prev_mod['start_time'], "end_time": short_mod['end_time']}
+            current_modules = current_modules[:target_idx-1] + [merged_mod] + current_modules[target_idx+1:]
+        else:
+            short_mod = current_modules[0]
+            next_mod = current_modules[1]
+            short_dur = short_mod['end_time'] - short_mod['start_time']
+            next_dur = next_mod['end_time'] - next_mod['start_time']
+            new_name = next_mod['topic_name'] if next_dur >= short_dur else short_mod['topic_name']
+            merged_mod = {"topic_name": new_name, "start_time": short_mod['start_time'], "end_time": next_mod['end_time']}
+            current_modules = [merged_mod] + current_modules[2:]
+    return current_modules
+
+
+def random_segments(rng, count, max_len=90, integer=False):
+    """Contiguous candidate segments with random (optionally integer, to force duration ties) lengths."""
+    segments, t = [], 0.0
+    for i in range(count):
+        length = rng.randint(0, max_len) if integer else rng.uniform(0, max_len)
+        segments.append({"topic_name": f"Topic {i} " + "x" * rng.randint(0, 3), "start_time": t, "end_time": t + length})
+        t += length
+    return segments
+
+
+def bench_merge(args):
+    """Randomised equivalence check against the legacy merge loop, then timing at --segments candidates."""
+    generator = offline_generator()
+    rng = random.Random(args.seed)
+    for case in range(args.cases):
+        segments = random_segments(rng, rng.randint(0, 60), integer=case % 2 == 0)
+        min_duration = rng.choice([0, 30, 60, 120])
+        expected = legacy_smart_merge(segments, min_duration)
+        actual = generator.smart_merge_modules(segments, min_duration)
+        assert actual == expected, f"Mismatch on case {case} (min_duration={min_duration})"
+    print(f"\n✅ smart_merge_modules matches the legacy loop on {args.cases} random plans.")
+
+    segments = random_segments(rng, args.segments)
+    legacy, t_legacy = timed(legacy_smart_merge, segments, 60)
+    engine, t_engine = timed(generator.smart_merge_modules, segments, 60)
+    assert legacy == engine
+
+    print(f"📊 Module merge: {args.segments} candidate segments -> {len(engine)} modules")
+    print(f"   legacy loop : {t_legacy:8.3f}s")
+    print(f"   heap engine : {t_engine:8.3f}s  ({t_legacy / t_engine:.0f}x)")
+
+
+# Stages of CourseGenerator.process_video timed by the end-to-end benchmark (nested stages overlap their parents)
+E2E_STAGES = [
+    "analyze_structure", "transcribe", "extract_audio", "_transcribe_file",
+    "sample_module_frames", "process_modules", "_write_module_notes", "_chat_completion",
+]
+
+
+class StageRecorder:
+    """Wraps CourseGenerator methods to accumulate wall time, CPU time and call counts per stage."""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, obj, name):
+        method = getattr(obj, name)
+
+        @functools.wraps(method)
+        def timed_method(*args, **kwargs):
+            wall, cpu = time.perf_counter(), time.thread_time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                wall, cpu = time.perf_counter() - wall, time.thread_time() - cpu
+                with self._lock:
+                    stage = self.stages.setdefault(name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+                    stage["calls"] += 1
+                    stage["wall_s"] += wall
+                    stage["cpu_s"] += cpu
+
+        setattr(obj, name, timed_method)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(file_path)).stdout.strip()
+    except OSError:
+        return None
+
+
+def bench_e2e(args):
+    """
+    Full process_video run on a synthetic slide video against the local fake Groq server.
+    Writes per-stage wall/CPU time and peak RSS to a JSON report; --compare prints deltas to an older report.
+    """
+    video = make_slides_video(derived_video_path(args, "slides"), duration=args.duration)
+    output_dir = "bench_output"
+    # Fresh output (no checkpoint to resume) and fresh caches every run so every stage does its full work
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_dir = tempfile.mkdtemp(prefix="bench_cache_")
+
+    with FakeGroqServer(latency=args.latency, modules=args.modules) as server:
+        generator = CourseGenerator(
+            api_key="offline-benchmark", base_url=server.base_url, rate_limits=NO_RATE_LIMITS,
+            transcript_cache=video_segmentor.TranscriptCache(os.path.join(cache_dir, "transcripts")),
+            completion_cache=video_segmentor.CompletionCache(os.path.join(cache_dir, "completions.sqlite3")),
+        )
+        recorder = StageRecorder()
+        for name in E2E_STAGES:
+            recorder.wrap(generator, name)
+
+        cpu_start = os.times()
+        _, wall = timed(
+            generator.process_video, video, output_dir=output_dir, export_mode=args.export_mode, use_cache=False
+        )
+        cpu_end = os.times()
+        requests = dict(server.stats)
+        stages = json.loads(json.dumps(recorder.stages))
+        metrics = {"totals": dict(generator.metrics.totals), "stages": generator.metrics.report()["stages"]}
+
+        # A second run over the finished output only validates the checkpoint manifest
+        _, resume_wall = timed(
+            generator.process_video, video, output_dir=output_dir, export_mode=args.export_mode, use_cache=False
+        )
+        resume_requests = sum(server.stats.values()) - sum(requests.values())
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "duration": args.duration, "modules": args.modules, "latency": args.latency,
+            "export_mode": args.export_mode, "encode_workers": video_segmentor.ENCODE_WORKERS,
+            "llm_workers": video_segmentor.LLM_WORKERS,
+        },
+        "total": {
+            "wall_s": wall,
+            "cpu_s": (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system),
+            "children_cpu_s": (cpu_end.children_user - cpu_start.children_user)
+                              + (cpu_end.children_system - cpu_start.children_system),
+        },
+        "peak_rss_mb": self_usage.ru_maxrss / 1024,
+        "children_peak_rss_mb": children_usage.ru_maxrss / 1024,
+        "stages": stages,
+        "requests": requests,
+        "metrics": metrics,
+        "resume": {"wall_s": resume_wall, "requests": resume_requests},
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\n📊 End-to-end ({args.duration}s video, {args.modules} modules, {args.latency}s API latency) -> {args.report}")
+    print(f"   {'total':<22} wall {wall:8.2f}s   cpu {report['total']['cpu_s']:7.2f}s   (+children {report['total']['children_cpu_s']:.2f}s)")
+    for name, stage in report["stages"].items():
+        print(f"   {name:<22} wall {stage['wall_s']:8.2f}s   cpu {stage['cpu_s']:7.2f}s   calls {stage['calls']}")
+    print(f"   peak RSS {report['peak_rss_mb']:.0f} MiB (children {report['children_peak_rss_mb']:.0f} MiB), requests {requests}")
+    print(f"   {'resume (all done)':<22} wall {resume_wall:8.2f}s   requests {resume_requests}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"\n📈 Compared with {args.compare} (revision {baseline.get('revision')}):")
+        rows = [("total", baseline["total"], report["total"])] + [
+            (name, baseline["stages"].get(name), stage) for name, stage in report["stages"].items()
+        ]
+        for name, old, new in rows:
+            if old and old["wall_s"] > 0:
+                change = (new["wall_s"] - old["wall_s"]) / old["wall_s"] * 100
+                print(f"   {name:<22} {old['wall_s']:8.2f}s -> {new['wall_s']:8.2f}s  ({change:+.0f}%)")
+        print(f"   {'peak RSS':<22} {baseline['peak_rss_mb']:8.0f}MB -> {report['peak_rss_mb']:8.0f}MB")
+
+
+def bench_ingest(args):
+    """
+    Upload ingestion: legacy (write getbuffer() to temp_upload.mp4) vs. chunked, content-addressed ingest_media,
+    for a first and a repeated upload of the same file. Both include the source hash the job needs afterwards.
+    """
+    upload = BytesIO(video_segmentor.np.random.default_rng(args.seed).bytes(args.upload_mb * 1024 * 1024))
+    work_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+
+    def legacy():
+        path = os.path.join(work_dir, "temp_upload.mp4")
+        with open(path, "wb") as f:
+            f.write(upload.getbuffer())
+        return video_segmentor.file_sha256(path)
+
+    def ingest():
+        path, sha256, reused = video_segmentor.ingest_media(upload, os.path.join(work_dir, "uploads"))
+        assert video_segmentor.cached_file_sha256(path) == sha256
+        return reused
+
+    try:
+        _, t_legacy, mem_legacy = traced(legacy)
+        reused_first, t_first, mem_first = traced(ingest)
+        reused_again, t_again, mem_again = traced(ingest)
+        assert not reused_first and reused_again
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n📊 Upload ingestion: {args.upload_mb} MiB upload (already in memory, as Streamlit holds it)")
+    print(f"   {'legacy':<16}: {t_legacy:6.2f}s, peak +{mem_legacy:7.1f} MiB")
+    print(f"   {'ingest (new)':<16}: {t_first:6.2f}s, peak +{mem_first:7.1f} MiB")
+    print(f"   {'ingest (repeat)':<16}: {t_again:6.2f}s, peak +{mem_again:7.1f} MiB (no disk write)")
+
+
+def bench_stress(args):
+    """
+    --jobs concurrent course jobs in ONE process (like Streamlit sessions sharing a server) against the fake
+    Groq server, with shared caches. Videos differ in length; the last job reuses the first job's video.
+    Checks that no job sees another job's files: own output dir, own plan and source hash, clips as long as
+    their own modules, notes for their own time ranges, temp dirs removed, nothing written to the cwd.
+    """
+    videos = [
+        make_slides_video(args.video.replace(".mp4", f"_stress{k}_{args.duration + 30 * k}s.mp4"),
+                          duration=args.duration + 30 * k)
+        for k in range(max(1, args.jobs - 1))
+    ]
+    videos.append(videos[0])
+    root = tempfile.mkdtemp(prefix="bench_stress_")
+    cwd_before = set(os.listdir("."))
+    transcript_cache = video_segmentor.TranscriptCache(os.path.join(root, "cache", "transcripts"))
+    completion_cache_path = os.path.join(root, "cache", "completions.sqlite3")
+
+    def run_job(k):
+        name = video_segmentor.cached_file_sha256(videos[k])[:16]
+        with video_segmentor.JobWorkspace(os.path.join(root, "output"), name) as workspace:
+            generator = CourseGenerator(
+                api_key="offline-benchmark", base_url=server.base_url, transcript_cache=transcript_cache,
+                completion_cache=video_segmentor.CompletionCache(completion_cache_path), work_dir=workspace.temp_dir,
+                rate_limits=NO_RATE_LIMITS
+            )
+            results, wall = timed(
+                generator.process_video, videos[k], output_dir=workspace.output_dir, export_mode=args.export_mode
+            )
+            return {"output_dir": workspace.output_dir, "temp_dir": workspace.temp_dir, "results": results, "wall": wall}
+
+    with FakeGroqServer(latency=args.latency, modules=args.modules) as server:
+        with ThreadPoolExecutor(max_workers=len(videos)) as pool:
+            jobs, wall = timed(lambda: list(pool.map(run_job, range(len(videos)))))
+
+    failures = []
+    try:
+        if len({job["output_dir"] for job in jobs}) != len(jobs):
+            failures.append("jobs shared an output directory")
+        for k, job in enumerate(jobs):
+            label = f"job {k} ({os.path.basename(videos[k])})"
+            if os.path.exists(job["temp_dir"]):
+                failures.append(f"{label}: temp dir {job['temp_dir']} left behind")
+            if not job["results"]:
+                failures.append(f"{label}: no results")
+                continue
+            with open(os.path.join(job["output_dir"], video_segmentor.MANIFEST_NAME), encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest["source"]["sha256"] != video_segmentor.file_sha256(videos[k]):
+                failures.append(f"{label}: manifest belongs to another video")
+            duration = video_segmentor.ffmpeg_parse_infos(videos[k])["duration"]
+            if abs(job["results"][-1]["end_time"] - duration) > 1.0:
+                failures.append(f"{label}: plan ends at {job['results'][-1]['end_time']}s, video is {duration:.1f}s")
+            own_files = set()
+            for result in job["results"]:
+                own_files |= {os.path.basename(result["video_path"]), os.path.basename(result["md_path"])}
+                clip_duration = video_segmentor.ffmpeg_parse_infos(result["video_path"])["duration"]
+                expected = result["end_time"] - result["start_time"]
+                # Stream copy starts on the keyframe before the cut, so its clips may run long (never short)
+                slack = (-2.5, float("inf")) if args.export_mode == "copy" else (-2.5, 2.5)
+                if not slack[0] <= clip_duration - expected <= slack[1]:
+                    failures.append(f"{label}: clip {result['index']+1} is {clip_duration:.1f}s, module is {expected:.1f}s")
+                with open(result["md_path"], encoding="utf-8") as f:
+                    notes = f.read()
+                if f"segment {result['start_time']}s - {result['end_time']}s" not in notes:
+                    failures.append(f"{label}: notes {result['index']+1} are not for its own time range")
+            stray = {
+                name for name in os.listdir(job["output_dir"]) if name.endswith((".mp4", ".md"))
+            } - own_files
+            if stray:
+                failures.append(f"{label}: files from another job in its output dir: {sorted(stray)}")
+        written = set(os.listdir(".")) - cwd_before
+        if written:
+            failures.append(f"files written to the working directory: {sorted(written)}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n📊 Stress: {len(jobs)} concurrent jobs ({args.modules} modules each, {args.latency}s API latency) in {wall:.1f}s")
+    for k, job in enumerate(jobs):
+        print(f"   job {k}: {os.path.basename(videos[k]):<36} {job['wall']:7.1f}s  -> {os.path.basename(job['output_dir'])}")
+    if failures:
+        print("❌ Cross-talk detected:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("✅ No cross-talk: every job only saw its own files.")
+
+
+def bench_ratelimit(args):
+    """
+    --requests chat completions from 2 x LLM_WORKERS threads against a fake server that allows --rpm requests
+    per minute and fails --error-rate of them with 429/503: the plain SDK client (its own 2 retries) vs the
+    rate-limited GroqBackend configured with the server's quota. Reports failures, 429s and achieved throughput.
+    """
+    threads = 2 * video_segmentor.LLM_WORKERS
+    messages = [{"role": "user", "content": "Summarize the provided PART of the course."}]
+    model = video_segmentor.STRUCTURE_MODEL
+    results = {}
+
+    for label in ("sdk", "rate_limited"):
+        with FakeGroqServer(latency=args.latency, rpm=args.rpm, error_rate=args.error_rate) as server:
+            if label == "sdk":
+                sdk = video_segmentor.Groq(api_key="offline-benchmark", base_url=server.base_url)
+                send = lambda: sdk.chat.completions.create(model=model, messages=messages)
+                client = None
+            else:
+                client = video_segmentor.GroqBackend(
+                    "offline-benchmark", server.base_url, limits={"default": (args.rpm, None)}
+                )
+                send = lambda: client.chat(model, messages)
+
+            def request(_):
+                try:
+                    send()
+                    return True
+                except Exception:
+                    return False
+
+            with ThreadPoolExecutor(max_workers=threads) as pool:
+                outcomes, wall = timed(lambda: list(pool.map(request, range(args.requests))))
+            results[label] = {
+                "ok": sum(outcomes), "failed": len(outcomes) - sum(outcomes), "wall": wall,
+                "rejected": server.stats.get("rate_limited", 0) + server.stats.get("injected_429", 0)
+                            + server.stats.get("injected_503", 0),
+                "client": client.stats() if client else None,
+            }
+
+    print(f"\n📊 Rate limits: {args.requests} requests, {threads} threads, server quota {args.rpm} rpm, "
+          f"{args.error_rate:.0%} injected errors")
+    for label, r in results.items():
+        print(f"   {label:<13}: {r['ok']:4d} ok {r['failed']:4d} failed  {r['rejected']:4d} rejected by server  "
+              f"{r['wall']:6.1f}s  ({r['ok'] / r['wall'] * 60:6.1f} ok/min)")
+    stats = results["rate_limited"]["client"]
+    print(f"   client: {stats['wait_seconds']:.1f}s waiting for its buckets (summed over threads), {stats['retries']} retries "
+          f"({stats['rate_limited']} after 429s)")
+
+
+def bench_backends(args):
+    """
+    Every inference backend against the fake server (the "openai" one through its /v1 routes, as it would
+    talk to a local Ollama or vLLM): transcription, a vision completion, and --modules text prompts sent
+    one by one vs as one chat_batch. Checks the answers are the same shape on every backend.
+    """
+    video = make_slides_video(derived_video_path(args, "slides"), duration=args.duration)
+    audio = tempfile.NamedTemporaryFile(suffix=".mp3", delete=False).name
+    generator = offline_generator()
+    generator.extract_audio(video, audio)
+    with open(audio, "rb") as f:
+        audio_bytes = f.read()
+    os.remove(audio)
+    frame = generator.extract_frames_base64(video, 0, args.duration, max_frames=1)[0]
+    prompts = [
+        [{"role": "user", "content": f"Summarize the provided PART {i} of the course."}] for i in range(args.modules)
+    ]
+    vision = [{"role": "user", "content": [
+        {"type": "text", "text": "Describe the slide."},
+        {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{frame}"}},
+    ]}]
+    model = video_segmentor.STRUCTURE_MODEL
+
+    print(f"\n📊 Backends: {args.modules} prompts, {args.latency}s server latency, {args.duration}s audio")
+    with FakeGroqServer(latency=args.latency) as server:
+        for name in video_segmentor.BACKENDS:
+            base_url = server.base_url if name == "groq" else f"{server.base_url}/v1"
+            backend = video_segmentor.BACKEND_CLASSES[name]("offline-benchmark", base_url, limits=NO_RATE_LIMITS)
+            transcription = backend.transcribe(video_segmentor.WHISPER_MODEL, ("audio.mp3", audio_bytes),
+                                               response_format="verbose_json")
+            segments = getattr(transcription, "segments", None) or []
+            described = backend.chat(video_segmentor.VISION_MODEL_DEFAULT, vision).choices[0].message.content
+            _, t_serial = timed(lambda: [backend.chat(model, messages) for messages in prompts])
+            batch, t_batch = timed(backend.chat_batch, [{"model": model, "messages": m} for m in prompts])
+            failed = [r for r in batch if isinstance(r, Exception)]
+            print(f"   {name:<7}: {len(segments):3d} segments (to {segments[-1]['end'] if segments else 0:.0f}s), "
+                  f"{len(backend.list_models())} models, vision ok={bool(described)}  "
+                  f"serial {t_serial:6.2f}s  batch {t_batch:6.2f}s ({t_serial / t_batch:.1f}x, "
+                  f"{backend.batch_concurrency} in flight), {len(failed)} failed")
+            assert segments and described and not failed
+
+
+class FfmpegProcessCounter:
+    """Counts the ffmpeg processes started in this process while active: probes, frame/audio readers, other work."""
+
+    def __init__(self):
+        self.counts = {"probe": 0, "frame_reader": 0, "audio_reader": 0, "other": 0}
+
+    def __enter__(self):
+        counts = self.counts
+        self._popen = subprocess.Popen
+
+        class CountingPopen(self._popen):
+            def __init__(self, args, *a, **kw):
+                if isinstance(args, (list, tuple)) and args and "ffmpeg" in os.path.basename(str(args[0])):
+                    if "image2pipe" in args:
+                        counts["frame_reader"] += 1
+                    elif "s16le" in args:
+                        counts["audio_reader"] += 1
+                    elif args[-2] == "-i" or args[-3:] == ["-f", "null", "-"]:
+                        counts["probe"] += 1 # `ffmpeg -i <file>` with no output
+                    else:
+                        counts["other"] += 1
+                super().__init__(args, *a, **kw)
+
+        subprocess.Popen = CountingPopen
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen = self._popen
+
+
+def legacy_reencode_clip(source_path, start, end, save_path):
+    """The pre-MediaSession reencode cut: moviepy opens (and probes) the source and pipes every frame through Python."""
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    with VideoFileClip(source_path) as video:
+        video.subclipped(start_time=start, end_time=end).write_videofile(
+            save_path, codec="libx264", audio_codec="aac", logger=None
+        )
+
+
+def bench_media(args):
+    """
+    One job's media work on a long slide video, --modules modules: every step opening the file itself
+    (as before MediaSession: probe for the duration, audio, frames, moviepy reencode cuts) vs one shared
+    MediaSession (one probe, one decoder warmed up in the background, audio extracted while frames are
+    sampled, ffmpeg reencode cuts). Reports ffmpeg processes by kind and wall time per stage.
+    """
+    from moviepy.video.io.VideoFileClip import VideoFileClip
+
+    video = make_slides_video(derived_video_path(args, "slides"), duration=args.duration)
+    # Clamped to the decodable length, as process_modules does
+    duration = video_segmentor.ffmpeg_parse_infos(video)["video_duration"]
+    modules = [{**m, "end_time": min(m["end_time"], duration)} for m in even_modules(args.duration, args.modules)]
+    generator = offline_generator()
+    work_dir = tempfile.mkdtemp(prefix="bench_media_")
+    report = {}
+
+    def per_call(stages):
+        with VideoFileClip(video, audio=False) as clip:
+            stages["plan probe"] = clip.duration
+        _, stages["audio"] = timed(generator.extract_audio, video, os.path.join(work_dir, "legacy.mp3"))
+        _, stages["frames"] = timed(generator.sample_module_frames, video, modules)
+        _, stages["cuts"] = timed(lambda: [
+            legacy_reencode_clip(video, m["start_time"], m["end_time"], os.path.join(work_dir, f"legacy_{i}.mp4"))
+            for i, m in enumerate(modules)
+        ])
+
+    def shared(stages):
+        with video_segmentor.MediaSession(video) as media:
+            media.prefetch(frame_size=generator.frame_max_size)
+            stages["plan probe"] = media.duration
+            with ThreadPoolExecutor(max_workers=1) as pool:
+                audio = pool.submit(timed, generator.extract_audio, media, os.path.join(work_dir, "session.mp3"))
+                _, stages["frames"] = timed(generator.sample_module_frames, media, modules)
+                _, stages["audio"] = audio.result()
+            _, stages["cuts"] = timed(lambda: [
+                video_segmentor.cut_clip(media.path, m["start_time"], m["end_time"],
+                                         os.path.join(work_dir, f"session_{i}.mp4"), "reencode")
+                for i, m in enumerate(modules)
+            ])
+
+    try:
+        for label, run in (("per-call", per_call), ("session", shared)):
+            stages = {}
+            with FfmpegProcessCounter() as counter:
+                _, wall = timed(run, stages)
+            stages.pop("plan probe")
+            report[label] = {"wall": wall, "stages": stages, "processes": counter.counts}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print(f"\n📊 Media access: {args.duration}s video, {args.modules} modules")
+    for label, r in report.items():
+        procs = ", ".join(f"{kind} {n}" for kind, n in r["processes"].items())
+        stages = "  ".join(f"{stage} {seconds:6.2f}s" for stage, seconds in r["stages"].items())
+        print(f"   {label:<9}: wall {r['wall']:7.2f}s  ({stages})")
+        print(f"   {'':<9}  ffmpeg processes: {procs}")
+    print(f"   speedup  : {report['per-call']['wall'] / report['session']['wall']:.1f}x")
+
+
+def bench_incremental(args):
+    """
+    Re-segmenting a finished course: a full run keeps every raw module (min_duration 0), then a run with a
+    higher min_duration merges the short ones, then one module boundary is edited by hand. Every run goes to
+    the fake Groq server without the completion cache, and each incremental run is compared with a full run
+    of the same plan into an empty directory. Checks that only changed modules got new notes requests, that
+    the carried-over clips and notes are byte-identical and that no artifact of an old plan is left behind.
+    """
+    video = make_slides_video(derived_video_path(args, "slides"), duration=args.duration)
+    root = tempfile.mkdtemp(prefix="bench_incremental_")
+    output_dir = os.path.join(root, "course")
+    # Every 4th raw module is short, so a min_duration between the two lengths merges exactly those
+    weights = [1 if i % 4 == 1 else 4 for i in range(args.modules)]
+    short, long = (args.duration * w / sum(weights) for w in (1, 4))
+    min_duration = (short + long) / 2
+
+    def artifacts(results):
+        return {
+            (r["topic_name"], r["start_time"], r["end_time"]): (video_segmentor.file_sha256(r["video_path"]),
+                                                                 video_segmentor.file_sha256(r["md_path"]))
+            for r in results
+        }
+
+    def run(directory, **kwargs):
+        generator = CourseGenerator(
+            api_key="offline-benchmark", base_url=server.base_url, rate_limits=NO_RATE_LIMITS,
+            transcript_cache=video_segmentor.TranscriptCache(os.path.join(root, "transcripts")),
+            completion_cache=video_segmentor.CompletionCache(os.path.join(root, "completions.sqlite3")),
+        )
+        notes_before = server.stats.get("notes", 0)
+        results, wall = timed(generator.process_video, video, output_dir=directory, export_mode=args.export_mode,
+                              use_cache=False, **kwargs)
+        return results, wall, server.stats.get("notes", 0) - notes_before
+
+    rows, failures = [], []
+    try:
+        with FakeGroqServer(latency=args.latency, weights=weights) as server:
+            first, wall, notes = run(output_dir, min_duration=0)
+            rows.append(("full run", len(first), wall, notes, None))
+
+            def edit_boundary():
+                # The checkpointed plan, as a user would edit it: the boundary in its middle moves by 5s
+                with open(os.path.join(output_dir, video_segmentor.MANIFEST_NAME), encoding="utf-8") as f:
+                    edited = json.load(f)["modules"]
+                middle = len(edited) // 2
+                edited[middle - 1]["end_time"] = edited[middle]["start_time"] = round(edited[middle]["start_time"] + 5.0, 2)
+                return {"modules": edited}
+
+            steps = [(f"min_duration {min_duration:.0f}s", lambda: {"min_duration": min_duration}),
+                     ("edit a boundary", edit_boundary)]
+
+            previous = first
+            for label, make_kwargs in steps:
+                before = artifacts(previous)
+                results, wall, notes = run(output_dir, **make_kwargs())
+                unchanged = [r for r in results if (r["topic_name"], r["start_time"], r["end_time"]) in before]
+                changed = len(results) - len(unchanged)
+                fresh_dir = os.path.join(root, f"fresh_{len(rows)}")
+                _, fresh_wall, _ = run(fresh_dir, modules=[
+                    {"topic_name": r["topic_name"], "start_time": r["start_time"], "end_time": r["end_time"]} for r in results
+                ])
+                rows.append((label, len(results), wall, notes, fresh_wall))
+
+                after = artifacts(unchanged)
+                for key, hashes in after.items():
+                    if hashes != before[key]:
+                        failures.append(f"{label}: '{key[0]}' was carried over but its files changed")
+                if notes != changed:
+                    failures.append(f"{label}: {notes} notes requests for {changed} changed modules")
+                expected = {os.path.basename(path) for r in results for path in (r["video_path"], r["md_path"])}
+                on_disk = {name for name in os.listdir(output_dir) if name.endswith((".mp4", ".md", ".moving"))}
+                if on_disk != expected:
+                    failures.append(f"{label}: stale or missing files {sorted(on_disk ^ expected)}")
+                previous = results
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n📊 Incremental re-segmentation ({args.duration}s video, {args.modules} raw modules, {args.latency}s API latency)")
+    for label, modules, wall, notes, fresh_wall in rows:
+        fresh = f"   (full run of this plan {fresh_wall:6.2f}s, {fresh_wall / wall:.1f}x)" if fresh_wall else ""
+        print(f"   {label:<20} {modules:3d} modules  wall {wall:6.2f}s  notes requests {notes:3d}{fresh}")
+    if failures:
+        print("❌ Incremental run redid or left behind the wrong artifacts:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("✅ Only changed modules were redone; carried-over artifacts are identical and nothing stale is left.")
+
+
+def bench_vad(args):
+    """
+    Transcription of lecture-like audio with long silent stretches against the fake Groq server (whose
+    transcription time grows with the audio length), with and without the VAD pre-filter. Reports upload bytes
+    and transcription time, and checks the silence map against the known gaps: most of each gap is skipped,
+    no speech is, and every mapped-back segment starts on the original timeline outside the skipped audio.
+    """
+    audio = args.video.replace(".mp4", f"_lecture_{args.duration}s.m4a")
+    gaps = make_lecture_audio(audio, duration=args.duration, seed=args.seed)
+    cache_dir = tempfile.mkdtemp(prefix="bench_vad_")
+    runs = {}
+    try:
+        with FakeGroqServer(latency=args.latency, transcribe_latency=0.2, transcribe_speed=100) as server:
+            for label, skip in (("full audio", None), ("vad", video_segmentor.VAD_SKIP_SILENCE)):
+                generator = CourseGenerator(
+                    api_key="offline-benchmark", base_url=server.base_url, rate_limits=NO_RATE_LIMITS,
+                    work_dir=cache_dir
+                )
+                (segments, silences), wall = timed(generator._transcribe_chunked, audio, skip_silence=skip)
+                stages = generator.metrics.report()["stages"]
+                runs[label] = {
+                    "wall": wall, "segments": segments, "silences": silences,
+                    "upload_bytes": generator.metrics.totals.get("upload_bytes", 0),
+                    "skipped": generator.metrics.totals.get("vad_skipped_seconds", 0.0),
+                    "vad": stages["vad"]["seconds"], "api": stages["api.transcribe"]["seconds"],
+                }
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    failures = []
+    vad = runs["vad"]
+    timeline = video_segmentor.SpeechTimeline(args.duration, vad["silences"])
+    skipped = [(end, start) for (_, end), (start, _) in zip(timeline.regions, timeline.regions[1:])]
+
+    def overlap(a, b):
+        return sum(max(0.0, min(x1, y1) - max(x0, y0)) for x0, x1 in a for y0, y1 in b)
+
+    gap_total = sum(end - start for start, end in gaps)
+    recall = overlap(gaps, skipped) / gap_total if gap_total else 1.0
+    speech_lost = sum(end - start for start, end in skipped) - overlap(gaps, skipped)
+    if recall < 0.9:
+        failures.append(f"only {recall:.0%} of the silent stretches were skipped")
+    if speech_lost > 1.0:
+        failures.append(f"{speech_lost:.1f}s of speech was cut out")
+    inside = [seg["start"] for seg in vad["segments"]
+              if any(start + 0.05 < seg["start"] < end - 0.05 for start, end in skipped)]
+    if inside:
+        failures.append(f"{len(inside)} segments start inside skipped audio, e.g. at {inside[0]:.2f}s")
+    if vad["segments"] and vad["segments"][-1]["end"] > args.duration + 0.5:
+        failures.append(f"last segment ends at {vad['segments'][-1]['end']:.1f}s, past the audio")
+
+    full = runs["full audio"]
+    print(f"\n📊 VAD pre-filter: {args.duration}s lecture audio, {len(gaps)} silent stretches ({gap_total:.0f}s, "
+          f"{gap_total / args.duration:.0%})")
+    for label, r in runs.items():
+        print(f"   {label:<10}: wall {r['wall']:6.2f}s  upload {r['upload_bytes'] / 1e6:6.2f} MB  "
+              f"transcription {r['api']:6.2f}s  vad {r['vad']:5.2f}s  skipped {r['skipped']:6.0f}s  "
+              f"segments {len(r['segments'])}")
+    print(f"   saved    : {(1 - vad['upload_bytes'] / full['upload_bytes']):.0%} upload bytes, "
+          f"{(1 - vad['api'] / full['api']):.0%} transcription time, wall {full['wall'] / vad['wall']:.1f}x")
+    print(f"   silence map: {len(vad['silences'])} pauses ({vad['silences'].total():.0f}s), "
+          f"{recall:.1%} of the silent stretches skipped, {max(speech_lost, 0.0):.2f}s of speech cut")
+    if failures:
+        print("❌ VAD pre-filter problems:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("✅ Only silence was skipped and every timestamp maps back onto the original timeline.")
+
+
+def tree_bytes(directory):
+    """Total size of the files under `directory`."""
+    return sum(os.path.getsize(os.path.join(dirpath, name))
+               for dirpath, _, names in os.walk(directory) for name in names)
+
+
+def check_module_playlist(playlist_path, start, end, rendition_playlist):
+    """
+    Problems with a module playlist: segments that are missing or not those of the rendition, a range that
+    does not cover [start, end] or overshoots it by a segment or more, a wrong EXT-X-START, or ffmpeg failing
+    to read it.
+    """
+    _, rendition = video_segmentor.read_hls_playlist(rendition_playlist)
+    rendition_dir = os.path.dirname(os.path.abspath(rendition_playlist))
+    starts = {os.path.normpath(os.path.join(rendition_dir, uri)): (seg_start, duration)
+              for seg_start, duration, uri in rendition}
+    init_uri, segments = video_segmentor.read_hls_playlist(playlist_path)
+    playlist_dir = os.path.dirname(os.path.abspath(playlist_path))
+    name = os.path.basename(playlist_path)
+    uris = [os.path.normpath(os.path.join(playlist_dir, uri)) for _, _, uri in segments]
+    missing = [uri for uri in uris + ([os.path.normpath(os.path.join(playlist_dir, init_uri))] if init_uri else [])
+               if not os.path.exists(uri)]
+    if missing or any(uri not in starts for uri in uris):
+        return [f"{name}: {len(missing)} missing or foreign segments"]
+
+    problems = []
+    first_start = starts[uris[0]][0]
+    last_start, last_duration = starts[uris[-1]]
+    slack = video_segmentor.HLS_SEGMENT_SECONDS + 0.5 # ffmpeg cuts at the first keyframe past hls_time
+    if not (first_start <= start + 0.01 and start - first_start < slack):
+        problems.append(f"{name}: starts at segment {first_start:.2f}s for a module starting at {start:.2f}s")
+    if not (last_start + last_duration >= end - 0.01 and last_start < end):
+        problems.append(f"{name}: ends at {last_start + last_duration:.2f}s for a module ending at {end:.2f}s")
+    with open(playlist_path, encoding="utf-8") as f:
+        offsets = [float(line.split("TIME-OFFSET=")[1].split(",")[0]) for line in f if line.startswith("#EXT-X-START")]
+    if abs((offsets[0] if offsets else 0.0) - (start - first_start)) > 0.01:
+        problems.append(f"{name}: EXT-X-START does not point at {start:.2f}s")
+    result = subprocess.run(
+        [imageio_ffmpeg.get_ffmpeg_exe(), "-loglevel", "error", "-allowed_extensions", "ALL",
+         "-i", playlist_path, "-c", "copy", "-f", "null", "-"], capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        problems.append(f"{name}: ffmpeg cannot read it: {result.stderr.strip()[:200]}")
+    return problems
+
+
+def bench_hls(args):
+    """
+    Per-module MP4 clips ("reencode") vs a single HLS rendition with module playlists ("hls"): wall time and
+    output size of a full run, then of re-segmenting the finished course with a higher min_duration (clips
+    are cut again, playlists are only rewritten). Every module playlist is checked against the rendition:
+    segments exist, cover the module to within a segment and start playback at the module's start.
+    """
+    video = make_synthetic_video(derived_video_path(args, "hls"), duration=args.duration)
+    root = tempfile.mkdtemp(prefix="bench_hls_")
+    weights = [1 if i % 4 == 1 else 4 for i in range(args.modules)]
+    short, long = (args.duration * w / sum(weights) for w in (1, 4))
+    min_duration = (short + long) / 2
+    rows, failures = [], []
+    try:
+        with FakeGroqServer(latency=args.latency, weights=weights) as server:
+            for mode in ("reencode", "hls"):
+                output_dir = os.path.join(root, mode)
+                for label, kwargs in (("full run", {"min_duration": 0}), (f"min_duration {min_duration:.0f}s", {"min_duration": min_duration})):
+                    generator = CourseGenerator(
+                        api_key="offline-benchmark", base_url=server.base_url, rate_limits=NO_RATE_LIMITS,
+                        transcript_cache=video_segmentor.TranscriptCache(os.path.join(root, "transcripts")),
+                        completion_cache=video_segmentor.CompletionCache(os.path.join(root, "completions.sqlite3")),
+                    )
+                    results, wall = timed(generator.process_video, video, output_dir=output_dir, export_mode=mode,
+                                          use_cache=False, **kwargs)
+                    stages = generator.metrics.report()["stages"]
+                    encodes = stages.get("clip_encode" if mode == "reencode" else "hls_package", {})
+                    rows.append((mode, label, len(results), wall, encodes.get("calls", 0), encodes.get("seconds", 0.0),
+                                 tree_bytes(output_dir)))
+                    if any(not r.get("video_path") for r in results):
+                        failures.append(f"{mode} / {label}: modules without a video")
+                    elif mode == "hls":
+                        rendition = os.path.join(output_dir, video_segmentor.HLS_DIR, video_segmentor.HLS_PLAYLIST)
+                        for r in results:
+                            failures += check_module_playlist(r["video_path"], r["start_time"], r["end_time"], rendition)
+                        playlists = {name for name in os.listdir(output_dir) if name.endswith(".m3u8")}
+                        if playlists != {os.path.basename(r["video_path"]) for r in results}:
+                            failures.append(f"{mode} / {label}: stale or missing playlists")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+    print(f"\n📊 HLS export ({args.duration}s video, {args.modules} raw modules, {args.latency}s API latency)")
+    for mode, label, modules, wall, encodes, encode_seconds, size in rows:
+        print(f"   {mode:<8} {label:<20} {modules:3d} modules  wall {wall:7.2f}s  "
+              f"encodes {encodes:3d} ({encode_seconds:7.2f}s)  output {size / 1e6:7.1f} MB")
+    for label_index in (0, 1):
+        reencode, hls = rows[label_index], rows[2 + label_index]
+        print(f"   {hls[1]:<29}: hls {reencode[3] / hls[3]:.1f}x faster, {hls[6] / reencode[6]:.0%} of the bytes")
+    if failures:
+        print("❌ HLS playlists do not match their modules:")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print(f"✅ Every module playlist covers its module to within {video_segmentor.HLS_SEGMENT_SECONDS:g}s, "
+          "starts at the module's start and plays in ffmpeg.")
+
+
+BENCHMARKS = {
+    "frames": bench_frames,
+    "pipeline": bench_pipeline,
+    "export": bench_export,
+    "transcript": bench_transcript,
+    "merge": bench_merge,
+    "keyframes": bench_keyframes,
+    "encode": bench_encode,
+    "e2e": bench_e2e,
+    "ingest": bench_ingest,
+    "stress": bench_stress,
+    "ratelimit": bench_ratelimit,
+    "backends": bench_backends,
+    "media": bench_media,
+    "incremental": bench_incremental,
+    "vad": bench_vad,
+    "hls": bench_hls,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local performance benchmarks for video-segmentor.")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--video", default="bench_video.mp4", help="Synthetic video path (generated if missing)")
+    parser.add_argument("--duration", type=int, default=600, help="Synthetic video length in seconds")
+    parser.add_argument("--modules", type=int, default=30)
+    parser.add_argument("--segments", type=int, default=10000, help="Transcript segments for the transcript benchmark")
+    parser.add_argument("--cases", type=int, default=2000, help="Random plans for the merge equivalence check")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=2.0, help="Simulated completion latency in seconds")
+    parser.add_argument("--export-mode", default=video_segmentor.EXPORT_MODE_DEFAULT, choices=video_segmentor.EXPORT_MODES)
+    parser.add_argument("--report", default="bench_report.json", help="JSON report written by the e2e benchmark")
+    parser.add_argument("--compare", default=None, help="Earlier e2e report to compare against")
+    parser.add_argument("--jobs", type=int, default=4, help="Concurrent jobs for the stress benchmark")
+    parser.add_argument("--requests", type=int, default=180, help="Requests sent by the ratelimit benchmark")
+    parser.add_argument("--rpm", type=int, default=120, help="Fake server quota for the ratelimit benchmark")
+    parser.add_argument("--error-rate", type=float, default=0.05, help="Injected 429/503 rate for the ratelimit benchmark")
+    parser.add_argument("--upload-mb", type=int, default=1024, help="Upload size for the ingest benchmark")
+    args = parser.parse_args()
+    BENCHMARKS[args.benchmark](args)
@@ -0,0 +1,295 @@
+import os
+import re
+import json
+import time
+import random
+import argparse
+import tempfile
+import threading
+import subprocess
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import imageio_ffmpeg
+
+# A local stand-in for the Groq OpenAI-compatible API, for offline benchmarks.
+# Responses are canned but shaped like the real ones (verbose_json segments, JSON module plans, quiz JSON, usage).
+
+TIMESTAMP_RE = re.compile(r"\[(\d+(?:\.\d+)?)s - (\d+(?:\.\d+)?)s\]")
+SEGMENT_RE = re.compile(r"corresponds to the time (\S+) seconds to (\S+) seconds")
+
+
+def media_duration(data, suffix=".mp3"):
+    """Duration (seconds) of an uploaded media file, read from ffmpeg's stream info."""
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        f.write(data)
+        path = f.name
+    try:
+        result = subprocess.run(
+            [imageio_ffmpeg.get_ffmpeg_exe(), "-hide_banner", "-i", path],
+            capture_output=True, text=True
+        )
+    finally:
+        os.remove(path)
+    for line in result.stderr.splitlines():
+        if "Duration:" in line:
+            h, m, s = line.split("Duration:")[1].split(",")[0].strip().split(":")
+            return int(h) * 3600 + int(m) * 60 + float(s)
+    return 0.0
+
+
+def classify(messages):
+    """Which CourseGenerator call a chat request comes from, by its prompt."""
+    system = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+    if not isinstance(system, str):
+        system = ""
+    if "identify the core learning modules" in system:
+        return "structure"
+    if "Final Assessment Quiz" in system:
+        return "quiz"
+    if "Summarize the provided PART" in system:
+        return "digest"
+    if "learning objectives" in system:
+        return "intro"
+    if "Definitions" in system:
+        return "outro"
+    return "notes"
+
+
+class FakeGroqServer:
+    """
+    Threaded HTTP server speaking the subset of the Groq API that CourseGenerator uses.
+    `latency` (+ up to `jitter`) seconds are added to every chat completion, `transcribe_latency` to every
+    transcription, plus the audio length divided by `transcribe_speed` (x realtime) if given. `modules` is the number of modules returned for a structure request, of equal length or
+    proportional to `weights` (one per module).
+    Rate limiting, to exercise client retries: `rpm` is a quota of that many requests per minute, replenished
+    continuously like Groq's (bursts up to `rpm`), and requests over it get a 429 with the Retry-After until the
+    next one is available; `error_rate` answers that fraction of requests with a 429 (Retry-After
+    `retry_after`) or, for half of them, a 503 without one.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.5, jitter=0.0, transcribe_latency=None,
+                 modules=4, segment_seconds=5.0, rpm=None, error_rate=0.0, retry_after=1.0, weights=None,
+                 transcribe_speed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.transcribe_latency = latency if transcribe_latency is None else transcribe_latency
+        self.transcribe_speed = transcribe_speed
+        self.modules = len(weights) if weights else modules
+        self.weights = list(weights) if weights else [1.0] * modules
+        self.segment_seconds = segment_seconds
+        self.rpm = rpm
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.stats = {}
+        self._lock = threading.Lock()
+        self._quota = float(rpm or 0) # Requests available now
+        self._quota_updated = time.monotonic()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _count(self, kind):
+        with self._lock:
+            self.stats[kind] = self.stats.get(kind, 0) + 1
+
+    def admit(self):
+        """None if a request may proceed, else (status, headers) of the error to answer it with."""
+        if self.error_rate and random.random() < self.error_rate:
+            if random.random() < 0.5:
+                self._count("injected_503")
+                return 503, {}
+            self._count("injected_429")
+            return 429, {"retry-after": f"{self.retry_after:.3f}"}
+        if not self.rpm:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._quota = min(self.rpm, self._quota + (now - self._quota_updated) * self.rpm / 60.0)
+            self._quota_updated = now
+            if self._quota < 1.0:
+                wait = (1.0 - self._quota) * 60.0 / self.rpm
+                self.stats["rate_limited"] = self.stats.get("rate_limited", 0) + 1
+                return 429, {"retry-after": f"{wait:.3f}", "x-ratelimit-remaining-requests": "0"}
+            self._quota -= 1.0
+            return None
+
+    def _sleep(self, seconds):
+        time.sleep(seconds + random.uniform(0, self.jitter))
+
+    # --- Canned responses ---
+
+    def transcription(self, audio_bytes, filename):
+        duration = media_duration(audio_bytes, os.path.splitext(filename)[1] or ".mp3")
+        self._sleep(self.transcribe_latency + (duration / self.transcribe_speed if self.transcribe_speed else 0.0))
+        segments = []
+        t = 0.0
+        while t < duration:
+            end = min(t + self.segment_seconds, duration)
+            segments.append({
+                "id": len(segments), "start": round(t, 2), "end": round(end, 2),
+                "text": f" Synthetic narration sentence number {len(segments)} explaining the topic."
+            })
+            t = end
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "duration": duration,
+            "x_groq": {"id": "fake"},
+        }
+
+    def chat_content(self, kind, messages):
+        user = messages[-1]["content"]
+        user_text = user if isinstance(user, str) else " ".join(p.get("text", "") for p in user if p.get("type") == "text")
+        if kind == "structure":
+            ends = [float(end) for _, end in TIMESTAMP_RE.findall(user_text)]
+            total = max(ends) if ends else 60.0
+            bounds = [0.0]
+            for weight in self.weights:
+                bounds.append(bounds[-1] + weight * total / sum(self.weights))
+            return json.dumps({"modules": [
+                {"topic_name": f"Synthetic Topic {i+1}", "start_time": round(bounds[i], 2), "end_time": round(bounds[i + 1], 2)}
+                for i in range(self.modules)
+            ]})
+        if kind == "quiz":
+            return json.dumps([
+                {
+                    "question": f"Synthetic question {i+1}?",
+                    "options": ["A) One", "B) Two", "C) Three", "D) Four"],
+                    "correct_answer": "B) Two",
+                    "explanation": "Two is the canned answer."
+                }
+                for i in range(5)
+            ])
+        if kind == "digest":
+            return "- Synthetic summary of this part of the course."
+        if kind == "intro":
+            return "## Objectives\n- Understand the synthetic topic\n- Apply it"
+        if kind == "outro":
+            return "## Definitions\n- **Synthetic**: Made for testing\n\n## Practical Application\n- Benchmarks"
+        # Echo the module's time range so callers can check each note landed with its own module
+        segment = SEGMENT_RE.search(user_text)
+        time_range = f"{segment.group(1)}s - {segment.group(2)}s" if segment else "unknown"
+        return f"## Notes\n- Synthetic module notes for segment {time_range}.\n- Key concept."
+
+    def chat_completion(self, request):
+        messages = request["messages"]
+        kind = classify(messages)
+        self._count(kind)
+        self._sleep(self.latency)
+        content = self.chat_content(kind, messages)
+        prompt_chars = len(json.dumps(messages))
+        return {
+            "id": f"chatcmpl-fake-{random.getrandbits(32):08x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_chars // 4,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_chars // 4 + len(content) // 4,
+            },
+        }
+
+    def models(self):
+        ids = ["llama-3.3-70b-versatile", "whisper-large-v3", "llama-3.2-90b-vision-preview"]
+        return {"object": "list", "data": [{"id": i, "object": "model", "created": 0, "owned_by": "fake"} for i in ids]}
+
+    # --- HTTP plumbing ---
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status, payload, headers=None):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _read_body(self):
+                return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/models"):
+                    self._send_json(200, server.models())
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+            def do_POST(self):
+                body = self._read_body()
+                rejection = server.admit()
+                if rejection is not None:
+                    status, headers = rejection
+                    message = "Rate limit reached, please try again later" if status == 429 else "Service unavailable"
+                    self._send_json(status, {"error": {"message": message, "type": "fake_error"}}, headers)
+                elif self.path.endswith("/chat/completions"):
+                    self._send_json(200, server.chat_completion(json.loads(body)))
+                elif self.path.endswith("/audio/transcriptions"):
+                    server._count("transcription")
+                    message = BytesParser(policy=default_policy).parsebytes(
+                        f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+                    )
+                    audio, filename = b"", "audio.mp3"
+                    for part in message.iter_parts():
+                        if part.get_param("name", header="content-disposition") == "file":
+                            audio = part.get_payload(decode=True)
+                            filename = part.get_filename() or filename
+                    self._send_json(200, server.transcription(audio, filename))
+                else:
+                    self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+        return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local fake Groq API for offline benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds added to every chat completion")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--transcribe-latency", type=float, default=None)
+    parser.add_argument("--modules", type=int, default=4)
+    parser.add_argument("--rpm", type=int, default=None, help="Requests per minute before answering 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failed with 429/503")
+    args = parser.parse_args()
+
+    server = FakeGroqServer(args.host, args.port, args.latency, args.jitter, args.transcribe_latency, args.modules,
+                            rpm=args.rpm, error_rate=args.error_rate)
+    print(f"🧪 Fake Groq API listening on {server.base_url} (point CourseGenerator(base_url=...) at it)")
+    server.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
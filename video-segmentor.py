@@ -1,12 +1,31 @@
 import os
+import sys
+import glob
 import time
+import re
 import json
 import base64
+import heapq
+import bisect
+import sqlite3
+import hashlib
+import random
+import shutil
+import tempfile
+import threading
 import traceback
+import argparse
+import subprocess
+import multiprocessing
 from io import BytesIO
+from types import SimpleNamespace
+from contextlib import contextmanager, nullcontext, redirect_stdout
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from PIL import Image
-from moviepy.video.io.VideoFileClip import VideoFileClip
-from groq import Groq
+from moviepy.video.io.ffmpeg_reader import FFMPEG_VideoReader, ffmpeg_parse_infos
+from moviepy.config import FFMPEG_BINARY
+from groq import Groq, APIConnectionError
+import httpx
 import numpy as np
 
 # --- CONFIGURATION ---
@@ -15,6 +34,118 @@ STRUCTURE_MODEL = "llama-3.3-70b-versatile" # Powerful text model for logic
 WHISPER_MODEL = "whisper-large-v3"
 VISION_MODEL_DEFAULT = "llama-3.2-90b-vision-preview" 
 
+# Module pipeline concurrency (threads): each clip encode waits on its own ffmpeg process, completions on the network
+ENCODE_WORKERS = 2
+LLM_WORKERS = 4
+
+# Long audio is transcribed in chunks of ~TRANSCRIBE_CHUNK_SECONDS, cut at silences where possible
+TRANSCRIBE_CHUNK_SECONDS = 600
+TRANSCRIBE_CHUNK_OVERLAP = 2.0 # Extra audio on each side of a chunk boundary that is not at a silence
+TRANSCRIBE_WORKERS = 4
+AUDIO_BITRATE = "32k" # Mono 16 kHz speech audio
+AUDIO_SAMPLE_RATE = 16000
+
+# Voice activity detection on the extracted audio (frame energy against the noise floor). Silences of at least
+# VAD_SKIP_SILENCE are cut out of what is sent to Whisper and the timestamps mapped back; every pause goes into
+# the silence map that module boundaries are snapped to
+VAD_FRAME_SECONDS = 0.02
+VAD_MARGIN_DB = 10.0 # Speech is this much louder than the noise floor (10th percentile of the frame energies)...
+VAD_THRESHOLD_DB = (-55.0, -35.0) # ...clamped to this range (dBFS)
+VAD_MIN_SPEECH = 0.2 # Shorter bursts count as noise
+VAD_MIN_SILENCE = 0.3 # Shorter pauses are part of the speech
+VAD_SKIP_SILENCE = 2.0 # None uploads the full audio
+VAD_PAD = 0.25 # Silence kept on each side of a skipped stretch
+SNAP_WINDOW = 5.0 # Module boundaries move to the middle of a pause at most this many seconds away
+
+# Inference backends: "groq" (Groq Cloud, or a Groq-compatible server at base_url) or "openai" (an
+# OpenAI-compatible server such as Ollama, vLLM or llama.cpp on a local GPU node; set the models it serves)
+BACKENDS = ["groq", "openai"]
+BACKEND_DEFAULT = "groq"
+LOCAL_BASE_URL_DEFAULT = "http://localhost:11434/v1" # Ollama
+LOCAL_RATE_LIMITS = {"default": (None, None)} # Our own server has no quota
+LOCAL_PARALLEL = 4 # Requests the local server runs at once (e.g. OLLAMA_NUM_PARALLEL); batches are pipelined this deep
+LOCAL_TIMEOUT = 600 # Seconds; local models can be slow to load
+
+# API rate limits per model as (requests/min, tokens/min), None = unlimited. They are enforced client-side with
+# token buckets shared by every job in the process; match them to your Groq plan to run at the quota's maximum
+API_RATE_LIMITS = {
+    "default": (30, 6000),
+    STRUCTURE_MODEL: (30, 12000),
+    WHISPER_MODEL: (20, None), # Whisper is limited by audio seconds, not tokens
+}
+API_MAX_RETRIES = 5 # Per request, for 429s, 5xx, timeouts and connection errors
+API_BACKOFF_BASE = 1.0 # Seconds; attempt n waits a random time up to API_BACKOFF_BASE * 2**n ("full jitter")
+API_BACKOFF_MAX = 30.0
+API_RETRY_AFTER_MAX = 120.0 # A longer Retry-After means the quota is exhausted: fail instead of waiting
+API_REPLY_TOKENS = 1024 # Reserved for the reply when a request has no max_tokens; settled from the real usage
+API_IMAGE_TOKENS = 1200 # Rough prompt cost of one image, for the reservation only
+
+# Vision frames are decoded already scaled to FRAME_MAX_SIZE (longest side) and JPEG-encoded on a thread pool
+FRAME_MAX_SIZE = 640
+FRAME_JPEG_QUALITY = 75
+FRAME_ENCODE_WORKERS = 4
+
+# Vision frames: "linspace" (evenly spaced) or "scene" (most distinct of several low-res candidates,
+# near-duplicates dropped, so static slides send fewer images)
+FRAME_STRATEGIES = ["linspace", "scene"]
+FRAME_STRATEGY_DEFAULT = "scene"
+SCENE_CANDIDATES_PER_FRAME = 4 # Candidates scored per frame that may be sent
+SCENE_MIN_CHANGE = 0.03 # Distance (0..1) below which two frames count as the same scene
+PHASH_MAX_DISTANCE = 6 # Hamming distance (of 64 bits) at or below which frames are near-duplicates
+
+# Modules shorter than this (seconds) are merged into a neighbour after structure analysis
+MERGE_MIN_DURATION = 60
+
+# Intro/outro/quiz get the full transcript when it fits, otherwise a map-reduce digest of it
+DIGEST_THRESHOLD_CHARS = 24000
+DIGEST_CHUNK_CHARS = 12000
+CHARS_PER_TOKEN = 4 # Rough estimate used for token reporting
+
+# On-disk transcription cache (keyed by media content hash + Whisper model + the parameters that shape the
+# result), evicted LRU above the size cap. Bump the version when what an entry holds changes
+TRANSCRIPT_CACHE_DIR = os.path.join(".cache", "transcripts")
+TRANSCRIPT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+TRANSCRIPT_CACHE_VERSION = 2 # 2: silences skipped, timestamps mapped back, silence map stored
+
+# Persistent chat completion cache (SQLite), keyed by model + messages + parameters
+COMPLETION_CACHE_PATH = os.path.join(".cache", "completions.sqlite3")
+COMPLETION_CACHE_TTL = 7 * 24 * 3600
+COMPLETION_CACHE_MAX_BYTES = 50 * 1024 * 1024
+
+# Clip export: "reencode" (frame-accurate, re-encodes everything), "copy" (stream copy from the keyframe
+# at/before the start, no encoding), "hybrid" (re-encode only up to the first keyframe, copy the rest) or "hls"
+# (the source is transcoded once into segmented HLS and every module is a playlist over its segments)
+CLIP_EXPORT_MODES = ["reencode", "copy", "hybrid"] # The modes cut_clip handles: one MP4 per module
+EXPORT_MODES = CLIP_EXPORT_MODES + ["hls"]
+EXPORT_MODE_DEFAULT = "reencode"
+
+# "hls" export: one fMP4 rendition in <output_dir>/HLS_DIR, shared by the module playlists. Modules start and end
+# on segment boundaries, so a playlist covers up to HLS_SEGMENT_SECONDS more on either side: players seek to the
+# exact start (EXT-X-START), and play on to the end of the last segment unless they stop at the module's end
+HLS_DIR = "hls"
+HLS_PLAYLIST = "index.m3u8"
+HLS_SEGMENT_SECONDS = 2.0
+
+# Uploads are stored content-addressed (<sha256>.<ext>), streamed in chunks; re-uploading the same file is free
+UPLOAD_DIR = os.path.join(".cache", "uploads")
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_DIR_MAX_BYTES = 10 * 1024 * 1024 * 1024
+
+# Batch CLI: jobs (videos) run in parallel processes; clip encodes and API requests are capped globally
+BATCH_JOBS = 2
+BATCH_ENCODE_SLOTS = max(1, (os.cpu_count() or 2) // 2)
+BATCH_API_SLOTS = 8
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".avi", ".mkv")
+
+# Per-job metrics (stage spans, tokens, upload bytes, retries), written next to the course output
+METRICS_JSON = "job_metrics.json"
+METRICS_PROM = "job_metrics.prom" # Prometheus text format (e.g. for node_exporter's textfile collector)
+
+# Job checkpoint in the output directory: transcript, module plan and finished artifacts (with content hashes),
+# keyed by module content so a re-segmented plan reuses the artifacts of modules that did not change
+MANIFEST_NAME = "course_manifest.json"
+MANIFEST_VERSION = 2
+
 # --- PROMPTS ---
 
 # 1. THE ARCHITECT: Identifies the structure from TRANSCRIPT
@@ -97,133 +228,2005 @@ Output strictly in Markdown:
 - Real-world usage examples...
 """
 
+# 5. THE ARCHITECT - TRANSCRIPT DIGEST (map step, one call per transcript chunk)
+DIGEST_PROMPT = """
+You are an expert Instructional Designer. Summarize the provided PART of a timestamped course transcript.
+The summary replaces the raw transcript when writing the course objectives, definitions, practical applications and the final quiz,
+so keep every key concept, definition, fact, example and real-world application that is taught.
+**NOTE:** The transcript may be in **Hindi, English, or a mix (Hinglish)**. Write the summary **strictly in English**.
+
+Output strictly as concise Markdown bullet points, without any heading.
+"""
+
 # 3. THE EXAMINER: Creates the final assessment
 QUIZ_PROMPT = """
 You are an expert Examiner. Create a Final Assessment Quiz based on the provided course transcript/content.
 Create 5-10 multiple choice questions that test deep understanding.
 
-Return ONLY a raw JSON array:
-[
-  {
-    "question": "What is the primary function of...",
-    "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
-    "correct_answer": "B) Option 2",
-    "explanation": "Option 2 is correct because..."
-  },
-  ...
-]
-"""
+Return ONLY a raw JSON array:
+[
+  {
+    "question": "What is the primary function of...",
+    "options": ["A) Option 1", "B) Option 2", "C) Option 3", "D) Option 4"],
+    "correct_answer": "B) Option 2",
+    "explanation": "Option 2 is correct because..."
+  },
+  ...
+]
+"""
+
+_encode_buffers = threading.local()
+
+
+def encode_frame_jpeg_b64(frame_np, max_size=FRAME_MAX_SIZE, quality=FRAME_JPEG_QUALITY):
+    """
+    RGB frame -> JPEG -> Base64 string, resized to fit max_size (no-op for frames decoded at that size).
+    Each worker thread reuses one BytesIO buffer across frames.
+    """
+    buffered = getattr(_encode_buffers, "buffer", None)
+    if buffered is None:
+        buffered = _encode_buffers.buffer = BytesIO()
+    buffered.seek(0)
+    buffered.truncate()
+
+    img = Image.fromarray(frame_np)
+    img.thumbnail((max_size, max_size))
+    img.save(buffered, format="JPEG", quality=quality)
+    with buffered.getbuffer() as view:
+        return base64.b64encode(view).decode("ascii")
+
+
+def frame_target_resolution(video_size, max_size=FRAME_MAX_SIZE):
+    """
+    Decode size (width, height) that makes ffmpeg scale straight to at most max_size on the longest side,
+    so full-resolution (e.g. 4K) frames are never piped into Python. None if the video is already small enough.
+    """
+    width, height = video_size
+    if max(width, height) <= max_size:
+        return None
+    ratio = max_size / max(width, height)
+    return int(width * ratio), int(height * ratio)
+
+
+def frame_signature(frame_np, size=32):
+    """Low-resolution grayscale thumbnail (size x size, values 0..1) built by strided subsampling."""
+    h, w = frame_np.shape[:2]
+    ys = np.linspace(0, h - 1, size * 2).astype(np.intp)
+    xs = np.linspace(0, w - 1, size * 2).astype(np.intp)
+    small = frame_np[ys][:, xs].astype(np.float32).mean(axis=2) / 255.0
+    return small.reshape(size, 2, size, 2).mean(axis=(1, 3))
+
+
+def select_distinct_frames(signatures, max_frames, min_change=SCENE_MIN_CHANGE, max_hash_distance=PHASH_MAX_DISTANCE):
+    """
+    Picks up to max_frames candidate indices that are as different from each other as possible.
+    Distance = pixel difference + histogram difference of the signatures; candidates within
+    `min_change` or a dHash distance of `max_hash_distance` of an already picked frame are dropped,
+    so static content returns fewer frames. Returns indices in time order.
+    """
+    n = len(signatures)
+    if n == 0:
+        return []
+    sig = np.stack(signatures)
+    flat = sig.reshape(n, -1)
+
+    pixel_dist = np.abs(flat[:, None, :] - flat[None, :, :]).mean(axis=2)
+    bins = np.minimum((flat * 16).astype(np.intp), 15) + 16 * np.arange(n)[:, None]
+    hist = np.bincount(bins.ravel(), minlength=16 * n).reshape(n, 16) / flat.shape[1]
+    hist_dist = np.abs(hist[:, None, :] - hist[None, :, :]).sum(axis=2) / 2
+    dist = (pixel_dist + hist_dist) / 2
+
+    # dHash: sign of horizontal gradients on an area-averaged 8x9 grid -> 64 bits per frame
+    size = sig.shape[1]
+    row_edges = np.linspace(0, size, 9).astype(np.intp)
+    col_edges = np.linspace(0, size, 10).astype(np.intp)
+    grid = np.add.reduceat(np.add.reduceat(sig, row_edges[:-1], axis=1), col_edges[:-1], axis=2)
+    grid /= np.diff(row_edges)[None, :, None] * np.diff(col_edges)[None, None, :]
+    bits = (grid[:, :, 1:] > grid[:, :, :-1]).reshape(n, -1)
+    hamming = (bits[:, None, :] != bits[None, :, :]).sum(axis=2)
+
+    # Greedy farthest-point selection starting from the first candidate
+    selected = [0]
+    min_dist = dist[0].copy()
+    min_hamming = hamming[0].copy()
+    while len(selected) < max_frames:
+        eligible = (min_dist >= min_change) & (min_hamming > max_hash_distance)
+        if not eligible.any():
+            break
+        best = int(np.where(eligible, min_dist, -1.0).argmax())
+        selected.append(best)
+        min_dist = np.minimum(min_dist, dist[best])
+        min_hamming = np.minimum(min_hamming, hamming[best])
+    return sorted(selected)
+
+
+def module_base_name(idx, topic_name):
+    """File name stem (without extension) used for a module's clip and notes."""
+    topic_clean = topic_name.replace(" ", "_").replace("/", "-")
+    return f"{idx+1}_{topic_clean}"
+
+
+def _run_ffmpeg(args):
+    subprocess.run([FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", *args], check=True)
+
+
+def read_pcm(pcm_path):
+    """Raw mono 16-bit PCM (as written by extract_audio to a .pcm path), memory-mapped rather than loaded."""
+    if os.path.getsize(pcm_path) == 0:
+        return np.zeros(0, dtype=np.int16)
+    return np.memmap(pcm_path, dtype=np.int16, mode="r")
+
+
+def frame_energy_db(pcm, sample_rate=AUDIO_SAMPLE_RATE, frame_seconds=VAD_FRAME_SECONDS, block_frames=4096):
+    """Mean energy (dBFS) of each `frame_seconds` frame of int16 PCM, computed block by block."""
+    frame = max(1, int(round(sample_rate * frame_seconds)))
+    count = len(pcm) // frame
+    energy = np.empty(count, dtype=np.float32)
+    for lo in range(0, count, block_frames):
+        hi = min(count, lo + block_frames)
+        block = np.asarray(pcm[lo * frame:hi * frame], dtype=np.float32).reshape(hi - lo, frame) / 32768.0
+        energy[lo:hi] = 10.0 * np.log10(np.mean(block * block, axis=1) + 1e-10)
+    return energy
+
+
+def _runs(mask):
+    """(starts, ends) index arrays of the runs of True in a boolean array."""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def detect_pauses(pcm, sample_rate=AUDIO_SAMPLE_RATE, frame_seconds=VAD_FRAME_SECONDS, margin_db=VAD_MARGIN_DB,
+                  threshold_db=VAD_THRESHOLD_DB, min_speech=VAD_MIN_SPEECH, min_silence=VAD_MIN_SILENCE):
+    """
+    Energy-based voice activity detection over int16 PCM. A frame is speech if it is `margin_db` above the
+    noise floor (clamped to `threshold_db`); speech bursts under `min_speech` seconds are dropped and pauses
+    under `min_silence` seconds bridged. Returns the SilenceMap of the remaining pauses.
+    """
+    energy = frame_energy_db(pcm, sample_rate, frame_seconds)
+    if not len(energy):
+        return SilenceMap()
+    threshold = np.clip(np.percentile(energy, 10) + margin_db, *threshold_db)
+    starts, ends = _runs(energy > threshold)
+    keep = (ends - starts) * frame_seconds >= min_speech
+    # Rebuild the speech mask from the runs that are long enough (a +1/-1 difference array, no Python loop)
+    delta = np.zeros(len(energy) + 1, dtype=np.int32)
+    np.add.at(delta, starts[keep], 1)
+    np.add.at(delta, ends[keep], -1)
+    starts, ends = _runs(np.cumsum(delta[:-1]) == 0)
+    keep = (ends - starts) * frame_seconds >= min_silence
+    silence_ends = ends[keep] * frame_seconds
+    # The last partial frame belongs to a silence that reaches the end
+    silence_ends[silence_ends >= len(energy) * frame_seconds] = len(pcm) / sample_rate
+    return SilenceMap(starts[keep] * frame_seconds, silence_ends)
+
+
+class SilenceMap:
+    """
+    Pauses in the audio as sorted, non-overlapping [start, end] intervals (seconds).
+    Lets module boundaries and cuts be snapped to the nearest pause instead of falling mid-sentence.
+    """
+
+    def __init__(self, starts=(), ends=()):
+        self.starts = np.asarray(starts, dtype=np.float64)
+        self.ends = np.asarray(ends, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __iter__(self):
+        return zip(self.starts.tolist(), self.ends.tolist())
+
+    def total(self):
+        return float(np.sum(self.ends - self.starts))
+
+    def snap(self, t, window=SNAP_WINDOW):
+        """The middle of the pause nearest to `t` (kept within `window` seconds of it), or `t` if none is that close."""
+        lo = int(np.searchsorted(self.ends, t - window, side="left"))
+        hi = int(np.searchsorted(self.starts, t + window, side="right"))
+        if hi <= lo:
+            return t
+        middles = (self.starts[lo:hi] + self.ends[lo:hi]) / 2
+        i = int(np.argmin(np.abs(middles - t)))
+        return float(np.clip(np.clip(middles[i], t - window, t + window), self.starts[lo + i], self.ends[lo + i]))
+
+    def to_list(self):
+        return [[start, end] for start, end in self]
+
+    @classmethod
+    def from_list(cls, intervals):
+        return cls([start for start, _ in intervals], [end for _, end in intervals])
+
+
+class SpeechTimeline:
+    """
+    The audio with its long silences cut out, as it is sent to Whisper. `regions` are the kept [start, end]
+    ranges of the original timeline and `offsets` where each starts on the condensed one; times on the
+    condensed timeline map back with `to_original`. Each cut keeps `pad` seconds of its silence on either side.
+    """
+
+    def __init__(self, duration, silences, skip=VAD_SKIP_SILENCE, pad=VAD_PAD):
+        gaps = [(start + pad, end - pad) for start, end in (silences if skip is not None else ())
+                if end - start >= max(skip, 2 * pad)]
+        bounds = [0.0] + [t for gap in gaps for t in gap] + [duration]
+        self.regions = np.array([(bounds[i], bounds[i + 1]) for i in range(0, len(bounds), 2)], dtype=np.float64)
+        lengths = self.regions[:, 1] - self.regions[:, 0]
+        self.offsets = np.concatenate(([0.0], np.cumsum(lengths)[:-1]))
+        self.duration = float(np.sum(lengths))
+        self.skipped = duration - self.duration
+
+    def to_original(self, t):
+        i = max(0, int(np.searchsorted(self.offsets, t, side="right")) - 1)
+        start, end = self.regions[i]
+        return float(min(start + t - self.offsets[i], end))
+
+    def to_condensed(self, t):
+        i = max(0, int(np.searchsorted(self.regions[:, 0], t, side="right")) - 1)
+        start, end = self.regions[i]
+        return float(self.offsets[i] + np.clip(t - start, 0.0, end - start))
+
+    def pieces(self, start, end):
+        """The original [start, end] ranges that make up [start, end] of the condensed timeline."""
+        result = []
+        for (region_start, region_end), offset in zip(self.regions, self.offsets):
+            lo = max(start, offset)
+            hi = min(end, offset + region_end - region_start)
+            if hi > lo:
+                result.append((region_start + lo - offset, region_start + hi - offset))
+        return result
+
+
+def encode_pcm_mp3(pcm, pieces, save_path, sample_rate=AUDIO_SAMPLE_RATE):
+    """Encodes the given [start, end] second ranges of int16 PCM, back to back, as speech mp3."""
+    data = b"".join(
+        np.asarray(pcm[int(start * sample_rate):int(end * sample_rate)]).tobytes() for start, end in pieces
+    )
+    subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error", "-y", "-f", "s16le", "-ar", str(sample_rate), "-ac", "1",
+         "-i", "pipe:0", "-b:a", AUDIO_BITRATE, save_path],
+        input=data, check=True
+    )
+    return save_path
+
+
+def plan_audio_chunks(duration, silences, target=TRANSCRIBE_CHUNK_SECONDS, overlap=TRANSCRIBE_CHUNK_OVERLAP):
+    """
+    Splits [0, duration] into chunks of at most ~target seconds.
+    Each boundary is placed at the middle of the last silence before the target; without one it is a
+    hard cut and the neighbouring chunks get `overlap` seconds of shared audio.
+    Returns [(boundary_start, boundary_end, extract_start, extract_end), ...].
+    """
+    cuts = []  # (time, is_silence)
+    position = 0.0
+    midpoints = [(a + b) / 2 for a, b in silences]
+    while duration - position > target:
+        limit = position + target
+        # Only accept silences in the second half of the window so chunks don't get tiny
+        lo = bisect.bisect_right(midpoints, position + target / 2)
+        hi = bisect.bisect_right(midpoints, limit)
+        if hi > lo:
+            cuts.append((midpoints[hi - 1], True))
+        else:
+            cuts.append((limit, False))
+        position = cuts[-1][0]
+
+    bounds = [(0.0, True)] + cuts + [(duration, True)]
+    chunks = []
+    for (start, start_silent), (end, end_silent) in zip(bounds, bounds[1:]):
+        extract_start = start if start_silent else max(start - overlap, 0.0)
+        extract_end = end if end_silent else min(end + overlap, duration)
+        chunks.append((start, end, extract_start, extract_end))
+    return chunks
+
+
+def probe_keyframes(source_path):
+    """
+    Returns the sorted presentation times (seconds) of the video keyframes.
+    Only keyframes are decoded, so this is cheap enough to run once per source and share across modules.
+    """
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-nostats", "-skip_frame", "nokey", "-i", source_path,
+         "-map", "0:v:0", "-vf", "showinfo", "-f", "null", "-"],
+        capture_output=True, text=True, check=True
+    )
+    keyframes = []
+    for line in result.stderr.splitlines():
+        if "pts_time:" in line:
+            keyframes.append(float(line.split("pts_time:")[1].split()[0]))
+    return sorted(keyframes)
+
+
+# H.264 profile_idc -> libx264 profile, for re-encoding a hybrid clip's head in the source's own profile
+X264_PROFILES = {66: "baseline", 77: "main", 100: "high", 110: "high10", 122: "high422", 244: "high444"}
+
+
+def probe_video_format(source_path):
+    """
+    Format of the first video stream: {"codec", "pix_fmt", "profile_idc", "level_idc"} (the last two from
+    the first H.264 sequence parameter set, None for other codecs). Only the stream headers are read.
+    """
+    result = subprocess.run(
+        [FFMPEG_BINARY, "-hide_banner", "-nostats", "-i", source_path, "-map", "0:v:0", "-c:v", "copy",
+         "-bsf:v", "trace_headers", "-frames:v", "1", "-f", "null", "-"],
+        capture_output=True, text=True, check=True
+    )
+    stream = re.search(r"Stream #0:\d+.*?: Video: (\w+)[^,]*, (\w+)", result.stderr)
+    profile = re.search(r"\bprofile_idc\s+\S+ = (\d+)", result.stderr)
+    level = re.search(r"\blevel_idc\s+\S+ = (\d+)", result.stderr)
+    return {
+        "codec": stream.group(1) if stream else None,
+        "pix_fmt": stream.group(2) if stream else None,
+        "profile_idc": int(profile.group(1)) if profile else None,
+        "level_idc": int(level.group(1)) if level else None,
+    }
+
+
+def x264_matching_args(video_format):
+    """
+    libx264 arguments that encode in the same pixel format, profile and level as `video_format`
+    (probe_video_format), so the result can be spliced with stream-copied video; None if that is not possible.
+    """
+    if not video_format or video_format["codec"] != "h264" or not video_format["pix_fmt"]:
+        return None
+    profile = X264_PROFILES.get(video_format["profile_idc"])
+    level = video_format["level_idc"]
+    if profile is None or not level:
+        return None
+    return ["-c:v", "libx264", "-pix_fmt", video_format["pix_fmt"], "-profile:v", profile,
+            "-level:v", f"{level // 10}.{level % 10}"]
+
+
+def cut_clip(source_path, start, end, save_path, mode=EXPORT_MODE_DEFAULT, keyframes=None, video_format=None):
+    """
+    Writes [start, end] of the source into save_path using the given export mode (one of CLIP_EXPORT_MODES).
+    `keyframes` (probe_keyframes) is needed by "copy" and "hybrid", `video_format` (probe_video_format) by
+    "hybrid", which probes it itself if not given.
+    The clip is written to a ".part" file and renamed when complete, so save_path never holds a partial clip.
+    """
+    if mode not in CLIP_EXPORT_MODES:
+        raise ValueError(f"Unknown clip export mode '{mode}' (expected one of {', '.join(CLIP_EXPORT_MODES)})")
+    root, ext = os.path.splitext(save_path)
+    part_path = f"{root}.part{ext}"
+    try:
+        if mode == "copy":
+            _copy_cut_clip(source_path, start, end, part_path, keyframes)
+        elif mode == "hybrid":
+            _hybrid_cut_clip(source_path, start, end, part_path, keyframes,
+                             video_format if video_format is not None else probe_video_format(source_path))
+        else:
+            _reencode_cut_clip(source_path, start, end, part_path)
+        os.replace(part_path, save_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return save_path
+
+
+def _reencode_cut_clip(source_path, start, end, save_path):
+    """Frame-accurate: ffmpeg decodes from the keyframe before `start` and encodes from `start` on."""
+    _run_ffmpeg([
+        "-ss", f"{start:.3f}", "-i", source_path, "-t", f"{end - start:.3f}",
+        "-map", "0:v:0", "-map", "0:a?", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac", save_path
+    ])
+    return save_path
+
+
+def _concat_list_line(path):
+    """A concat demuxer `file` directive; quotes in the path (module names come from topic names) are escaped."""
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+
+def _copy_cut_clip(source_path, start, end, save_path, keyframes):
+    """Stream copy, no re-encode. The clip starts at the nearest keyframe at or before `start`."""
+    idx = bisect.bisect_right(keyframes, start) - 1
+    kf_start = keyframes[idx] if idx >= 0 else 0.0
+    _run_ffmpeg([
+        "-ss", f"{kf_start:.3f}", "-i", source_path, "-t", f"{end - kf_start:.3f}",
+        "-map", "0:v:0", "-map", "0:a?", "-c", "copy", "-avoid_negative_ts", "make_zero", save_path
+    ])
+    return save_path
+
+
+def _hybrid_cut_clip(source_path, start, end, save_path, keyframes, video_format):
+    """
+    Frame-accurate cut that only re-encodes [start, first keyframe after start) and
+    stream-copies the video from that keyframe to `end`. Audio is re-encoded (cheap) so both parts match.
+    The head is encoded in the source's pixel format, profile and level, so the clip keeps one stream format
+    (players do not follow a mid-stream change); a source libx264 cannot match is re-encoded whole.
+    """
+    idx = bisect.bisect_left(keyframes, start)
+    next_kf = keyframes[idx] if idx < len(keyframes) else None
+    head_codec = x264_matching_args(video_format)
+
+    if next_kf is None or next_kf >= end or head_codec is None:
+        # No keyframe inside the range (the whole clip is one short boundary GOP), or no matching head
+        return _reencode_cut_clip(source_path, start, end, save_path)
+
+    head_path = f"{save_path}.head.mp4"
+    tail_path = f"{save_path}.tail.mp4"
+    list_path = f"{save_path}.concat.txt"
+    parts = []
+    try:
+        if next_kf - start > 0.01:
+            _run_ffmpeg([
+                "-ss", f"{start:.3f}", "-i", source_path, "-t", f"{next_kf - start:.3f}",
+                "-map", "0:v:0", "-map", "0:a?", *head_codec, "-c:a", "aac", head_path
+            ])
+            parts.append(head_path)
+
+        # Input seeking with stream copy lands on the keyframe at/before the target, so nudge past rounding
+        _run_ffmpeg([
+            "-ss", f"{next_kf + 0.001:.3f}", "-i", source_path, "-t", f"{end - next_kf:.3f}",
+            "-map", "0:v:0", "-map", "0:a?", "-c:v", "copy", "-c:a", "aac", "-avoid_negative_ts", "make_zero", tail_path
+        ])
+        parts.append(tail_path)
+
+        with open(list_path, "w", encoding="utf-8") as f:
+            for part in parts:
+                f.write(_concat_list_line(part))
+        _run_ffmpeg(["-f", "concat", "-safe", "0", "-i", list_path, "-c", "copy", save_path])
+    finally:
+        for path in (head_path, tail_path, list_path):
+            if os.path.exists(path):
+                os.remove(path)
+    return save_path
+
+
+def package_hls(source_path, hls_dir, segment_seconds=HLS_SEGMENT_SECONDS):
+    """
+    Transcodes the whole source once into single-rendition fMP4 HLS (init.mp4 + seg_NNNNN.m4s + HLS_PLAYLIST)
+    in `hls_dir`, with a keyframe forced at every segment boundary. Written to a sibling ".part" directory that
+    replaces `hls_dir` when complete. Returns the playlist path.
+    """
+    part_dir = f"{hls_dir.rstrip(os.sep)}.part"
+    shutil.rmtree(part_dir, ignore_errors=True)
+    os.makedirs(part_dir)
+    try:
+        _run_ffmpeg([
+            "-i", source_path, "-map", "0:v:0", "-map", "0:a?", "-c:v", "libx264", "-pix_fmt", "yuv420p", "-c:a", "aac",
+            "-force_key_frames", f"expr:gte(t,n_forced*{segment_seconds})",
+            "-f", "hls", "-hls_time", str(segment_seconds), "-hls_playlist_type", "vod",
+            "-hls_segment_type", "fmp4", "-hls_fmp4_init_filename", "init.mp4",
+            "-hls_segment_filename", os.path.join(part_dir, "seg_%05d.m4s"), os.path.join(part_dir, HLS_PLAYLIST)
+        ])
+        shutil.rmtree(hls_dir, ignore_errors=True)
+        os.replace(part_dir, hls_dir)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return os.path.join(hls_dir, HLS_PLAYLIST)
+
+
+def read_hls_playlist(playlist_path):
+    """
+    Parses a VOD media playlist into (init segment URI or None, [(start, duration, URI), ...]).
+    URIs are as written, i.e. relative to the playlist.
+    """
+    init_uri, segments, position, duration = None, [], 0.0, None
+    with open(playlist_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("#EXT-X-MAP:"):
+                init_uri = line.split('URI="', 1)[1].split('"', 1)[0]
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            elif line and not line.startswith("#") and duration is not None:
+                segments.append((position, duration, line))
+                position += duration
+                duration = None
+    return init_uri, segments
+
+
+def hls_start_offset(playlist_path):
+    """The EXT-X-START time offset of a playlist (where a module starts in its first segment), 0.0 if it has none."""
+    with open(playlist_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.startswith("#EXT-X-START:"):
+                return float(line.split("TIME-OFFSET=", 1)[1].split(",", 1)[0])
+    return 0.0
+
+
+def write_module_playlist(rendition_playlist, start, end, save_path, segments=None):
+    """
+    Writes a playlist for [start, end] of the rendition: the segments that overlap the range, referenced
+    relative to `save_path` (nothing is copied), and an EXT-X-START so players begin at `start`. HLS has no
+    matching end marker: the last segment plays to its end, up to one segment past `end`.
+    `segments` is the parsed rendition (read_hls_playlist), if already at hand.
+    """
+    init_uri, entries = segments if segments is not None else read_hls_playlist(rendition_playlist)
+    covering = [(i, seg) for i, seg in enumerate(entries) if seg[0] + seg[1] > start and seg[0] < end]
+    if not covering:
+        raise ValueError(f"No HLS segments cover {start}s - {end}s")
+    rendition_dir = os.path.dirname(os.path.abspath(rendition_playlist))
+    save_dir = os.path.dirname(os.path.abspath(save_path))
+
+    def relative(uri):
+        return os.path.relpath(os.path.join(rendition_dir, uri), save_dir).replace(os.sep, "/")
+
+    first_index, (first_start, _, _) = covering[0]
+    lines = [
+        "#EXTM3U", "#EXT-X-VERSION:7",
+        f"#EXT-X-TARGETDURATION:{max(int(np.ceil(duration)) for _, (_, duration, _) in covering)}",
+        f"#EXT-X-MEDIA-SEQUENCE:{first_index}", "#EXT-X-PLAYLIST-TYPE:VOD", "#EXT-X-INDEPENDENT-SEGMENTS",
+    ]
+    if start - first_start > 0.001:
+        lines.append(f"#EXT-X-START:TIME-OFFSET={start - first_start:.3f},PRECISE=YES")
+    if init_uri:
+        lines.append(f'#EXT-X-MAP:URI="{relative(init_uri)}"')
+    for _, (_, duration, uri) in covering:
+        lines += [f"#EXTINF:{duration:.6f},", relative(uri)]
+    lines.append("#EXT-X-ENDLIST")
+    write_text_atomic(save_path, "\n".join(lines) + "\n")
+    return save_path
+
+
+def limited_call(limit, fn, *args):
+    """Runs fn(*args) while holding `limit` (a semaphore shared between processes), if any."""
+    if limit is None:
+        return fn(*args)
+    with limit:
+        return fn(*args)
+
+
+def timed_call(fn, *args):
+    """Runs fn(*args) and returns (result, seconds), so pool tasks are timed where they actually run."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """Content hash of a file, read in chunks so large videos are never fully in memory."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+_file_hashes = {}
+_file_hashes_lock = threading.Lock()
+
+
+def _file_hash_key(path):
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+def cached_file_sha256(path):
+    """file_sha256 memoized per (path, size, mtime), so the same media is hashed once per process."""
+    key = _file_hash_key(path)
+    with _file_hashes_lock:
+        digest = _file_hashes.get(key)
+    if digest is None:
+        digest = file_sha256(path)
+        with _file_hashes_lock:
+            _file_hashes[key] = digest
+    return digest
+
+
+def ingest_media(stream, ingest_dir=UPLOAD_DIR, suffix=".mp4", chunk_size=UPLOAD_CHUNK_BYTES,
+                 max_bytes=UPLOAD_DIR_MAX_BYTES, keep=()):
+    """
+    Stores an uploaded file as <ingest_dir>/<sha256><suffix>, reading and writing it in chunk_size pieces.
+    Content that was ingested before is reused without writing anything. Least recently ingested files
+    (except `keep`) are evicted above max_bytes.
+    Returns (path, sha256, reused).
+    """
+    os.makedirs(ingest_dir, exist_ok=True)
+    digest = hashlib.sha256()
+    tmp_path = None
+    if stream.seekable():
+        # Hash first (cheap, in memory): a known upload then costs no disk write at all
+        stream.seek(0)
+        for chunk in iter(lambda: stream.read(chunk_size), b""):
+            digest.update(chunk)
+        stream.seek(0)
+    else:
+        fd, tmp_path = tempfile.mkstemp(dir=ingest_dir, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                digest.update(chunk)
+                f.write(chunk)
+
+    sha256 = digest.hexdigest()
+    path = os.path.join(ingest_dir, f"{sha256}{suffix}")
+    reused = os.path.exists(path)
+    if reused:
+        if tmp_path:
+            os.remove(tmp_path)
+        os.utime(path) # Mark as recently used for eviction
+    elif tmp_path:
+        os.replace(tmp_path, path)
+    else:
+        fd, tmp_path = tempfile.mkstemp(dir=ingest_dir, suffix=".part")
+        with os.fdopen(fd, "wb") as f:
+            for chunk in iter(lambda: stream.read(chunk_size), b""):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+
+    with _file_hashes_lock:
+        _file_hashes[_file_hash_key(path)] = sha256
+
+    keep = {os.path.abspath(p) for p in keep} | {os.path.abspath(path)}
+    entries = sorted(
+        (entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in os.scandir(ingest_dir)
+        if entry.is_file() and not entry.name.endswith(".part")
+    )
+    total = sum(size for _, size, _ in entries)
+    for _, size, old_path in entries:
+        if total <= max_bytes:
+            break
+        if os.path.abspath(old_path) not in keep:
+            os.remove(old_path)
+            total -= size
+    return path, sha256, reused
+
+
+def write_text_atomic(path, text):
+    """Writes text to a temporary file next to path and renames it over path."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+class ProbedVideoReader(FFMPEG_VideoReader):
+    """
+    moviepy's frame reader (get_frame(t) moves forward through one ffmpeg pipe), set up from an existing
+    probe instead of running `ffmpeg -i` again. Mirrors FFMPEG_VideoReader.__init__ of moviepy 2.
+    """
+
+    def __init__(self, filename, infos, size=None, resize_algo="area"):
+        self.filename = filename
+        self.proc = None
+        self.infos = infos
+        self.fps = infos.get("video_fps", 1.0)
+        self.rotation = abs(infos.get("video_rotation", 0))
+        width, height = infos.get("video_size", (1, 1))
+        # ffmpeg applies the rotation, so a 90/270 degree video comes out with width and height swapped
+        self.size = size or ((height, width) if self.rotation in (90, 270) else (width, height))
+        self.resize_algo = resize_algo
+        self.duration = infos.get("video_duration", 0.0)
+        self.ffmpeg_duration = infos.get("duration", 0.0)
+        self.n_frames = infos.get("video_n_frames", 0)
+        self.bitrate = infos.get("video_bitrate", 0)
+        self.pixel_format = "rgb24"
+        self.depth = 3
+        self.bufsize = self.depth * self.size[0] * self.size[1] + 100
+        self.initialize()
+
+
+class MediaSession:
+    """
+    One source video for the length of a job. It is probed once (duration, frame size, fps, audio) and owns
+    the frame decoders, so planning, frame sampling, audio extraction and clip cuts never reopen or re-probe
+    it: one decoder per decode size, opened on first use and shared (frames() holds it), plus the keyframe
+    index, scanned once. Audio extraction and frame decoding are separate ffmpeg processes and may run at
+    the same time; prefetch() opens the decoder and scans keyframes in the background.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.info = ffmpeg_parse_infos(path)
+        self.duration = self.info.get("video_duration") or self.info.get("duration") or 0.0
+        width, height = self.info.get("video_size") or (0, 0)
+        # Displayed size: ffmpeg applies the rotation when decoding
+        self.video_size = (height, width) if abs(self.info.get("video_rotation", 0)) in (90, 270) else (width, height)
+        self.has_audio = bool(self.info.get("audio_found"))
+        self.stats = {"probes": 1, "decoders": 0, "keyframe_scans": 0}
+        self._readers = {}
+        self._keyframes = None
+        self._video_format = None
+        self._lock = threading.Lock()
+        self._keyframes_lock = threading.Lock()
+        self._prefetch = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @contextmanager
+    def frames(self, max_size=FRAME_MAX_SIZE):
+        """Holds the shared decoder of frames at most max_size on the longest side (get_frame(t))."""
+        with self._lock:
+            if max_size not in self._readers:
+                self._readers[max_size] = [None, threading.Lock()]
+            entry = self._readers[max_size]
+        with entry[1]:
+            if entry[0] is None:
+                # "area" is both the cheapest and the cleanest downscaler for every frame ffmpeg pipes through
+                entry[0] = ProbedVideoReader(
+                    self.path, self.info, size=frame_target_resolution(self.video_size, max_size), resize_algo="area"
+                )
+                self.stats["decoders"] += 1
+            yield entry[0]
+
+    def keyframes(self):
+        """Keyframe timestamps (see probe_keyframes), scanned on first use."""
+        with self._keyframes_lock:
+            if self._keyframes is None:
+                self._keyframes = probe_keyframes(self.path)
+                self.stats["keyframe_scans"] += 1
+            return self._keyframes
+
+    def video_format(self):
+        """Video stream format (see probe_video_format), read on first use."""
+        with self._keyframes_lock:
+            if self._video_format is None:
+                self._video_format = probe_video_format(self.path)
+            return self._video_format
+
+    def prefetch(self, frame_size=None, keyframes=False):
+        """Opens the frame decoder and/or scans the keyframes on background threads; returns immediately."""
+        def warm_up():
+            with self.frames(frame_size):
+                pass
+
+        jobs = ([warm_up] if frame_size else []) + ([self.keyframes] if keyframes else [])
+        for job in jobs:
+            thread = threading.Thread(target=job, name="media-prefetch", daemon=True)
+            thread.start()
+            self._prefetch.append(thread)
+
+    def close(self):
+        for thread in self._prefetch:
+            thread.join()
+        with self._lock:
+            for reader, _ in self._readers.values():
+                if reader is not None:
+                    reader.close()
+            self._readers = {}
+
+
+def media_path(media):
+    """File path of a MediaSession or a path."""
+    return media.path if isinstance(media, MediaSession) else media
+
+
+@contextmanager
+def media_session(media):
+    """`media` itself if it is a MediaSession, else a session on that path, closed on exit."""
+    if isinstance(media, MediaSession):
+        yield media
+    else:
+        with MediaSession(media) as session:
+            yield session
+
+
+class Transcript:
+    """
+    Timestamped transcript backed by parallel arrays (start/end times + texts), sorted by start time.
+    Time-range queries are O(log n) via binary search; the prompt string is rendered lazily and memoised.
+    `silences` is the SilenceMap of the audio's pauses, if known.
+    """
+
+    def __init__(self, starts=(), ends=(), texts=(), silences=None):
+        order = np.argsort(np.asarray(starts, dtype=np.float64), kind="stable")
+        self.starts = np.asarray(starts, dtype=np.float64)[order]
+        self.ends = np.asarray(ends, dtype=np.float64)[order]
+        self.texts = [texts[i] for i in order]
+        self.silences = silences
+        self._rendered = None
+
+    @classmethod
+    def from_segments(cls, segments, silences=None):
+        """Builds a transcript from Whisper-style [{"start", "end", "text"}, ...] segments."""
+        return cls(
+            [segment['start'] for segment in segments],
+            [segment['end'] for segment in segments],
+            [segment['text'].strip() for segment in segments],
+            silences,
+        )
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __str__(self):
+        return self.render()
+
+    def _range_indices(self, start, end):
+        """Index range [lo, hi) of the segments whose start time lies within [start, end]."""
+        lo = int(np.searchsorted(self.starts, start, side="left"))
+        hi = int(np.searchsorted(self.starts, end, side="right"))
+        return lo, hi
+
+    def _render_lines(self, lo, hi):
+        return "".join(
+            f"[{self.starts[i]:.2f}s - {self.ends[i]:.2f}s]: {self.texts[i]}\n" for i in range(lo, hi)
+        )
+
+    def render(self):
+        """Full transcript in the `[start - end]: text` prompt format."""
+        if self._rendered is None:
+            self._rendered = self._render_lines(0, len(self))
+        return self._rendered
+
+    def segment(self, start, end):
+        """Sub-transcript of the segments starting within [start, end]."""
+        lo, hi = self._range_indices(start, end)
+        return Transcript(self.starts[lo:hi], self.ends[lo:hi], self.texts[lo:hi])
+
+    def render_range(self, start, end):
+        """Prompt-format text of the segments starting within [start, end] (no trailing newline)."""
+        return self._render_lines(*self._range_indices(start, end)).rstrip("\n")
+
+    def chunks(self, max_chars):
+        """Splits into consecutive sub-transcripts whose rendered text stays within ~max_chars each."""
+        result = []
+        lo, size = 0, 0
+        for i in range(len(self)):
+            line_len = len(self._render_lines(i, i + 1))
+            if size and size + line_len > max_chars:
+                result.append(Transcript(self.starts[lo:i], self.ends[lo:i], self.texts[lo:i]))
+                lo, size = i, 0
+            size += line_len
+        if lo < len(self):
+            result.append(Transcript(self.starts[lo:], self.ends[lo:], self.texts[lo:]))
+        return result
+
+    def to_segments(self):
+        return [
+            {"start": float(self.starts[i]), "end": float(self.ends[i]), "text": self.texts[i]}
+            for i in range(len(self))
+        ]
+
+    def to_json(self):
+        return json.dumps({"segments": self.to_segments()}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data):
+        return cls.from_segments(json.loads(data)["segments"])
+
+
+class TranscriptCache:
+    """
+    Content-addressed store of Whisper results: one JSON file per (media hash, model, transcription parameters).
+    Entries are touched on read and the least recently used ones are evicted above `max_bytes`.
+    """
+
+    def __init__(self, cache_dir=TRANSCRIPT_CACHE_DIR, max_bytes=TRANSCRIPT_CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, media_hash, model, params=None):
+        """Entry key; `params` are the chunking/VAD settings the result depends on (JSON-serializable)."""
+        payload = json.dumps([TRANSCRIPT_CACHE_VERSION, media_hash, model, params or {}], sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Returns the cached entry (dict) or None."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        os.utime(path)  # Mark as recently used
+        self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        path = self._path(key)
+        # Unique per writer: concurrent jobs in one process may store the same key
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue # Evicted by another job meanwhile
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class CompletionCache:
+    """
+    SQLite store of chat completion results keyed by a canonical hash of the request.
+    Entries expire after `ttl` seconds; above `max_bytes` the least recently used rows are dropped.
+    """
+
+    def __init__(self, path=COMPLETION_CACHE_PATH, ttl=COMPLETION_CACHE_TTL, max_bytes=COMPLETION_CACHE_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, content TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def key(model, messages, params):
+        """
+        Canonical request hash. Inline images are replaced by the hash of their data URL,
+        so the key stays small and nothing but text is ever stored.
+        """
+        def canonical_content(content):
+            if not isinstance(content, list):
+                return content
+            parts = []
+            for part in content:
+                if part.get("type") == "image_url":
+                    url = part["image_url"]["url"]
+                    part = {"type": "image_url", "image_sha256": hashlib.sha256(url.encode("utf-8")).hexdigest()}
+                parts.append(part)
+            return parts
+
+        request = {
+            "model": model,
+            "messages": [{**m, "content": canonical_content(m["content"])} for m in messages],
+            "params": params,
+        }
+        blob = json.dumps(request, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock, self._connect() as db:
+            row = db.execute("SELECT content, created FROM completions WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                if row is not None:
+                    db.execute("DELETE FROM completions WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            db.execute("UPDATE completions SET accessed = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, content):
+        now = time.time()
+        with self._lock, self._connect() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO completions (key, content, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, content, len(content.encode("utf-8")), now, now)
+            )
+            db.execute("DELETE FROM completions WHERE ? - created > ?", (now, self.ttl))
+            total = db.execute("SELECT COALESCE(SUM(size), 0) FROM completions").fetchone()[0]
+            if total > self.max_bytes:
+                for row_key, size in db.execute("SELECT key, size FROM completions ORDER BY accessed").fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    db.execute("DELETE FROM completions WHERE key = ?", (row_key,))
+                    total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+class JobWorkspace:
+    """
+    Isolated directories for one job: a private temp dir for intermediate files (removed on close) and an
+    output dir that no other job in this process is writing to, so concurrent jobs (e.g. Streamlit sessions
+    sharing one server) never touch each other's files. Usable as a context manager.
+    """
+
+    _active_outputs = set()
+    _active_lock = threading.Lock()
+
+    def __init__(self, output_root="course_output", name=None, job_id=None):
+        self.job_id = job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{random.getrandbits(32):08x}"
+        name = name or self.job_id
+        with JobWorkspace._active_lock:
+            output_dir = os.path.join(output_root, name)
+            if os.path.abspath(output_dir) in JobWorkspace._active_outputs:
+                # Another job is working in it (e.g. the same video in two sessions): don't resume into it
+                output_dir = os.path.join(output_root, f"{name}-{self.job_id}")
+            JobWorkspace._active_outputs.add(os.path.abspath(output_dir))
+        self.output_dir = output_dir
+        os.makedirs(output_dir, exist_ok=True)
+        self.temp_dir = tempfile.mkdtemp(prefix=f"job_{self.job_id}_")
+
+    def close(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+        with JobWorkspace._active_lock:
+            JobWorkspace._active_outputs.discard(os.path.abspath(self.output_dir))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class JobManifest:
+    """
+    Checkpoint of one course job, kept as MANIFEST_NAME in the output directory.
+    Records the source hash, the transcript (with its silence map), the module plan (and the unmerged plan it came from) and every
+    finished artifact with its content hash and a fingerprint of the inputs that produced it, so a re-run only
+    redoes what is missing, was modified on disk or was produced with different settings.
+    Artifacts are keyed by module content (time range, topic and transcript slice), not by position, so when the
+    plan changes the modules it kept are carried over to their new place. Saved atomically after every change.
+    """
+
+    def __init__(self, output_dir):
+        self.path = os.path.join(output_dir, MANIFEST_NAME)
+        self.data = self._empty(None)
+        self._lock = threading.Lock()
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if data.get("version") == MANIFEST_VERSION:
+                    self.data = data
+            except (OSError, ValueError) as e:
+                print(f"   ⚠️ Ignoring unreadable manifest {self.path}: {e}")
+
+    @staticmethod
+    def _empty(source):
+        return {"version": MANIFEST_VERSION, "source": source, "transcript": None, "silences": None,
+                "raw_modules": None, "modules": None, "artifacts": {}, "rendition": None}
+
+    def save(self):
+        with self._lock:
+            write_text_atomic(self.path, json.dumps(self.data, ensure_ascii=False, indent=2))
+
+    def bind_source(self, source_path, source_hash):
+        """Attaches the manifest to the source media; a different file discards the old checkpoint."""
+        source = self.data["source"]
+        if source is not None and source["sha256"] == source_hash:
+            return True
+        if source is not None:
+            print(f"   ♻️  {source['name']} changed since the last run, discarding its checkpoint.")
+        self.data = self._empty({"name": os.path.basename(source_path), "sha256": source_hash})
+        self.save()
+        return False
+
+    def plan(self):
+        """(modules, Transcript) checkpointed by a previous run, or (None, None)."""
+        if not self.data["modules"] or self.data["transcript"] is None:
+            return None, None
+        silences = self.data.get("silences")
+        return self.data["modules"], Transcript.from_segments(
+            self.data["transcript"], SilenceMap.from_list(silences) if silences is not None else None
+        )
+
+    def raw_modules(self):
+        """The plan as analyzed, before short modules were merged (None if not checkpointed)."""
+        return self.data["raw_modules"]
+
+    def set_plan(self, modules, transcript, raw_modules=None):
+        """
+        Stores a new module plan; artifacts of a previous plan are kept until `carry_over` matches them
+        to the new modules. `raw_modules` defaults to the unmerged plan already checkpointed.
+        """
+        with self._lock:
+            self.data["modules"] = modules
+            self.data["transcript"] = transcript.to_segments()
+            self.data["silences"] = transcript.silences.to_list() if transcript.silences is not None else None
+            if raw_modules is not None:
+                self.data["raw_modules"] = raw_modules
+        self.save()
+
+    @staticmethod
+    def fingerprint(*inputs):
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+    @classmethod
+    def module_key(cls, topic_name, start, end, transcript):
+        """Identity of a module's content: its topic, time range and the transcript it covers."""
+        spoken = hashlib.sha256(transcript.render_range(start, end).encode("utf-8")).hexdigest()
+        return cls.fingerprint(topic_name, round(start, 3), round(end, 3), spoken)
+
+    def _intact(self, record):
+        return os.path.exists(record["path"]) and file_sha256(record["path"]) == record["sha256"]
+
+    def carry_over(self, targets):
+        """
+        Matches the checkpointed artifacts to a plan. `targets` maps each module key of the plan to
+        {kind: path}. Intact artifacts of kept modules that now have another path (the module moved) are
+        renamed there; artifacts of modules no longer in the plan, or now exported as another kind of file,
+        are deleted from disk and forgotten.
+        Returns (modules moved, modules dropped).
+        """
+        wanted = {path for kinds in targets.values() for path in kinds.values()}
+        moves, stale, dropped = [], [], 0
+        with self._lock:
+            artifacts = self.data["artifacts"]
+            for key in list(artifacts):
+                if key not in targets:
+                    stale.extend(record["path"] for record in artifacts.pop(key).values())
+                    dropped += 1
+                    continue
+                for kind, record in list(artifacts[key].items()):
+                    path = targets[key].get(kind)
+                    if path is None:
+                        del artifacts[key][kind]
+                    elif os.path.splitext(record["path"])[1] != os.path.splitext(path)[1]:
+                        stale.append(artifacts[key].pop(kind)["path"])
+                    elif record["path"] != path:
+                        if self._intact(record):
+                            moves.append((key, record, path))
+                        else:
+                            del artifacts[key][kind]
+
+        # Two phases, so modules that swap paths (e.g. every index shifted by an inserted module) don't clobber
+        staged = []
+        for key, record, path in moves:
+            temp_path = record["path"] + ".moving"
+            os.replace(record["path"], temp_path)
+            staged.append((record, temp_path, path))
+        for path in stale:
+            if path not in wanted and os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            for record, temp_path, path in staged:
+                os.replace(temp_path, path)
+                record["path"] = path
+        self.save()
+        return len({key for key, _, _ in moves}), dropped
+
+    def is_done(self, key, kind, path, fingerprint):
+        """True if the artifact was recorded for these inputs and the file on disk still has its hash."""
+        record = self.data["artifacts"].get(key, {}).get(kind)
+        if record is None or record["path"] != path or record["fingerprint"] != fingerprint:
+            return False
+        return self._intact(record)
+
+    def mark_done(self, key, kind, path, fingerprint):
+        record = {"path": path, "fingerprint": fingerprint, "sha256": file_sha256(path),
+                  "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self._lock:
+            self.data["artifacts"].setdefault(key, {})[kind] = record
+        self.save()
+
+    @staticmethod
+    def _rendition_files(path):
+        """{URI: size} of the init and media segments a rendition playlist references (None if one is missing)."""
+        rendition_dir = os.path.dirname(path)
+        init_uri, segments = read_hls_playlist(path)
+        uris = [uri for _, _, uri in segments] + ([init_uri] if init_uri else [])
+        files = {uri: os.path.join(rendition_dir, uri) for uri in uris}
+        if not all(os.path.exists(file) for file in files.values()):
+            return None
+        return {uri: os.path.getsize(file) for uri, file in files.items()}
+
+    def rendition(self, path, fingerprint):
+        """
+        True if the shared HLS rendition was recorded for these inputs, its playlist is intact and every
+        segment it references is on disk with its recorded size (segments are not re-hashed on each run).
+        """
+        record = self.data.get("rendition")
+        if record is None or record["path"] != path or record["fingerprint"] != fingerprint or not self._intact(record):
+            return False
+        return self._rendition_files(path) == record.get("segments")
+
+    def mark_rendition(self, path, fingerprint):
+        record = {"path": path, "fingerprint": fingerprint, "sha256": file_sha256(path),
+                  "segments": self._rendition_files(path), "completed_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+        with self._lock:
+            self.data["rendition"] = record
+        self.save()
+
+    def completed(self):
+        """Number of artifacts recorded as finished."""
+        return sum(len(kinds) for kinds in self.data["artifacts"].values())
+
+
+class JobMetrics:
+    """
+    Timing spans and counters for one course generation job.
+    Spans nest per thread; a counter added inside spans is credited to each open span on that thread
+    (and to its module), so e.g. the tokens of a notes completion show up under "api.chat" and "notes".
+    """
+
+    def __init__(self, job_id=None):
+        self.job_id = job_id or time.strftime("%Y%m%d-%H%M%S") + f"-{random.getrandbits(16):04x}"
+        self.started_at = time.time()
+        self.spans = []
+        self.totals = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _stack(self):
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextmanager
+    def span(self, stage, module=None, **attrs):
+        """Times the enclosed block as `stage`; the module is inherited from the enclosing span if not given."""
+        stack = self._stack()
+        if module is None and stack:
+            module = stack[-1]["module"]
+        span = {"stage": stage, "module": module, "offset_s": time.perf_counter() - self._start,
+                "duration_s": 0.0, "counters": {}, **attrs}
+        stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span["duration_s"] = time.perf_counter() - self._start - span["offset_s"]
+            stack.pop()
+            with self._lock:
+                self.spans.append(span)
+
+    def record(self, stage, duration, module=None, error=None, **counters):
+        """Adds a span that was timed elsewhere (e.g. in a worker process)."""
+        span = {
+            "stage": stage, "module": module, "offset_s": time.perf_counter() - self._start - duration,
+            "duration_s": duration, "counters": dict(counters),
+        }
+        if error:
+            span["error"] = error
+        with self._lock:
+            self.spans.append(span)
+            for name, value in counters.items():
+                self.totals[name] = self.totals.get(name, 0) + value
+
+    def add(self, name, value=1):
+        """Increments a counter in the job totals and in every span open on this thread."""
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0) + value
+            for span in self._stack():
+                span["counters"][name] = span["counters"].get(name, 0) + value
+
+    def report(self):
+        """Per-job report: totals, per-stage aggregates, per-module per-stage aggregates and the raw spans."""
+        stages, modules = {}, {}
+        with self._lock:
+            spans = list(self.spans)
+            totals = dict(self.totals)
+        for span in sorted(spans, key=lambda s: s["offset_s"]):
+            targets = [stages.setdefault(span["stage"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})]
+            if span["module"] is not None:
+                per_module = modules.setdefault(str(span["module"] + 1), {})
+                targets.append(per_module.setdefault(span["stage"], {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0}))
+            for agg in targets:
+                agg["calls"] += 1
+                agg["seconds"] += span["duration_s"]
+                agg["max_seconds"] = max(agg["max_seconds"], span["duration_s"])
+                agg["errors"] += 1 if "error" in span else 0
+                for name, value in span["counters"].items():
+                    agg[name] = agg.get(name, 0) + value
+        return {
+            "job_id": self.job_id,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "wall_seconds": time.perf_counter() - self._start,
+            "totals": totals,
+            "stages": stages,
+            "modules": modules,
+            "spans": spans,
+        }
+
+    def to_prometheus(self, report=None):
+        """The report in Prometheus text exposition format."""
+        report = report or self.report()
+        job = report["job_id"]
+        lines = [
+            "# HELP course_job_seconds Wall time of the course generation job.",
+            "# TYPE course_job_seconds gauge",
+            f'course_job_seconds{{job="{job}"}} {report["wall_seconds"]:.6f}',
+            "# HELP course_stage_seconds_total Time spent in each stage (summed over calls).",
+            "# TYPE course_stage_seconds_total counter",
+        ]
+        lines += [f'course_stage_seconds_total{{job="{job}",stage="{stage}"}} {agg["seconds"]:.6f}'
+                  for stage, agg in report["stages"].items()]
+        lines += ["# HELP course_stage_calls_total Calls of each stage.", "# TYPE course_stage_calls_total counter"]
+        lines += [f'course_stage_calls_total{{job="{job}",stage="{stage}"}} {agg["calls"]}'
+                  for stage, agg in report["stages"].items()]
+        lines += ["# HELP course_stage_errors_total Failed calls of each stage.", "# TYPE course_stage_errors_total counter"]
+        lines += [f'course_stage_errors_total{{job="{job}",stage="{stage}"}} {agg["errors"]}'
+                  for stage, agg in report["stages"].items()]
+        lines += ["# HELP course_module_seconds_total Time spent per module and stage.",
+                  "# TYPE course_module_seconds_total counter"]
+        lines += [f'course_module_seconds_total{{job="{job}",module="{module}",stage="{stage}"}} {agg["seconds"]:.6f}'
+                  for module, stages in report["modules"].items() for stage, agg in stages.items()]
+        lines += ["# HELP course_events_total Job counters (tokens, upload bytes, retries, cache hits, ...).",
+                  "# TYPE course_events_total counter"]
+        lines += [f'course_events_total{{job="{job}",name="{name}"}} {value}'
+                  for name, value in sorted(report["totals"].items())]
+        return "\n".join(lines) + "\n"
+
+    def write(self, output_dir):
+        """Writes the JSON report and the Prometheus text file into output_dir; returns both paths."""
+        report = self.report()
+        json_path = os.path.join(output_dir, METRICS_JSON)
+        prom_path = os.path.join(output_dir, METRICS_PROM)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        # Write-then-rename so a scraper never reads a half-written file
+        with open(prom_path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(self.to_prometheus(report))
+        os.replace(prom_path + ".tmp", prom_path)
+        return json_path, prom_path
+
+
+def estimate_request_tokens(messages, max_tokens=None):
+    """Tokens a chat request may use (prompt estimate + reply budget), reserved before it is sent."""
+    chars, images = 0, 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // CHARS_PER_TOKEN + images * API_IMAGE_TOKENS + (max_tokens or API_REPLY_TOKENS)
+
+
+class TokenBucket:
+    """
+    `capacity` units per `per` seconds, refilled continuously, bursting up to `capacity`.
+    Callers reserve before acting and may drive the level negative: the debt is the wait, so concurrent
+    callers are served in the order they reserved instead of racing for the refill.
+    """
+
+    def __init__(self, capacity, per=60.0):
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.level = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount):
+        """Takes `amount` units (at most the capacity) and returns the seconds to wait before using them."""
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def refund(self, amount):
+        """Returns unused units (or, with a negative amount, charges extra ones)."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level + amount)
+
+    def sync(self, remaining):
+        """Lowers the level to what the server says is left (other clients may share the quota)."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, remaining)
+
+    def pause(self, seconds):
+        """Makes the next reservation wait at least `seconds` (after a 429)."""
+        with self._lock:
+            self._refill()
+            self.level = min(self.level, -seconds * self.rate)
+
+
+class InferenceBackend:
+    """
+    What CourseGenerator needs from a model server. Messages use the OpenAI chat format: a text completion
+    has string contents, a vision completion adds {"type": "image_url"} parts.
+    - transcribe(model, file, **params) -> object with .text and .segments ([{"start", "end", "text"}, ...])
+    - chat(model, messages, **params) -> completion with .choices[0].message.content and .usage
+    - chat_batch(requests) -> one completion (or the exception raised) per {"model", "messages", **params}
+    - list_models() -> model ids
+    All take optional `metrics` (a JobMetrics) and `slot` (a semaphore held while a request is in flight).
+    """
+
+    name = None
+    batch_concurrency = LLM_WORKERS
+
+    def transcribe(self, model, file, metrics=None, slot=None, **params):
+        raise NotImplementedError
+
+    def chat(self, model, messages, metrics=None, slot=None, **params):
+        raise NotImplementedError
+
+    def list_models(self):
+        raise NotImplementedError
+
+    def stats(self):
+        return {}
+
+    def chat_batch(self, requests, metrics=None, slot=None):
+        """
+        Pipelined: up to `batch_concurrency` requests in flight over the backend's connection pool.
+        A backend with a real multi-prompt endpoint can override this to send them in one round trip.
+        """
+        def send(request):
+            request = dict(request)
+            try:
+                return self.chat(request.pop("model"), request.pop("messages"), metrics=metrics, slot=slot, **request)
+            except Exception as e:
+                return e
+
+        if len(requests) <= 1:
+            return [send(request) for request in requests]
+        with ThreadPoolExecutor(max_workers=min(self.batch_concurrency, len(requests)),
+                                thread_name_prefix=f"{self.name}-batch") as pool:
+            return list(pool.map(send, requests))
+
+
+class RateLimitedClient(InferenceBackend):
+    """
+    Base of the HTTP backends, shared by all jobs in a process (see shared_backend), so one connection pool
+    and one set of rate limits cover every request. Each request first waits for its model's requests/min
+    and tokens/min buckets, then is sent; 429s, 5xx, timeouts and connection errors are retried with jittered
+    exponential backoff, or after the server's Retry-After. A 429 pauses the model's bucket, so the other
+    threads queue behind it instead of piling on. stats() exposes the queue for tuning the limits.
+    Subclasses implement _chat_request / _transcribe_request, returning (response headers, parsed result).
+    """
+
+    default_limits = API_RATE_LIMITS
+
+    def __init__(self, api_key=None, base_url=None, limits=None, scale=1.0, max_retries=API_MAX_RETRIES):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limits = dict(self.default_limits if limits is None else limits)
+        self.scale = scale # Share of the limits for this process, e.g. 1/jobs in a batch
+        self.max_retries = max_retries
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "queued": 0, "in_flight": 0, "wait_seconds": 0.0, "rate_limited": 0,
+                       "retries": 0, "failures": 0}
+
+    def _model_buckets(self, model):
+        with self._lock:
+            if model not in self._buckets:
+                rpm, tpm = self.limits.get(model, self.limits.get("default", (None, None)))
+                self._buckets[model] = (
+                    TokenBucket(max(1.0, rpm * self.scale)) if rpm else None,
+                    TokenBucket(max(1.0, tpm * self.scale)) if tpm else None,
+                )
+            return self._buckets[model]
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self):
+        """Snapshot: requests sent, callers waiting for a bucket (queued), in flight, total wait, 429s, retries."""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["models"] = {
+                model: {"requests_available": requests.level if requests else None,
+                        "tokens_available": tokens.level if tokens else None}
+                for model, (requests, tokens) in self._buckets.items()
+            }
+        return stats
+
+    def _throttle(self, model, tokens, metrics=None):
+        """Blocks until the model's buckets allow one request of `tokens` tokens."""
+        requests_bucket, tokens_bucket = self._model_buckets(model)
+        wait = max(
+            requests_bucket.reserve(1) if requests_bucket else 0.0,
+            tokens_bucket.reserve(tokens) if tokens_bucket and tokens else 0.0,
+        )
+        if wait <= 0:
+            return
+        self._count("queued")
+        try:
+            with metrics.span("api.throttle") if metrics else nullcontext():
+                time.sleep(wait)
+        finally:
+            self._count("queued", -1)
+            self._count("wait_seconds", wait)
+
+    @staticmethod
+    def retry_delay(attempt, headers=None):
+        """Seconds before retry `attempt` (0-based): the server's Retry-After if given, else full-jitter backoff."""
+        headers = headers or {}
+        for name, unit in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+            try:
+                return float(headers.get(name)) * unit
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(API_BACKOFF_MAX, API_BACKOFF_BASE * 2 ** attempt))
+
+    @staticmethod
+    def _status(error):
+        """HTTP status of a failed request (SDK or httpx error), None if there was no response."""
+        return getattr(getattr(error, "response", None), "status_code", None)
+
+    @classmethod
+    def _is_retryable(cls, error):
+        if isinstance(error, (APIConnectionError, httpx.TransportError)): # Includes timeouts
+            return True
+        status = cls._status(error)
+        return status is not None and (status in (408, 409, 429) or status >= 500)
+
+    def _send(self, model, tokens, request, metrics=None, slot=None):
+        """Runs `request()` under the rate limits, retrying transient failures; returns its parsed result."""
+        _, tokens_bucket = self._model_buckets(model)
+        for attempt in range(self.max_retries + 1):
+            self._throttle(model, tokens, metrics)
+            try:
+                with slot or nullcontext():
+                    self._count("in_flight")
+                    try:
+                        self._count("requests")
+                        headers, result = request()
+                    finally:
+                        self._count("in_flight", -1)
+            except Exception as e:
+                if tokens_bucket and tokens:
+                    tokens_bucket.refund(tokens) # Reserved again by the retry
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                delay = self.retry_delay(attempt, headers)
+                if not self._is_retryable(e) or attempt == self.max_retries or delay > API_RETRY_AFTER_MAX:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                if metrics:
+                    metrics.add("retries")
+                if self._status(e) == 429:
+                    self._count("rate_limited")
+                    if metrics:
+                        metrics.add("rate_limited")
+                    # Everyone waits out the server's window, this request included (via _throttle)
+                    buckets = [bucket for bucket in self._model_buckets(model) if bucket]
+                    for bucket in buckets:
+                        bucket.pause(delay)
+                    print(f"   🚦 {model} rate limited, retrying in {delay:.1f}s...")
+                    if not buckets:
+                        time.sleep(delay) # No limits configured for this model: nothing else makes it wait
+                else:
+                    print(f"   ⚠️ {model} request failed ({type(e).__name__}: {e}), retrying in {delay:.1f}s...")
+                    time.sleep(delay)
+                continue
+            remaining = headers.get("x-ratelimit-remaining-tokens")
+            if tokens_bucket and remaining is not None:
+                try:
+                    tokens_bucket.sync(float(remaining) * self.scale)
+                except ValueError:
+                    pass
+            return result
+
+    def _chat_request(self, model, messages, **params):
+        raise NotImplementedError
+
+    def _transcribe_request(self, model, file, **params):
+        raise NotImplementedError
+
+    def chat(self, model, messages, metrics=None, slot=None, **params):
+        """A chat completion under the rate limits; the token reservation is settled from the usage."""
+        tokens = estimate_request_tokens(messages, params.get("max_tokens"))
+        completion = self._send(
+            model, tokens, lambda: self._chat_request(model, messages, **params), metrics, slot
+        )
+        _, tokens_bucket = self._model_buckets(model)
+        usage = getattr(completion, "usage", None)
+        if tokens_bucket and usage is not None and usage.total_tokens:
+            tokens_bucket.refund(tokens - usage.total_tokens)
+        return completion
+
+    def transcribe(self, model, file, metrics=None, slot=None, **params):
+        """An audio transcription under the rate limits. `file` is a (filename, bytes) tuple."""
+        return self._send(model, 0, lambda: self._transcribe_request(model, file, **params), metrics, slot)
+
+
+class GroqBackend(RateLimitedClient):
+    """Groq Cloud through the groq SDK (or a Groq-compatible server at base_url, e.g. fake_groq_server.py)."""
+
+    name = "groq"
+
+    def __init__(self, api_key=None, base_url=None, limits=None, scale=1.0, max_retries=API_MAX_RETRIES):
+        super().__init__(api_key, base_url, limits, scale, max_retries)
+        # The SDK's own retries are off: they would bypass the buckets
+        self.client = Groq(api_key=api_key, base_url=base_url, max_retries=0)
+
+    def _chat_request(self, model, messages, **params):
+        response = self.client.chat.completions.with_raw_response.create(model=model, messages=messages, **params)
+        return response.headers, response.parse()
+
+    def _transcribe_request(self, model, file, **params):
+        response = self.client.audio.transcriptions.with_raw_response.create(file=file, model=model, **params)
+        return response.headers, response.parse()
+
+    def list_models(self):
+        return [m.id for m in self.client.models.list().data]
+
+
+class OpenAICompatibleBackend(RateLimitedClient):
+    """
+    Any server speaking the OpenAI REST API at base_url (".../v1"): Ollama, vLLM, llama.cpp, LocalAI, or a
+    faster-whisper server for transcription. No quota by default, and batches are pipelined up to the
+    server's parallel slots (LOCAL_PARALLEL), which these servers batch on the GPU.
+    """
+
+    name = "openai"
+    default_limits = LOCAL_RATE_LIMITS
+    batch_concurrency = LOCAL_PARALLEL
+
+    def __init__(self, api_key=None, base_url=None, limits=None, scale=1.0, max_retries=API_MAX_RETRIES):
+        super().__init__(api_key, (base_url or LOCAL_BASE_URL_DEFAULT).rstrip("/"), limits, scale, max_retries)
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        # One keep-alive pool for every job in the process
+        self.http = httpx.Client(
+            headers=headers, timeout=LOCAL_TIMEOUT,
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=max(LOCAL_PARALLEL, LLM_WORKERS))
+        )
+
+    def _post(self, path, **kwargs):
+        response = self.http.post(f"{self.base_url}{path}", **kwargs)
+        if response.is_error:
+            # Keep the server's message: e.g. the text-only fallback in generate_module_content looks at it
+            raise httpx.HTTPStatusError(
+                f"{response.status_code} from {path}: {response.text[:500]}", request=response.request, response=response
+            )
+        return response
+
+    def _chat_request(self, model, messages, **params):
+        response = self._post("/chat/completions", json={"model": model, "messages": messages, **params})
+        # Attribute access like the SDK's objects (completion.choices[0].message.content)
+        return response.headers, json.loads(response.text, object_hook=lambda d: SimpleNamespace(**d))
+
+    def _transcribe_request(self, model, file, **params):
+        data = {"model": model, **{key: str(value) for key, value in params.items()}}
+        payload = self._post("/audio/transcriptions", files={"file": file}, data=data).json()
+        return {}, SimpleNamespace(text=payload.get("text", ""), segments=payload.get("segments"))
+
+    def list_models(self):
+        response = self.http.get(f"{self.base_url}/models")
+        response.raise_for_status()
+        return [m["id"] for m in response.json()["data"]]
+
+
+BACKEND_CLASSES = {backend.name: backend for backend in (GroqBackend, OpenAICompatibleBackend)}
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def shared_backend(backend=BACKEND_DEFAULT, api_key=None, base_url=None, limits=None, scale=1.0):
+    """
+    The process-wide backend (one of BACKENDS) for an API key and server, created on first use.
+    `limits` and `scale` only apply when it is created; later callers share the same buckets and connections.
+    """
+    with _backends_lock:
+        key = (backend, api_key, base_url)
+        if key not in _backends:
+            _backends[key] = BACKEND_CLASSES[backend](api_key, base_url, limits=limits, scale=scale)
+        return _backends[key]
+
 
 class CourseGenerator:
-    def __init__(self, api_key, model_name=None):
+    def __init__(self, api_key, model_name=None, transcript_cache=None, completion_cache=None,
+                 frame_max_size=FRAME_MAX_SIZE, jpeg_quality=FRAME_JPEG_QUALITY, base_url=None,
+                 api_limit=None, encode_limit=None, work_dir=None, rate_limits=None, backend=BACKEND_DEFAULT,
+                 text_model=None, transcribe_model=None):
         self.api_key = api_key
-        self.client = Groq(api_key=api_key)
+        # `backend` is one of BACKENDS; base_url points it at another server (e.g. fake_groq_server.py, or a
+        # local Ollama for "openai"). It (rate limits, retries, connections) is shared with every job in the process
+        self.client = shared_backend(backend, api_key, base_url, limits=rate_limits)
         self.vision_model_name = model_name if model_name else VISION_MODEL_DEFAULT
-        print(f"🌩️ Initialized. Structure: {STRUCTURE_MODEL}, Vision: {self.vision_model_name}")
+        self.text_model = text_model if text_model else STRUCTURE_MODEL
+        self.transcribe_model = transcribe_model if transcribe_model else WHISPER_MODEL
+        self.transcript_cache = transcript_cache if transcript_cache else TranscriptCache()
+        self.completion_cache = completion_cache if completion_cache else CompletionCache()
+        self.frame_max_size = frame_max_size
+        self.jpeg_quality = jpeg_quality
+        # Optional semaphores shared with other jobs (see run_batch): API requests in flight, clip encodes running
+        self.api_limit = api_limit
+        self.encode_limit = encode_limit
+        # Where intermediate files (audio, chunks) go: a JobWorkspace temp dir, or the system temp dir if None
+        self.work_dir = work_dir
+        self.metrics = JobMetrics()
+        self.digest_report = None
+        self._digests = {}
+        self._digest_lock = threading.Lock()
+        print(f"🌩️ Initialized ({self.client.name}). Structure: {self.text_model}, Vision: {self.vision_model_name}")
 
-    def extract_audio(self, video_path):
-        """Extracts audio from video and saves as temp mp3."""
+    def source_sha256(self, media):
+        """file_sha256 of the source media, memoized per (path, size, mtime) so a job hashes it once."""
+        return cached_file_sha256(media_path(media))
+
+    @property
+    def token_usage(self):
+        """Prompt/completion tokens reported by the API for the current job."""
+        totals = self.metrics.totals
+        return {"prompt_tokens": totals.get("prompt_tokens", 0), "completion_tokens": totals.get("completion_tokens", 0)}
+
+    def extract_audio(self, media, audio_path, start=None, end=None):
+        """
+        Extracts (a range of) the audio as low-bitrate mono mp3, which is all Whisper needs, or as raw 16 kHz
+        PCM if `audio_path` ends in .pcm. `media` is a MediaSession or a path; this is its own ffmpeg process,
+        so it can overlap frame decoding.
+        """
+        if isinstance(media, MediaSession) and not media.has_audio:
+            raise ValueError(f"{os.path.basename(media.path)} has no audio stream to transcribe")
         print("   🔊 Extracting audio...")
-        audio_path = "temp_audio.mp3"
-        with VideoFileClip(video_path) as clip:
-            clip.audio.write_audiofile(audio_path, logger=None)
+        args = []
+        if start is not None:
+            args += ["-ss", f"{start:.3f}"]
+        args += ["-i", media_path(media)]
+        if end is not None:
+            args += ["-t", f"{end - (start or 0.0):.3f}"]
+        with self.metrics.span("audio_extract"):
+            output = ["-f", "s16le"] if audio_path.endswith(".pcm") else ["-b:a", AUDIO_BITRATE]
+            _run_ffmpeg(args + ["-map", "0:a:0", "-vn", "-ac", "1", "-ar", str(AUDIO_SAMPLE_RATE), *output, audio_path])
         return audio_path
 
-    def extract_frames_base64(self, video_path, start_time=0, end_time=None, interval=None, max_frames=5):
+    def _frame_timestamps(self, duration, start_time=0, end_time=None, max_frames=5):
+        """Returns the sample timestamps for a [start_time, end_time] range (clamped to duration)."""
+        if end_time is None or end_time > duration:
+            end_time = duration
+        if end_time - start_time <= 0:
+            return []
+        return np.linspace(start_time, end_time - 0.1, num=max_frames).tolist()
+
+    def _encode_frame(self, frame_np):
+        """Converts an RGB frame to a resized JPEG Base64 string."""
+        # Resize to reduce token usage/latency
+        return encode_frame_jpeg_b64(frame_np, self.frame_max_size, self.jpeg_quality)
+
+    def extract_frames_base64(self, media, start_time=0, end_time=None, interval=None, max_frames=5):
         """
-        Extracts frames from the video.
+        Extracts frames from the video (a MediaSession, whose decoder is reused, or a path).
         If interval is None, it calculates one to satisfy max_frames.
         Returns a list of Base64 strings (max max_frames).
         """
         print(f"   🎞️  Extracting frames from {start_time}s to {end_time if end_time else 'end'} (Max: {max_frames})...")
         frames_b64 = []
-        with VideoFileClip(video_path) as clip:
-            duration = clip.duration
-            if end_time is None:
-                end_time = duration
-            
-            # Clamp end_time
-            if end_time > duration:
-                end_time = duration
-            
-            current_duration = end_time - start_time
-            if current_duration <= 0: return []
-            
+        with self.metrics.span("frames"), media_session(media) as session, session.frames(self.frame_max_size) as clip:
             # Calculate timestamps safely
-            timestamps = np.linspace(start_time, end_time - 0.1, num=max_frames)
-            
+            timestamps = self._frame_timestamps(session.duration, start_time, end_time, max_frames)
+
             for t in timestamps:
                 try:
-                    frame_np = clip.get_frame(t)
-                    
-                    # Convert to PIL Image
-                    img = Image.fromarray(frame_np)
-                    
-                    # Resize to reduce token usage/latency
-                    img.thumbnail((640, 640)) 
-                    
-                    # Convert to bytes then base64
-                    buffered = BytesIO()
-                    img.save(buffered, format="JPEG")
-                    img_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                    frames_b64.append(img_str)
+                    frames_b64.append(self._encode_frame(clip.get_frame(t)))
                 except Exception as e:
                     print(f"Error extracting frame at {t}: {e}")
+            self.metrics.add("frames", len(frames_b64))
                 
         print(f"   ✅ Extracted {len(frames_b64)} frames.")
         return frames_b64
 
-    def analyze_structure(self, video_file):
-        """Step 1: Get the timestamps via AUDIO TRANSCRIPTION."""
-        print("🧠 Analyzing course structure (Audio-Based)...")
-        
-        try:
-            # 1. Extract Audio
-            audio_file = self.extract_audio(video_file)
-            
-            # 2. Transcribe with Timestamps
-            print("   🗣️  Transcribing audio with timestamps...")
+    def sample_module_frames(self, media, modules, max_frames=5, strategy=FRAME_STRATEGY_DEFAULT):
+        """
+        Extracts the frames for ALL modules in a single forward decode pass.
+        Timestamps of every module are computed up front and visited in ascending order,
+        so the reader only ever moves forward instead of reopening/seeking per module.
+        With the "scene" strategy each module decodes several candidates and keeps only the most
+        distinct ones (possibly fewer than max_frames).
+        `media` is a MediaSession (its shared decoder is used) or a path.
+        Returns a dict {module_index: [base64, ...]}.
+        """
+        print(f"   🎞️  Sampling frames for {len(modules)} modules (Max: {max_frames} each, {strategy})...")
+        frame_futures = {idx: [] for idx in range(len(modules))}
+        with self.metrics.span("frames", strategy=strategy), media_session(media) as session, \
+                session.frames(self.frame_max_size) as clip, ThreadPoolExecutor(max_workers=FRAME_ENCODE_WORKERS) as encode_pool:
+            # Decoding stays sequential (single forward pass); JPEG/Base64 encoding overlaps with it
+            if strategy == "scene":
+                for idx in sorted(range(len(modules)), key=lambda i: float(modules[i]['start_time'])):
+                    start = float(modules[idx]['start_time'])
+                    end = float(modules[idx]['end_time'])
+                    candidates = []
+                    for t in self._frame_timestamps(session.duration, start, end, max_frames * SCENE_CANDIDATES_PER_FRAME):
+                        try:
+                            candidates.append(clip.get_frame(t))
+                        except Exception as e:
+                            print(f"Error extracting frame at {t}: {e}")
+                    chosen = select_distinct_frames([frame_signature(f) for f in candidates], max_frames)
+                    frame_futures[idx] = [encode_pool.submit(self._encode_frame, candidates[i]) for i in chosen]
+            else:
+                schedule = []
+                for idx, module in enumerate(modules):
+                    start = float(module['start_time'])
+                    end = float(module['end_time'])
+                    for t in self._frame_timestamps(session.duration, start, end, max_frames):
+                        schedule.append((t, idx))
+                schedule.sort()
+
+                last_t, last_future = None, None
+                for t, idx in schedule:
+                    try:
+                        # Adjacent modules can share a boundary timestamp; decode it once
+                        if t != last_t:
+                            last_future = encode_pool.submit(self._encode_frame, clip.get_frame(t))
+                            last_t = t
+                        frame_futures[idx].append(last_future)
+                    except Exception as e:
+                        print(f"Error extracting frame at {t}: {e}")
+
+            frame_map = {}
+            for idx, futures in frame_futures.items():
+                frame_map[idx] = []
+                for future in futures:
+                    try:
+                        frame_map[idx].append(future.result())
+                    except Exception as e:
+                        print(f"Error encoding frame for module {idx+1}: {e}")
+            self.metrics.add("frames", sum(len(f) for f in frame_map.values()))
+
+        print(f"   ✅ Sampled {sum(len(f) for f in frame_map.values())} frames.")
+        return frame_map
+
+    def _transcribe_file(self, audio_file):
+        """Uploads one audio file to Whisper (the client retries transient errors) and returns the raw transcription."""
+        with self.metrics.span("api.transcribe", model=self.transcribe_model):
             with open(audio_file, "rb") as file:
-                transcription = self.client.audio.transcriptions.create(
-                    file=(audio_file, file.read()),
-                    model=WHISPER_MODEL,
-                    response_format="verbose_json" # Request detailed segments
+                data = file.read()
+            self.metrics.add("requests")
+            self.metrics.add("upload_bytes", len(data))
+            return self.client.transcribe(
+                self.transcribe_model, (os.path.basename(audio_file), data), metrics=self.metrics, slot=self.api_limit,
+                response_format="verbose_json" # Request detailed segments
+            )
+
+    def _transcribe_chunked(self, video_file, skip_silence=VAD_SKIP_SILENCE):
+        """
+        Transcribes the speech in the audio in silence-aligned chunks, concurrently.
+        A VAD pass over the decoded PCM finds the pauses; silences of `skip_silence` seconds or more are cut
+        out of the uploaded audio (None uploads all of it) and the timestamps mapped back to the original timeline.
+        Segments from overlapping audio are kept only by the chunk that owns their start time, so nothing is
+        duplicated. Returns (Whisper segments on the original timeline, SilenceMap of the pauses).
+        """
+        work_dir = tempfile.mkdtemp(prefix="transcribe_", dir=self.work_dir)
+        try:
+            # Decoded once to PCM: the VAD reads it and only the audio that is uploaded gets encoded
+            pcm = read_pcm(self.extract_audio(video_file, os.path.join(work_dir, "audio.pcm")))
+            with self.metrics.span("vad"):
+                silences = detect_pauses(pcm)
+            duration = len(pcm) / AUDIO_SAMPLE_RATE
+            timeline = SpeechTimeline(duration, silences, skip=skip_silence)
+            if timeline.skipped > 0:
+                self.metrics.add("vad_skipped_seconds", timeline.skipped)
+                print(f"   🤫 Skipping {timeline.skipped:.0f}s of silence ({timeline.skipped / max(duration, 1e-9):.0%} "
+                      f"of the audio) in {len(timeline.regions) - 1} stretches.")
+            # Chunks are planned on the condensed timeline, where every cut-out stretch is a short pause
+            chunks = plan_audio_chunks(
+                timeline.duration, [(timeline.to_condensed(start), timeline.to_condensed(end)) for start, end in silences]
+            )
+            print(f"   🗣️  Transcribing audio with timestamps ({len(chunks)} chunks)...")
+
+            def transcribe_chunk(idx):
+                start, end, extract_start, extract_end = chunks[idx]
+                chunk_file = encode_pcm_mp3(
+                    pcm, timeline.pieces(extract_start, extract_end), os.path.join(work_dir, f"chunk_{idx:04d}.mp3")
                 )
-            
-            # Construct formatted transcript from segments
-            transcript_text = ""
-            if hasattr(transcription, 'segments'):
-                for segment in transcription.segments:
-                    start = segment['start']
-                    end = segment['end']
-                    text = segment['text'].strip()
-                    transcript_text += f"[{start:.2f}s - {end:.2f}s]: {text}\n"
+                transcription = self._transcribe_file(chunk_file)
+
+                raw_segments = getattr(transcription, 'segments', None)
+                if raw_segments is None:
+                    # Fallback if standard json returned (unlikely with verbose_json)
+                    raw_segments = [{"start": 0.0, "end": extract_end - extract_start, "text": transcription.text}]
+
+                segments = []
+                for segment in raw_segments:
+                    seg_start = segment['start'] + extract_start
+                    if start <= seg_start < end or (idx == len(chunks) - 1 and seg_start >= end):
+                        segments.append({
+                            "start": timeline.to_original(seg_start),
+                            "end": timeline.to_original(segment['end'] + extract_start),
+                            "text": segment['text'].strip(),
+                        })
+                return segments
+
+            with ThreadPoolExecutor(max_workers=TRANSCRIBE_WORKERS) as pool:
+                chunk_segments = list(pool.map(transcribe_chunk, range(len(chunks))))
+            del pcm # Unmaps the PCM file before the work dir is removed
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        return [segment for segments in chunk_segments for segment in segments], silences
+
+    @staticmethod
+    def transcription_params():
+        """The settings a transcription depends on besides the media and model (part of its cache key)."""
+        return {
+            "audio": [AUDIO_SAMPLE_RATE, AUDIO_BITRATE],
+            "chunks": [TRANSCRIBE_CHUNK_SECONDS, TRANSCRIBE_CHUNK_OVERLAP],
+            "vad": [VAD_FRAME_SECONDS, VAD_MARGIN_DB, list(VAD_THRESHOLD_DB), VAD_MIN_SPEECH, VAD_MIN_SILENCE,
+                    VAD_SKIP_SILENCE, VAD_PAD],
+        }
+
+    def transcribe(self, video_file):
+        """
+        Returns the timestamped Transcript of the video, with the SilenceMap of its pauses.
+        Whisper segments are cached by content hash + model + transcription_params(), so a hit skips audio
+        extraction and upload.
+        """
+        with self.metrics.span("transcribe"):
+            with self.metrics.span("hash"):
+                cache_key = self.transcript_cache.key(
+                    self.source_sha256(video_file), self.transcribe_model, self.transcription_params()
+                )
+            entry = self.transcript_cache.get(cache_key)
+            if entry is None:
+                segments, silences = self._transcribe_chunked(video_file)
+                entry = {
+                    "model": self.transcribe_model,
+                    "segments": segments,
+                    "text": " ".join(segment['text'] for segment in segments),
+                    "silences": silences.to_list(),
+                }
+                self.transcript_cache.put(cache_key, entry)
             else:
-                # Fallback if standard json returned (unlikely with verbose_json)
-                transcript_text = transcription.text
+                self.metrics.add("transcript_cache_hits")
+                print("   ♻️  Transcript cache hit, skipping extraction & transcription.")
+
+        stats = self.transcript_cache.stats()
+        print(f"   📦 Transcript cache: {stats['hits']} hits, {stats['misses']} misses.")
+
+        return Transcript.from_segments(entry["segments"], SilenceMap.from_list(entry["silences"]))
+
+    def analyze_structure(self, video_file, use_cache=True, min_duration=MERGE_MIN_DURATION):
+        """Step 1: Get the timestamps via AUDIO TRANSCRIPTION, merging modules under `min_duration` seconds."""
+        modules, transcript = self.discover_modules(video_file, use_cache=use_cache)
+        return self.merge_plan(modules, min_duration, transcript.silences), transcript
+
+    def merge_plan(self, modules, min_duration=MERGE_MIN_DURATION, silences=None):
+        """
+        The final module plan: `modules` with the ones under `min_duration` seconds merged into a neighbour
+        and, given the SilenceMap, the boundaries between them moved to the nearest pause.
+        """
+        if not modules:
+            return []
+        print(f"   🧹 Post-processing: Merging short segments (under {min_duration:g}s)...")
+        final_modules = self.smart_merge_modules(modules, min_duration=min_duration, silences=silences)
+        print(f"   ✅ Merged {len(modules)} -> {len(final_modules)} modules.")
+        return final_modules
+
+    def discover_modules(self, video_file, use_cache=True):
+        """Transcribes the media and asks the text model for its modules; returns (unmerged modules, Transcript)."""
+        print("🧠 Analyzing course structure (Audio-Based)...")
+        
+        try:
+            # 1 + 2. Extract Audio & Transcribe with Timestamps (cached by media hash)
+            transcript = self.transcribe(video_file)
+            transcript_text = transcript.render()
 
             print(f"   ✅ Interpretation complete. Transcript length: {len(transcript_text)} chars.")
             # For debugging, maybe save transcript?
             # with open("debug_transcript.txt", "w") as f: f.write(transcript_text)
 
             # 3. Analyze Transcript with Logic Model
-            completion = self.client.chat.completions.create(
-                model=STRUCTURE_MODEL,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": DISCOVERY_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Here is the timestamped video transcript:\n\n{transcript_text}"
-                    }
-                ],
-                temperature=0.1, # Lowest temp for strict logic
-                response_format={"type": "json_object"} 
-            )
+            with self.metrics.span("structure"):
+                content = self._chat_completion(
+                    self.text_model,
+                    [
+                        {
+                            "role": "system",
+                            "content": DISCOVERY_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Here is the timestamped video transcript:\n\n{transcript_text}"
+                        }
+                    ],
+                    use_cache=use_cache,
+                    temperature=0.1, # Lowest temp for strict logic
+                    response_format={"type": "json_object"} 
+                )
             
-            content = completion.choices[0].message.content
             # Clean up
             content = content.replace("```json", "").replace("```", "").strip()
             
@@ -239,7 +2242,7 @@ class CourseGenerator:
             # Validation
             if not isinstance(data, list):
                 print(f"❌ Error: Expected JSON array, got {type(data)}.")
-                return [], ""
+                return [], Transcript()
                 
             valid_modules = []
             for item in data:
@@ -248,145 +2251,145 @@ class CourseGenerator:
                 else:
                     print(f"⚠️ Skipping invalid item: {item}")
             
-            # Cleanup temp audio
-            if os.path.exists(audio_file):
-                os.remove(audio_file)
-
-            # --- POST-PROCESSING: SMART MERGE ---
-            print(f"   🧹 Post-processing: Merging short segments (under 60s)...")
-            final_modules = self.smart_merge_modules(valid_modules, min_duration=60)
-            print(f"   ✅ Merged {len(valid_modules)} -> {len(final_modules)} modules.")
-
-            return final_modules, transcript_text
+            return valid_modules, transcript
             
         except Exception as e:
             import traceback
             traceback.print_exc()
             print(f"❌ Error during analysis: {str(e)}")
-            return [], ""
+            return [], Transcript()
 
-    def smart_merge_modules(self, modules, min_duration=60):
+    def smart_merge_modules(self, modules, min_duration=MERGE_MIN_DURATION, verbose=False, silences=None,
+                            snap_window=SNAP_WINDOW):
         """
         Iteratively merges modules smaller than min_duration.
         Strategy:
-        - If module < min_duration:
+        - If module < min_duration (shortest first, earliest on ties):
           - Merge with PREVIOUS if exists (preferred for sub-points).
           - Else merge with NEXT.
         - Name Priority: Keep the name of the LONGER segment (Topic Integrity).
+        Runs in O(n log n): a min-heap finds the shortest module and a doubly linked list merges neighbours in O(1).
+        With a SilenceMap, every boundary between two merged modules is then snapped to the middle of the nearest
+        pause within `snap_window` seconds, so clips are not cut mid-sentence (the course start and end stay put).
         """
         if not modules: return []
-        
-        # Make a copy to avoid mutating original list while iterating (though we restart loop)
-        current_modules = modules.copy()
-        
-        while True:
-            # 1. Check if any module is too short
-            too_short_index = -1
-            shortest_duration = float('inf')
-            
-            for i, mod in enumerate(current_modules):
-                dur = mod['end_time'] - mod['start_time']
-                if dur < min_duration:
-                    if dur < shortest_duration:
-                        shortest_duration = dur
-                        too_short_index = i
-            
-            # If no short modules found, or only 1 module left, we are done
-            if too_short_index == -1 or len(current_modules) <= 1:
-                break
-                
-            # 2. Merge Logic
-            # We found a short module at `too_short_index`.
-            target_idx = too_short_index
-            
-            # Decide neighbor: Prev (i-1) or Next (i+1)
-            # Default: Merge into PREV (e.g. Example merges into Definition)
-            # But if it's the first one, must merge into NEXT.
-            
-            output_modules = []
-            
-            if target_idx > 0:
-                # Merge with PREV
-                prev_mod = current_modules[target_idx - 1]
-                short_mod = current_modules[target_idx]
-                
-                # Check who is dominant (Longer duration wins name)
-                prev_dur = prev_mod['end_time'] - prev_mod['start_time']
-                short_dur = short_mod['end_time'] - short_mod['start_time']
-                
-                new_name = prev_mod['topic_name'] if prev_dur >= short_dur else short_mod['topic_name']
-                
-                merged_mod = {
-                    "topic_name": new_name,
-                    "start_time": prev_mod['start_time'],
-                    "end_time": short_mod['end_time']
-                }
-                
-                # Reconstruct list
-                # All before prev + new + all after short
-                output_modules = current_modules[:target_idx-1] + [merged_mod] + current_modules[target_idx+1:]
-                
-                print(f"      🔹 Merged '{short_mod['topic_name']}' ({short_dur:.1f}s) ⬅️ INTO '{prev_mod['topic_name']}'")
-                
+
+        def duration(mod):
+            return mod['end_time'] - mod['start_time']
+
+        count = len(modules)
+        nodes = list(modules)
+        # Leftmost original position of each node: list order, used to break ties like a left-to-right scan
+        position = list(range(count))
+        prev_of = [i - 1 for i in range(count)]
+        next_of = [i + 1 if i + 1 < count else -1 for i in range(count)]
+        alive = [True] * count
+        head = 0
+
+        heap = [(duration(mod), i, i) for i, mod in enumerate(nodes) if duration(mod) < min_duration]
+        heapq.heapify(heap)
+
+        while heap and count > 1:
+            short_dur, _, short_idx = heapq.heappop(heap)
+            if not alive[short_idx]:
+                continue  # Stale entry: already merged away
+
+            short_mod = nodes[short_idx]
+            if prev_of[short_idx] != -1:
+                # Merge with PREV: the longer of the two keeps its name
+                left, right = prev_of[short_idx], short_idx
+                prev_mod = nodes[left]
+                new_name = prev_mod['topic_name'] if duration(prev_mod) >= short_dur else short_mod['topic_name']
+                if verbose:
+                    print(f"      🔹 Merged '{short_mod['topic_name']}' ({short_dur:.1f}s) ⬅️ INTO '{prev_mod['topic_name']}'")
             else:
-                # Must be index 0, Merge with NEXT
-                short_mod = current_modules[0]
-                next_mod = current_modules[1]
-                
-                short_dur = short_mod['end_time'] - short_mod['start_time']
-                next_dur = next_mod['end_time'] - next_mod['start_time']
-                
-                new_name = next_mod['topic_name'] if next_dur >= short_dur else short_mod['topic_name']
-                
-                merged_mod = {
-                    "topic_name": new_name,
-                    "start_time": short_mod['start_time'],
-                    "end_time": next_mod['end_time']
-                }
-                
-                output_modules = [merged_mod] + current_modules[2:]
-                
-                print(f"      🔹 Merged '{short_mod['topic_name']}' ({short_dur:.1f}s) INTO ➡️ '{next_mod['topic_name']}'")
-            
-            current_modules = output_modules
-            
+                # Must be the first module, merge with NEXT
+                left, right = short_idx, next_of[short_idx]
+                next_mod = nodes[right]
+                new_name = next_mod['topic_name'] if duration(next_mod) >= short_dur else short_mod['topic_name']
+                if verbose:
+                    print(f"      🔹 Merged '{short_mod['topic_name']}' ({short_dur:.1f}s) INTO ➡️ '{next_mod['topic_name']}'")
+
+            merged_mod = {
+                "topic_name": new_name,
+                "start_time": nodes[left]['start_time'],
+                "end_time": nodes[right]['end_time']
+            }
+
+            # Splice the merged node in place of [left, right]
+            merged_idx = len(nodes)
+            nodes.append(merged_mod)
+            position.append(position[left])
+            prev_of.append(prev_of[left])
+            next_of.append(next_of[right])
+            alive.append(True)
+            alive[left] = alive[right] = False
+            if prev_of[left] != -1:
+                next_of[prev_of[left]] = merged_idx
+            else:
+                head = merged_idx
+            if next_of[right] != -1:
+                prev_of[next_of[right]] = merged_idx
+            count -= 1
+
+            if duration(merged_mod) < min_duration:
+                heapq.heappush(heap, (duration(merged_mod), position[merged_idx], merged_idx))
+
+        current_modules = []
+        node = head
+        while node != -1:
+            current_modules.append(nodes[node])
+            node = next_of[node]
+        if silences is not None and len(silences):
+            current_modules = self._snap_boundaries(current_modules, silences, snap_window)
         return current_modules
 
-    def generate_module_content(self, video_file, topic, start, end, transcript_text):
-        """Step 2: Generate the text course content for a specific segment using VISION + TRANSCRIPT."""
+    @staticmethod
+    def _snap_boundaries(modules, silences, window):
+        """
+        Copies of the modules with inner boundaries moved to pauses. A boundary two modules share is snapped once
+        and stays shared; the ends of a gap or overlap in the plan snap on their own. A move that would empty a
+        module is not made.
+        """
+        def moved(t):
+            # Only moved times are rounded, so unmoved ones stay exactly as planned
+            snapped_t = silences.snap(t, window)
+            return t if snapped_t == t else round(snapped_t, 2)
+
+        snapped = [dict(mod) for mod in modules]
+        for prev, nxt in zip(snapped, snapped[1:]):
+            if abs(prev['end_time'] - nxt['start_time']) < 0.005:
+                boundary = moved(nxt['start_time'])
+                if prev['start_time'] < boundary < nxt['end_time']:
+                    prev['end_time'] = nxt['start_time'] = boundary
+                continue
+            end = moved(prev['end_time'])
+            if end > prev['start_time']:
+                prev['end_time'] = end
+            start = moved(nxt['start_time'])
+            if start < nxt['end_time']:
+                nxt['start_time'] = start
+        return snapped
+
+    def generate_module_content(self, video_file, topic, start, end, transcript, frames=None, use_cache=True):
+        """
+        Step 2: Generate the text course content for a specific segment using VISION + TRANSCRIPT.
+        `frames` can be passed in from `sample_module_frames`; otherwise they are extracted here.
+        """
         print(f"   ✍️  Writing course content for: {topic}...")
         
-        # Filter transcript for context (naive filter or just pass relevant chunk if we have it, 
-        # but simplest is to pass the whole thing and let LLM find the timestamps or just pass the relevant snippet)
-        # For robustness, we will extract lines that fall roughly within the start/end window.
-        
-        relevant_lines = []
-        try:
-            lines = transcript_text.split('\n')
-            for line in lines:
-                # Expected format: [start - end]: text
-                if "[" in line and "]" in line:
-                    try:
-                        time_part = line.split("]")[0].replace("[", "")
-                        t_start, t_end = map(float, time_part.replace("s", "").split("-"))
-                        
-                        # basic overlap check
-                        if t_start >= start and t_start <= end:
-                            relevant_lines.append(line)
-                    except:
-                        continue
-        except:
-            relevant_lines = [transcript_text] # Fallback
-
-        transcript_segment = "\n".join(relevant_lines)
-        if not transcript_segment: description = "No speech detected in this segment."
+        # Filter transcript for context: only the segments that start within the module window
+        transcript_segment = transcript.render_range(start, end)
+        if not transcript_segment:
+            transcript_segment = "No speech detected in this segment."
 
         specific_prompt = CONTENT_PROMPT_TEMPLATE.format(
             topic=topic, start=start, end=end, transcript_segment=transcript_segment
         )
         
         # Extract frames limits to 5 for Groq Vision
-        frames = self.extract_frames_base64(video_file, start_time=start, end_time=end, max_frames=5)
+        if frames is None:
+            frames = self.extract_frames_base64(video_file, start_time=start, end_time=end, max_frames=5)
         
         content_parts = [{"type": "text", "text": specific_prompt}]
         for b64 in frames:
@@ -398,33 +2401,33 @@ class CourseGenerator:
             })
         
         try:
-            completion = self.client.chat.completions.create(
-                model=self.vision_model_name,
-                messages=[
+            return self._chat_completion(
+                self.vision_model_name,
+                [
                     {
                         "role": "user",
                         "content": content_parts
                     }
                 ],
+                use_cache=use_cache,
                 temperature=0.7 
             )
-            return completion.choices[0].message.content
         except Exception as e:
             # Fallback for non-vision models (e.g. if user selected a text-only model)
             if "content" in str(e) and "string" in str(e):
                 print(f"⚠️ Model {self.vision_model_name} appears to be text-only. Retrying without images.")
                 try:
-                    completion = self.client.chat.completions.create(
-                        model=self.vision_model_name,
-                        messages=[
+                    return self._chat_completion(
+                        self.vision_model_name,
+                        [
                             {
                                 "role": "user",
                                 "content": specific_prompt
                             }
                         ],
+                        use_cache=use_cache,
                         temperature=0.7 
                     )
-                    return completion.choices[0].message.content
                 except Exception as e2:
                     print(f"❌ Error generating content (fallback): {e2}")
                     return f"Error generating content: {e2}"
@@ -432,120 +2435,780 @@ class CourseGenerator:
             print(f"❌ Error generating content: {e}")
             return f"Error generating content: {e}"
 
-    def generate_course_intro(self, transcript_text):
+    def course_digest(self, transcript, use_cache=True):
+        """
+        Map-reduce digest of the transcript: chunks are summarized in parallel, then joined in time order.
+        Computed once per transcript and shared by the intro, outro and quiz.
+        """
+        transcript_text = str(transcript)
+        key = hashlib.sha256(transcript_text.encode("utf-8")).hexdigest()
+        with self._digest_lock:
+            if key in self._digests:
+                return self._digests[key]
+
+            chunks = transcript.chunks(DIGEST_CHUNK_CHARS)
+            print(f"   🧾 Digesting transcript ({len(transcript_text)} chars, {len(chunks)} chunks)...")
+
+            # Independent prompts: one batch, pipelined (or batched) by the backend
+            with self.metrics.span("digest"):
+                summaries = self._chat_completions(
+                    self.text_model,
+                    [
+                        [
+                            {"role": "system", "content": DIGEST_PROMPT},
+                            {"role": "user", "content": chunk.render()}
+                        ]
+                        for chunk in chunks
+                    ],
+                    use_cache=use_cache,
+                    temperature=0.3
+                )
+
+            digest = "COURSE DIGEST (section summaries in time order):\n\n" + "\n\n".join(
+                f"### [{chunk.starts[0]:.0f}s - {chunk.ends[-1]:.0f}s]\n{summary.strip()}"
+                for chunk, summary in zip(chunks, summaries)
+            )
+
+            # Input tokens of the three global calls: full transcript each vs. map step + digest each
+            full_tokens = len(transcript_text) // CHARS_PER_TOKEN
+            digest_tokens = len(digest) // CHARS_PER_TOKEN
+            self.digest_report = {
+                "transcript_chars": len(transcript_text),
+                "digest_chars": len(digest),
+                "chunks": len(chunks),
+                "est_input_tokens_full": 3 * full_tokens,
+                "est_input_tokens_digest": full_tokens + 3 * digest_tokens,
+            }
+            print(
+                f"   ✅ Digest ready: ~{self.digest_report['est_input_tokens_full']} -> "
+                f"~{self.digest_report['est_input_tokens_digest']} input tokens for intro/outro/quiz."
+            )
+            self._digests[key] = digest
+            return digest
+
+    def course_context(self, transcript, use_cache=True):
+        """What the global generators see: the full transcript if it fits, else its digest."""
+        if isinstance(transcript, Transcript) and len(str(transcript)) > DIGEST_THRESHOLD_CHARS:
+            return self.course_digest(transcript, use_cache=use_cache)
+        return str(transcript)
+
+    def submit_global_artifacts(self, transcript, use_cache=True):
+        """
+        Starts the course intro, outro and quiz in the background as soon as the transcript exists,
+        so they overlap with module processing instead of running after it.
+        Returns {"intro": Future, "outro": Future, "quiz": Future}.
+        """
+        pool = ThreadPoolExecutor(max_workers=3, thread_name_prefix="course-global")
+        futures = {
+            "intro": pool.submit(self.generate_course_intro, transcript, use_cache),
+            "outro": pool.submit(self.generate_course_outro, transcript, use_cache),
+            "quiz": pool.submit(self.generate_quiz, transcript, use_cache),
+        }
+        # Already-submitted work keeps running; the threads exit once it is done
+        pool.shutdown(wait=False)
+        return futures
+
+    def generate_course_intro(self, transcript, use_cache=True):
         """Generates global course objectives."""
         print("   🚀 Generating Course Objectives...")
         try:
-            return self._text_completion(INTRO_PROMPT, transcript_text)
+            with self.metrics.span("intro"):
+                context = self.course_context(transcript, use_cache=use_cache)
+                return self._text_completion(INTRO_PROMPT, context, use_cache=use_cache)
         except Exception as e:
             print(f"Error generating intro: {e}")
             return "## Objectives\n- content generation failed."
 
-    def generate_course_outro(self, transcript_text):
+    def generate_course_outro(self, transcript, use_cache=True):
         """Generates global definitions and practical applications."""
         print("   🏁 Generating Course Outro...")
         try:
-            return self._text_completion(OUTRO_PROMPT, transcript_text)
+            with self.metrics.span("outro"):
+                context = self.course_context(transcript, use_cache=use_cache)
+                return self._text_completion(OUTRO_PROMPT, context, use_cache=use_cache)
         except Exception as e:
             print(f"Error generating outro: {e}")
             return "## Definitions\n- None\n\n## Practical Application\n- None"
 
-    def _text_completion(self, system_prompt, user_content):
+    def _chat_completion(self, model, messages, use_cache=True, **params):
+        """
+        Sends a chat completion and returns the message content.
+        Identical requests (model + messages + params) are answered from the completion cache
+        unless `use_cache` is False.
+        """
+        with self.metrics.span("api.chat", model=model):
+            cache_key = CompletionCache.key(model, messages, params)
+            if use_cache:
+                content = self.completion_cache.get(cache_key)
+                if content is not None:
+                    self.metrics.add("completion_cache_hits")
+                    return content
+
+            self.metrics.add("requests")
+            self.metrics.add("upload_bytes", len(json.dumps(messages).encode("utf-8")))
+            completion = self.client.chat(model, messages, metrics=self.metrics, slot=self.api_limit, **params)
+            usage = getattr(completion, 'usage', None)
+            if usage is not None:
+                self.metrics.add("prompt_tokens", usage.prompt_tokens or 0)
+                self.metrics.add("completion_tokens", usage.completion_tokens or 0)
+            content = completion.choices[0].message.content
+            if content is not None and self._is_cacheable(content, params):
+                self.completion_cache.put(cache_key, content)
+            return content
+
+    def _chat_completions(self, model, messages_list, use_cache=True, **params):
+        """
+        Batch version of _chat_completion: the cache misses go to the backend in one chat_batch call.
+        Returns the contents in order; raises the first failure after the successful answers are cached.
+        """
+        with self.metrics.span("api.chat", model=model, batch=len(messages_list)):
+            keys = [CompletionCache.key(model, messages, params) for messages in messages_list]
+            contents = [self.completion_cache.get(key) if use_cache else None for key in keys]
+            self.metrics.add("completion_cache_hits", sum(content is not None for content in contents))
+            misses = [i for i, content in enumerate(contents) if content is None]
+            if not misses:
+                return contents
+
+            self.metrics.add("requests", len(misses))
+            self.metrics.add("upload_bytes", sum(len(json.dumps(messages_list[i]).encode("utf-8")) for i in misses))
+            completions = self.client.chat_batch(
+                [{"model": model, "messages": messages_list[i], **params} for i in misses],
+                metrics=self.metrics, slot=self.api_limit
+            )
+            error = None
+            for i, completion in zip(misses, completions):
+                if isinstance(completion, Exception):
+                    error = error or completion
+                    continue
+                usage = getattr(completion, 'usage', None)
+                if usage is not None:
+                    self.metrics.add("prompt_tokens", usage.prompt_tokens or 0)
+                    self.metrics.add("completion_tokens", usage.completion_tokens or 0)
+                contents[i] = completion.choices[0].message.content
+                if contents[i] is not None and self._is_cacheable(contents[i], params):
+                    self.completion_cache.put(keys[i], contents[i])
+            if error is not None:
+                raise error
+            return contents
+
+    @staticmethod
+    def _is_cacheable(content, params):
+        """JSON-mode answers are only cached when they parse, so a malformed reply is not replayed forever."""
+        if params.get("response_format", {}).get("type") != "json_object":
+            return True
+        try:
+            json.loads(content.replace("```json", "").replace("```", "").strip())
+            return True
+        except ValueError:
+            return False
+
+    def _text_completion(self, system_prompt, user_content, use_cache=True):
         """Helper for text-only completions."""
-        completion = self.client.chat.completions.create(
-            model=STRUCTURE_MODEL,
-            messages=[
+        return self._chat_completion(
+            self.text_model,
+            [
                 {"role": "system", "content": system_prompt},
                 {"role": "user", "content": user_content}
             ],
+            use_cache=use_cache,
             temperature=0.3
         )
-        return completion.choices[0].message.content
 
-    def generate_quiz(self, transcript_text):
+    def generate_quiz(self, transcript, use_cache=True):
         """Step 3: Generate the Final Assessment Quiz."""
         print("   🎓 Generating Final Assessment...")
         try:
-            completion = self.client.chat.completions.create(
-                model=STRUCTURE_MODEL,
-                messages=[
-                    {
-                         "role": "system",
-                         "content": QUIZ_PROMPT
-                    },
-                    {
-                        "role": "user",
-                        "content": f"Here is the full course transcript. Generate the quiz strictly based on this content:\n\n{transcript_text}" 
-                    }
-                ],
-                temperature=0.2,
-                response_format={"type": "json_object"}
-            )
-            content = completion.choices[0].message.content
-            content = content.replace("```json", "").replace("```", "").strip()
-            return json.loads(content)
+            with self.metrics.span("quiz"):
+                context = self.course_context(transcript, use_cache=use_cache)
+                content = self._chat_completion(
+                    self.text_model,
+                    [
+                        {
+                             "role": "system",
+                             "content": QUIZ_PROMPT
+                        },
+                        {
+                            "role": "user",
+                            "content": f"Here is the full course transcript. Generate the quiz strictly based on this content:\n\n{context}" 
+                        }
+                    ],
+                    use_cache=use_cache,
+                    temperature=0.2,
+                    response_format={"type": "json_object"}
+                )
+                content = content.replace("```json", "").replace("```", "").strip()
+                return json.loads(content)
         except Exception as e:
             print(f"❌ Error generating quiz: {e}")
             return []
 
-    def process_video(self, source_path, output_dir="course_output"):
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
+    def _write_module_notes(self, video_file, topic, start, end, transcript, frames, save_path_md, use_cache=True,
+                            module=None):
+        """Generates the notes for one module and saves them as Markdown."""
+        with self.metrics.span("notes", module=module):
+            course_content = self.generate_module_content(
+                video_file, topic, start, end, transcript, frames=frames, use_cache=use_cache
+            )
+            write_text_atomic(save_path_md, course_content)
+        return course_content
 
-        # 1. Analyze Structure
-        modules, transcript_text = self.analyze_structure(source_path) 
-        
-        if not modules:
-            print("❌ No modules generated.")
-            return
+    def process_modules(self, source_path, modules, transcript, output_dir="course_output", frame_map=None,
+                        encode_workers=ENCODE_WORKERS, llm_workers=LLM_WORKERS, export_mode=EXPORT_MODE_DEFAULT,
+                        frame_strategy=FRAME_STRATEGY_DEFAULT, manifest=None, use_cache=True, progress_callback=None):
+        """
+        Cuts the clip and writes the notes for every module concurrently.
+        Clips are encoded on a process pool and vision completions run on a thread pool, so the
+        wall time is roughly the slower of the two stages instead of their sum.
+        `export_mode` is one of EXPORT_MODES; the keyframe index is probed once and shared by all cuts.
+        In "hls" mode the source is instead packaged once (while the notes are written) and each module's
+        video is a playlist over its segments, so moving a boundary only rewrites a playlist.
+        With a JobManifest, clips and notes it records as done (same inputs, unchanged on disk) are reused,
+        and each newly finished artifact is checkpointed. Frames are only sampled for notes still to write.
+        `progress_callback(idx, result)` is invoked on the calling thread as each module completes.
+        `source_path` may be a MediaSession: its probe, frame decoder and keyframe index are reused.
+        Returns the per-module results in module order.
+        """
+        with media_session(source_path) as media:
+            return self._process_modules(
+                media, modules, transcript, output_dir, frame_map, encode_workers, llm_workers, export_mode,
+                frame_strategy, manifest, use_cache, progress_callback
+            )
 
-        print(f"\n📋 Course Plan: Found {len(modules)} modules.")
-        
-        # 3. Process each module
-        with VideoFileClip(source_path) as video:
-            for idx, module in enumerate(modules):
-                topic_clean = module['topic_name'].replace(" ", "_").replace("/", "-")
-                base_name = f"{idx+1}_{topic_clean}"
-                
-                start = float(module['start_time'])
-                end = float(module['end_time'])
-                
-                print(f"\n--- Processing Module {idx+1}: {module['topic_name']} ({start}s - {end}s) ---")
+    def _process_modules(self, media, modules, transcript, output_dir, frame_map, encode_workers, llm_workers,
+                         export_mode, frame_strategy, manifest, use_cache, progress_callback):
+        source_path = media.path
+        duration = media.duration
+        clip_ext = ".m3u8" if export_mode == "hls" else ".mp4"
+        hls_playlist = os.path.join(output_dir, HLS_DIR, HLS_PLAYLIST) if export_mode == "hls" else None
+        rendition_fingerprint = JobManifest.fingerprint(HLS_SEGMENT_SECONDS) if hls_playlist else None
+
+        results = []
+        for idx, module in enumerate(modules):
+            base_name = module_base_name(idx, module['topic_name'])
+            start = float(module['start_time'])
+            # Safety check for duration
+            end = min(float(module['end_time']), duration)
+            results.append({
+                "index": idx,
+                "topic_name": module['topic_name'],
+                "start_time": start,
+                "end_time": end,
+                "video_path": os.path.join(output_dir, f"{base_name}{clip_ext}"),
+                "md_path": os.path.join(output_dir, f"{base_name}.md"),
+                "content": None,
+            })
+
+        # Artifacts are checkpointed per module content, so a module that only moved in the plan keeps them
+        keys = {r["index"]: JobManifest.module_key(r["topic_name"], r["start_time"], r["end_time"], transcript)
+                for r in results}
+        if manifest:
+            moved, dropped = manifest.carry_over({
+                keys[r["index"]]: {"clip": r["video_path"], "notes": r["md_path"]} for r in results
+            })
+            if moved or dropped:
+                print(f"   🔀 Carried over the artifacts of {moved} moved modules, removed those of {dropped} old ones.")
+
+        # Inputs that an artifact depends on; a checkpointed artifact with other inputs is redone
+        fingerprints = {
+            (r["index"], "video_path"): JobManifest.fingerprint(
+                r["start_time"], r["end_time"], export_mode, rendition_fingerprint
+            )
+            for r in results
+        }
+        fingerprints.update({
+            (r["index"], "content"): JobManifest.fingerprint(
+                self.vision_model_name, r["topic_name"], r["start_time"], r["end_time"], frame_strategy
+            )
+            for r in results
+        })
+
+        # Module playlists are only as good as the rendition they point into: without it, every one is redone
+        rendition_intact = bool(hls_playlist and manifest and manifest.rendition(hls_playlist, rendition_fingerprint))
+        clips_reusable = manifest and (rendition_intact or not hls_playlist)
+
+        pending = {}
+        for result in results:
+            idx = result["index"]
+            pending[idx] = []
+            if result["start_time"] >= result["end_time"]:
+                print(f"   ⚠️ Invalid duration (Start: {result['start_time']}, End: {result['end_time']}). Skipping clip.")
+                result["video_path"] = None
+            elif not (clips_reusable and manifest.is_done(keys[idx], "clip", result["video_path"], fingerprints[(idx, "video_path")])):
+                pending[idx].append("video_path")
+            if manifest and manifest.is_done(keys[idx], "notes", result["md_path"], fingerprints[(idx, "content")]):
+                with open(result["md_path"], "r", encoding="utf-8") as f:
+                    result["content"] = f.read()
+            else:
+                pending[idx].append("content")
+
+        if manifest:
+            reused = sum(2 - len(fields) for fields in pending.values())
+            if reused:
+                print(f"   ♻️  Resuming: {reused} of {2 * len(results)} artifacts already done.")
+
+        keyframes, video_format = None, None
+        if export_mode in ("copy", "hybrid") and any("video_path" in fields for fields in pending.values()):
+            with self.metrics.span("keyframe_probe"):
+                keyframes = media.keyframes()
+                if export_mode == "hybrid":
+                    video_format = media.video_format()
+            print(f"   🔑 Probed {len(keyframes)} keyframes for '{export_mode}' export.")
+            if export_mode == "hybrid" and x264_matching_args(video_format) is None:
+                print(f"   ⚠️ Cannot re-encode in the source's format ({video_format['codec']}, "
+                      f"{video_format['pix_fmt']}): 'hybrid' clips are re-encoded whole.")
+
+        if frame_map is None:
+            notes_todo = [idx for idx, fields in pending.items() if "content" in fields]
+            sampled = self.sample_module_frames(media, [modules[idx] for idx in notes_todo], strategy=frame_strategy) \
+                if notes_todo else {}
+            frame_map = {idx: sampled[i] for i, idx in enumerate(notes_todo)}
+
+        # HLS: the module playlists are written once the shared rendition is packaged (or found intact)
+        hls_waiting = [idx for idx, fields in pending.items() if "video_path" in fields] if hls_playlist else []
+
+        futures = {}
+        remaining = {}
+
+        def finish(idx):
+            remaining[idx] -= 1
+            if remaining[idx] == 0:
+                print(f"   ✅ Module {idx+1} complete: {results[idx]['topic_name']}")
+                if progress_callback:
+                    progress_callback(idx, results[idx])
+
+        # Threads are enough for the encodes: the work happens in ffmpeg, and no worker process has to import
+        # this module (which spawn/forkserver could not do from inside the Streamlit app)
+        with ThreadPoolExecutor(max_workers=encode_workers) as encode_pool, \
+                ThreadPoolExecutor(max_workers=llm_workers) as llm_pool:
+            for result in results:
+                idx = result["index"]
+                start, end = result["start_time"], result["end_time"]
+                remaining[idx] = len(pending[idx])
+                if not pending[idx]:
+                    print(f"   ✅ Module {idx+1} already complete: {result['topic_name']}")
+                    if progress_callback:
+                        progress_callback(idx, result)
+                    continue
+                print(f"   ⏳ Queued Module {idx+1}: {result['topic_name']} ({start}s - {end}s)")
 
                 # A. CUT THE VIDEO
-                video_filename = f"{base_name}.mp4"
-                save_path_video = os.path.join(output_dir, video_filename)
-                
-                # Safety check for duration
-                if end > video.duration: end = video.duration
-                
-                if start < end:
-                    # moviepy subclip
-                    new_clip = video.subclipped(start_time=start, end_time=end)
-                    new_clip.write_videofile(save_path_video, codec="libx264", audio_codec="aac", logger=None)
-                    print(f"   ✅ Video Clip Saved")
-                else:
-                    print(f"   ⚠️ Invalid duration (Start: {start}, End: {end}). Skipping clip.")
-                
+                if "video_path" in pending[idx] and not hls_playlist:
+                    futures[encode_pool.submit(
+                        limited_call, self.encode_limit,
+                        timed_call, cut_clip, source_path, start, end, result["video_path"], export_mode, keyframes,
+                        video_format
+                    )] = (idx, "video_path")
+
                 # B. WRITE THE COURSE CONTENT
-                course_content = self.generate_module_content(source_path, module['topic_name'], start, end, transcript_text)
-                
-                md_filename = f"{base_name}.md"
-                save_path_md = os.path.join(output_dir, md_filename)
-                
-                with open(save_path_md, "w", encoding="utf-8") as f:
-                    f.write(course_content)
-                print(f"   ✅ Course Text Saved")
+                if "content" in pending[idx]:
+                    futures[llm_pool.submit(
+                        self._write_module_notes, media, result["topic_name"], start, end,
+                        transcript, frame_map.get(idx), result["md_path"], use_cache, idx
+                    )] = (idx, "content")
+
+            if hls_waiting:
+                if rendition_intact:
+                    print(f"   ♻️  HLS rendition already packaged: {hls_playlist}")
+                    rendition = Future()
+                    rendition.set_result((hls_playlist, None))
+                else:
+                    print(f"   📦 Packaging the source as HLS once; {len(hls_waiting)} modules become playlists.")
+                    rendition = encode_pool.submit(
+                        limited_call, self.encode_limit, timed_call, package_hls, source_path, os.path.dirname(hls_playlist)
+                    )
+                futures[rendition] = (None, "rendition")
+
+            for future in as_completed(futures):
+                idx, field = futures[future]
+                if field == "rendition":
+                    self._write_module_playlists(future, results, hls_waiting, keys, fingerprints, manifest,
+                                                 rendition_fingerprint)
+                    for waiting in hls_waiting:
+                        finish(waiting)
+                    continue
+                try:
+                    if field == "video_path":
+                        # Timed in the pool thread, so queueing for an encode slot is not counted
+                        results[idx][field], seconds = future.result()
+                        self.metrics.record("clip_encode", seconds, module=idx)
+                        if manifest:
+                            manifest.mark_done(keys[idx], "clip", results[idx][field], fingerprints[(idx, field)])
+                    else:
+                        results[idx][field] = future.result()
+                        # Failed completions come back as an error text: leave those to be retried next run
+                        if manifest and not results[idx][field].startswith("Error generating content"):
+                            manifest.mark_done(keys[idx], "notes", results[idx]["md_path"], fingerprints[(idx, field)])
+                except Exception as e:
+                    if field == "video_path":
+                        self.metrics.record("clip_encode", 0.0, module=idx, error=f"{type(e).__name__}: {e}")
+                    print(f"❌ Module {idx+1} failed ({field}): {e}")
+                    results[idx][field] = None if field == "video_path" else f"Error generating content: {e}"
+                finish(idx)
+
+        return results
+
+    def _write_module_playlists(self, rendition, results, indices, keys, fingerprints, manifest, rendition_fingerprint):
+        """Writes the HLS playlists of the modules at `indices` from the finished rendition future."""
+        try:
+            # Packaging is timed in the pool thread (recorded here); a reused rendition has no timing
+            playlist, seconds = rendition.result()
+            if seconds is not None:
+                self.metrics.record("hls_package", seconds)
+                if manifest:
+                    manifest.mark_rendition(playlist, rendition_fingerprint)
+            segments = read_hls_playlist(playlist)
+        except Exception as e:
+            self.metrics.record("hls_package", 0.0, error=f"{type(e).__name__}: {e}")
+            print(f"❌ HLS packaging failed: {e}")
+            for idx in indices:
+                results[idx]["video_path"] = None
+            return
+
+        for idx in indices:
+            result = results[idx]
+            try:
+                with self.metrics.span("hls_playlist", module=idx):
+                    write_module_playlist(playlist, result["start_time"], result["end_time"], result["video_path"], segments)
+                if manifest:
+                    manifest.mark_done(keys[idx], "clip", result["video_path"], fingerprints[(idx, "video_path")])
+            except Exception as e:
+                print(f"❌ Module {idx+1} failed (video_path): {e}")
+                result["video_path"] = None
+
+    def load_plan(self, source_path, manifest, use_cache=True, export_mode=None, min_duration=None, modules=None):
+        """
+        Returns (modules, transcript) for the source: from the manifest if it checkpointed a plan for this
+        exact file, otherwise by analyzing the structure (and checkpointing the result).
+        To re-segment incrementally, pass `min_duration` (the checkpointed unmerged plan is merged again, without
+        any API call) or an edited plan as `modules`; process_modules then redoes only the modules that changed.
+        If the source is a MediaSession, a new plan's audio extraction and transcription overlap with opening
+        its frame decoder and, for `export_mode`s that cut at keyframes, scanning the keyframes.
+        """
+        manifest.bind_source(media_path(source_path), self.source_sha256(source_path))
+        previous, transcript = manifest.plan()
+        raw_modules = manifest.raw_modules()
+
+        if modules is not None:
+            if transcript is None:
+                transcript = self.transcribe(source_path)
+            print(f"📝 Using the given plan of {len(modules)} modules.")
+        elif previous:
+            if min_duration is not None and raw_modules is not None:
+                modules = self.merge_plan(raw_modules, min_duration, transcript.silences)
+            elif min_duration is not None:
+                print("   ⚠️ The checkpoint has no unmerged plan to re-segment, keeping its modules.")
+            if modules is None or modules == previous:
+                print(f"♻️  Resuming from {manifest.path}: {len(previous)} modules, {manifest.completed()} artifacts done.")
+                return previous, transcript
+        else:
+            if isinstance(source_path, MediaSession):
+                source_path.prefetch(frame_size=self.frame_max_size, keyframes=export_mode in ("copy", "hybrid"))
+            raw_modules, transcript = self.discover_modules(source_path, use_cache=use_cache)
+            modules = self.merge_plan(raw_modules, MERGE_MIN_DURATION if min_duration is None else min_duration,
+                                      transcript.silences)
+
+        if modules:
+            if previous:
+                unchanged = {(m["topic_name"], float(m["start_time"]), float(m["end_time"])) for m in previous}
+                same = sum(1 for m in modules if (m["topic_name"], float(m["start_time"]), float(m["end_time"])) in unchanged)
+                print(f"🔀 Re-segmented: {same} of {len(modules)} modules unchanged (was {len(previous)} modules).")
+            manifest.set_plan(modules, transcript, raw_modules)
+        return modules, transcript
+
+    def process_video(self, source_path, output_dir="course_output", encode_workers=ENCODE_WORKERS, llm_workers=LLM_WORKERS,
+                      export_mode=EXPORT_MODE_DEFAULT, frame_strategy=FRAME_STRATEGY_DEFAULT, use_cache=True,
+                      min_duration=None, modules=None):
+        """
+        Turns the video into a course in `output_dir`, resuming the checkpoint there.
+        `min_duration` or an edited plan (`modules`) re-segments a finished course incrementally (see load_plan).
+        """
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.metrics = JobMetrics()
+
+        # The source is probed and decoded through one MediaSession for the whole job
+        with media_session(source_path) as media:
+            # 1. Analyze Structure (or resume the checkpointed plan)
+            manifest = JobManifest(output_dir)
+            modules, transcript = self.load_plan(media, manifest, use_cache=use_cache, export_mode=export_mode,
+                                                 min_duration=min_duration, modules=modules)
+
+            if not modules:
+                print("❌ No modules generated.")
+                return
+
+            print(f"\n📋 Course Plan: Found {len(modules)} modules.")
+
+            # 2. Process all modules (frames + clips + notes) concurrently, skipping checkpointed artifacts
+            results = self.process_modules(
+                media, modules, transcript, output_dir=output_dir, encode_workers=encode_workers,
+                llm_workers=llm_workers, export_mode=export_mode, frame_strategy=frame_strategy, manifest=manifest,
+                use_cache=use_cache
+            )
+            print(f"   🎬 Media: {media.stats['probes']} probe, {media.stats['decoders']} frame decoder, "
+                  f"{media.stats['keyframe_scans']} keyframe scan.")
+
+        stats = self.completion_cache.stats()
+        print(f"   📦 Completion cache: {stats['hits']} hits, {stats['misses']} misses.")
+
+        json_path, prom_path = self.metrics.write(output_dir)
+        print(f"   📊 Job metrics: {json_path}, {prom_path}")
+        for stage, agg in self.metrics.report()["stages"].items():
+            print(f"      {stage:<16} {agg['calls']:4d} calls  {agg['seconds']:8.2f}s")
                 
         print("\n🎉 Course Generation Complete!")
+        return results
+
+# --- BATCH CLI ---
+def expand_inputs(inputs, list_file=None):
+    """
+    Video paths from files, directories (searched recursively), glob patterns and an optional list file
+    holding one path or pattern per line ('#' starts a comment). Duplicates are dropped, order is kept.
+    """
+    patterns = list(inputs)
+    if list_file:
+        with open(list_file, "r", encoding="utf-8") as f:
+            patterns += [line.split("#", 1)[0].strip() for line in f]
+
+    paths = []
+    for pattern in filter(None, patterns):
+        if os.path.isdir(pattern):
+            matches = sorted(
+                os.path.join(root, name) for root, _, names in os.walk(pattern) for name in names
+                if name.lower().endswith(VIDEO_EXTENSIONS)
+            )
+        elif os.path.exists(pattern):
+            matches = [pattern]
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                print(f"⚠️ No videos match {pattern}")
+        paths += [os.path.abspath(path) for path in matches]
+    return list(dict.fromkeys(paths))
+
+
+def read_module_plan(path):
+    """
+    Modules from a JSON plan file: a list of {topic_name, start_time, end_time} or an object with a "modules"
+    list (such as a course_manifest.json). Raises ValueError if the plan is malformed.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    modules = data.get("modules") if isinstance(data, dict) else data
+    if not isinstance(modules, list) or not modules:
+        raise ValueError("expected a non-empty list of modules")
+    plan = []
+    for idx, module in enumerate(modules):
+        try:
+            start, end = float(module["start_time"]), float(module["end_time"])
+            plan.append({"topic_name": str(module["topic_name"]), "start_time": start, "end_time": end})
+        except (TypeError, KeyError, ValueError):
+            raise ValueError(f"module {idx + 1} needs topic_name, start_time and end_time: {module!r}")
+        if end <= start:
+            raise ValueError(f"module {idx + 1} ends before it starts: {start} - {end}")
+    return plan
+
+
+def job_output_dirs(paths, output_root):
+    """One output directory per video, named after its file (suffixed with a short path hash on collisions)."""
+    stems = [os.path.splitext(os.path.basename(path))[0] for path in paths]
+    dirs = []
+    for path, stem in zip(paths, stems):
+        if stems.count(stem) > 1:
+            stem = f"{stem}_{hashlib.sha256(path.encode('utf-8')).hexdigest()[:8]}"
+        dirs.append(os.path.join(output_root, stem))
+    return dirs
+
+
+_batch_limits = {}
+
+
+def _init_batch_worker(api_limit, encode_limit, rate_share):
+    _batch_limits["api"] = api_limit
+    _batch_limits["encode"] = encode_limit
+    _batch_limits["rate_share"] = rate_share
+
+
+def run_course_job(source_path, output_dir, options):
+    """
+    Batch worker: runs process_video for one video, logging to <output_dir>/job.log.
+    Never raises; returns a summary dict with the status, timings and job metrics totals.
+    """
+    summary = {"source": source_path, "output_dir": output_dir, "status": "failed", "error": None,
+               "modules": 0, "media_seconds": None, "wall_seconds": None, "totals": {}}
+    start = time.perf_counter()
+    with JobWorkspace(os.path.dirname(output_dir), os.path.basename(output_dir)) as workspace, \
+            open(os.path.join(workspace.output_dir, "job.log"), "a", encoding="utf-8") as log, redirect_stdout(log):
+        generator = media = None
+        try:
+            media = MediaSession(source_path)
+            summary["media_seconds"] = media.duration
+            # Each worker process rate-limits its own requests, so it gets its share of the quota
+            shared_backend(options["backend"], options["api_key"], options["base_url"],
+                           scale=_batch_limits.get("rate_share", 1.0))
+            generator = CourseGenerator(
+                api_key=options["api_key"], model_name=options["model"], base_url=options["base_url"],
+                backend=options["backend"], text_model=options["text_model"], transcribe_model=options["transcribe_model"],
+                api_limit=_batch_limits.get("api"), encode_limit=_batch_limits.get("encode"),
+                work_dir=workspace.temp_dir
+            )
+            results = generator.process_video(
+                media, output_dir=workspace.output_dir, encode_workers=options["encode_workers"],
+                llm_workers=options["llm_workers"], export_mode=options["export_mode"],
+                frame_strategy=options["frame_strategy"], use_cache=options["use_cache"],
+                min_duration=options["min_duration"], modules=options["plan"]
+            )
+            if not results:
+                summary["error"] = "No modules generated"
+            else:
+                summary["modules"] = len(results)
+                failed = [r["index"] + 1 for r in results if r["video_path"] is None
+                          or (r["content"] or "").startswith("Error generating content")]
+                if failed:
+                    summary["error"] = f"Modules with missing artifacts: {failed}"
+                else:
+                    summary["status"] = "ok"
+        except Exception as e:
+            traceback.print_exc(file=log)
+            summary["error"] = f"{type(e).__name__}: {e}"
+        if media is not None:
+            media.close()
+        if generator is not None:
+            summary["totals"] = dict(generator.metrics.totals)
+    summary["wall_seconds"] = time.perf_counter() - start
+    return summary
+
+
+def run_batch(paths, output_root="course_output", jobs=BATCH_JOBS, encode_slots=BATCH_ENCODE_SLOTS,
+              api_slots=BATCH_API_SLOTS, **options):
+    """
+    Processes many videos on a process pool, one job per video with its own output directory.
+    `encode_slots` and `api_slots` cap clip encodes and API requests across ALL jobs (shared semaphores),
+    so adding jobs raises utilisation without oversubscribing the CPU; each worker enforces 1/jobs of the
+    API_RATE_LIMITS so together they stay within the quota.
+    Returns the batch report (throughput, failures and per-job timings).
+    """
+    options = {
+        "api_key": os.environ.get("GROQ_API_KEY"), "model": None, "base_url": None, "backend": BACKEND_DEFAULT,
+        "text_model": None, "transcribe_model": None,
+        "encode_workers": min(ENCODE_WORKERS, encode_slots), "llm_workers": min(LLM_WORKERS, api_slots),
+        "export_mode": EXPORT_MODE_DEFAULT, "frame_strategy": FRAME_STRATEGY_DEFAULT, "use_cache": True,
+        "min_duration": None, "plan": None,
+        **options,
+    }
+    output_dirs = job_output_dirs(paths, output_root)
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    start = time.perf_counter()
+    summaries = [None] * len(paths)
+
+    with multiprocessing.Manager() as manager:
+        api_limit = manager.BoundedSemaphore(api_slots)
+        encode_limit = manager.BoundedSemaphore(encode_slots)
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_batch_worker,
+                                 initargs=(api_limit, encode_limit, 1.0 / max(1, min(jobs, len(paths))))) as pool:
+            futures = {
+                pool.submit(run_course_job, path, output_dir, options): idx
+                for idx, (path, output_dir) in enumerate(zip(paths, output_dirs))
+            }
+            for done, future in enumerate(as_completed(futures), 1):
+                idx = futures[future]
+                try:
+                    summary = future.result()
+                except Exception as e:
+                    # The worker process itself died (e.g. out of memory)
+                    summary = {"source": paths[idx], "output_dir": output_dirs[idx], "status": "failed",
+                               "error": f"{type(e).__name__}: {e}", "modules": 0, "media_seconds": None,
+                               "wall_seconds": None, "totals": {}}
+                summaries[idx] = summary
+                icon = "✅" if summary["status"] == "ok" else "❌"
+                wall = f"{summary['wall_seconds']:.1f}s" if summary["wall_seconds"] is not None else "-"
+                print(f"{icon} [{done}/{len(paths)}] {os.path.basename(summary['source'])} "
+                      f"({summary['modules']} modules, {wall}){' - ' + summary['error'].splitlines()[0] if summary['error'] else ''}")
+
+    wall = time.perf_counter() - start
+    media = sum(s["media_seconds"] or 0 for s in summaries if s["status"] == "ok")
+    succeeded = sum(1 for s in summaries if s["status"] == "ok")
+    return {
+        "started_at": started_at,
+        "wall_seconds": wall,
+        "limits": {"jobs": jobs, "encode_slots": encode_slots, "api_slots": api_slots},
+        "jobs": len(summaries),
+        "succeeded": succeeded,
+        "failed": len(summaries) - succeeded,
+        "throughput": {
+            "videos_per_hour": succeeded / wall * 3600 if wall else 0.0,
+            "media_seconds_per_second": media / wall if wall else 0.0,
+        },
+        "results": summaries,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Turn lecture videos into courses (module clips + notes), several videos at a time."
+    )
+    parser.add_argument("inputs", nargs="*", help="Video files, directories or glob patterns (quote them)")
+    parser.add_argument("--list", dest="list_file", help="Text file with one video path or glob per line")
+    parser.add_argument("--output-root", default="course_output", help="Each video gets <output-root>/<name>/")
+    parser.add_argument("--jobs", type=int, default=BATCH_JOBS, help="Videos processed in parallel")
+    parser.add_argument("--encode-slots", type=int, default=BATCH_ENCODE_SLOTS, help="Clip encodes at once, across all jobs")
+    parser.add_argument("--api-slots", type=int, default=BATCH_API_SLOTS, help="API requests in flight, across all jobs")
+    parser.add_argument("--export-mode", choices=EXPORT_MODES, default=EXPORT_MODE_DEFAULT)
+    parser.add_argument("--frame-strategy", choices=FRAME_STRATEGIES, default=FRAME_STRATEGY_DEFAULT)
+    parser.add_argument("--backend", choices=BACKENDS, default=BACKEND_DEFAULT,
+                        help="groq: Groq Cloud. openai: an OpenAI-compatible server such as Ollama or vLLM")
+    parser.add_argument("--base-url", default=None,
+                        help=f"API server (default Groq Cloud, or {LOCAL_BASE_URL_DEFAULT} for --backend openai)")
+    parser.add_argument("--model", default=None, help=f"Vision model (default {VISION_MODEL_DEFAULT})")
+    parser.add_argument("--text-model", default=None, help=f"Structure/summary model (default {STRUCTURE_MODEL})")
+    parser.add_argument("--transcribe-model", default=None, help=f"Speech-to-text model (default {WHISPER_MODEL})")
+    parser.add_argument("--no-cache", action="store_true", help="Do not reuse cached AI responses")
+    parser.add_argument("--min-duration", type=float, default=None,
+                        help=f"Merge modules shorter than this many seconds (default {MERGE_MIN_DURATION}); on a finished "
+                             "course only the modules that change are redone")
+    parser.add_argument("--plan", default=None,
+                        help="JSON module plan (a list of topic_name/start_time/end_time, or the modules of a "
+                             "course_manifest.json) to use instead of the analyzed one; one input video only")
+    parser.add_argument("--report", default=None, help="Batch report path (default <output-root>/batch_report.json)")
+    args = parser.parse_args(argv)
+
+    paths = expand_inputs(args.inputs, args.list_file)
+    if not paths:
+        parser.error("no input videos found")
+    if args.backend == "groq" and not os.environ.get("GROQ_API_KEY") and not args.base_url:
+        parser.error("GROQ_API_KEY is not set")
+    plan = None
+    if args.plan:
+        if len(paths) != 1:
+            parser.error("--plan needs exactly one input video")
+        try:
+            plan = read_module_plan(args.plan)
+        except (OSError, ValueError) as e:
+            parser.error(f"--plan: {e}")
+
+    print(f"🎬 {len(paths)} videos, {args.jobs} jobs, {args.encode_slots} encode slots, {args.api_slots} API slots")
+    report = run_batch(
+        paths, output_root=args.output_root, jobs=args.jobs, encode_slots=args.encode_slots, api_slots=args.api_slots,
+        model=args.model, base_url=args.base_url, backend=args.backend, text_model=args.text_model,
+        transcribe_model=args.transcribe_model, export_mode=args.export_mode, frame_strategy=args.frame_strategy,
+        use_cache=not args.no_cache, min_duration=args.min_duration, plan=plan,
+        # A local server gets its own key (if it wants one), never the Groq key
+        api_key=(os.environ.get("GROQ_API_KEY") or "unused") if args.backend == "groq" else os.environ.get("OPENAI_API_KEY")
+    )
+
+    report_path = args.report or os.path.join(args.output_root, "batch_report.json")
+    os.makedirs(os.path.dirname(report_path) or ".", exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    throughput = report["throughput"]
+    print(
+        f"\n📊 {report['succeeded']}/{report['jobs']} succeeded in {report['wall_seconds']:.1f}s "
+        f"({throughput['videos_per_hour']:.1f} videos/h, {throughput['media_seconds_per_second']:.1f}x realtime) -> {report_path}"
+    )
+    return 0 if report["failed"] == 0 else 1
+
 
 # --- EXECUTION ---
 if __name__ == "__main__":
-    SOURCE = "your_video.mp4" 
-    GROQ_API_KEY = os.environ.get("GROQ_API_KEY")
-
-    if os.path.exists(SOURCE) and GROQ_API_KEY:
-        generator = CourseGenerator(api_key=GROQ_API_KEY)
-        generator.process_video(SOURCE)
-    else:
-        print("File not found or GROQ_API_KEY not set.")
\ No newline at end of file
+    sys.exit(main())